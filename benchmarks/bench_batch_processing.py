@@ -0,0 +1,49 @@
+"""
+Benchmark the multi-station batch engine against the per-station functions
+"""
+
+import logging
+import time
+
+import typer
+
+from benchmarks.synthetic import make_hourly_stations
+from migraine_weather import processing
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    stations: list[int] = typer.Option([100, 1000, 10000]),
+    hours: int = 24 * 30,
+):
+    for n_stations in stations:
+        data = make_hourly_stations(n_stations, hours)
+        long = processing.stack_stations(data)
+
+        t0 = time.perf_counter()
+        for hourly in data.values():
+            processing.get_daily_pressure_range(hourly)
+        per_station = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        processing.get_daily_pressure_range_batch(long)
+        batch = time.perf_counter() - t0
+
+        logging.info(
+            "%6d stations x %d h: per-station %.3fs (%.0f st/s), batch %.3fs (%.0f st/s), "
+            "speedup %.1fx",
+            n_stations,
+            hours,
+            per_station,
+            n_stations / per_station,
+            batch,
+            n_stations / batch,
+            per_station / batch,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
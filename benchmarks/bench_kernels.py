@@ -0,0 +1,50 @@
+"""
+Benchmark the array kernel against pandas for the hourly to daily reduction of one station
+"""
+
+import logging
+import time
+
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_hourly_stations
+from migraine_weather import kernels, processing
+
+app = typer.Typer()
+
+
+@app.command()
+def main(years: int = 10, stations: int = 5, repeat: int = 3):
+    data = make_hourly_stations(stations, 24 * 365 * years)
+    for hourly in data.values():
+        hourly["pres"] = hourly["pres"].astype("Float64")
+    kernels.daily_pressure_range(next(iter(data.values())))  # compile before timing
+
+    timings = {}
+    for use_kernel in (False, True):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            results = [
+                processing.get_daily_pressure_range(hourly, use_kernel=use_kernel)
+                for hourly in data.values()
+            ]
+            best = min(best, time.perf_counter() - t0)
+        timings[use_kernel] = (best / stations, results)
+
+    for expected, result in zip(timings[False][1], timings[True][1]):
+        pd.testing.assert_frame_equal(result, expected)
+    logging.info(
+        "%d years of hourly data per station: pandas %.1f ms, %s kernel %.1f ms, speedup %.1fx",
+        years,
+        timings[False][0] * 1e3,
+        kernels.BACKEND,
+        timings[True][0] * 1e3,
+        timings[False][0] / timings[True][0],
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
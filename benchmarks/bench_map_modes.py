@@ -0,0 +1,53 @@
+"""
+Benchmark rendering the station layer of a map as a scatter plot and as a grid
+"""
+
+import logging
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+import typer
+
+from migraine_weather.spatial import StationIndex
+from migraine_weather.visualisation import make_maps
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    stations: list[int] = typer.Option([1000, 10000, 100000]),
+    region: str = "World",
+    output_path: Path | None = None,
+):
+    rng = np.random.default_rng(0)
+    with TemporaryDirectory() as tmpdir:
+        output_path = output_path or Path(tmpdir)
+        for n_stations in stations:
+            table = pd.DataFrame(
+                {
+                    "longitude": rng.uniform(-180, 180, n_stations),
+                    "latitude": np.degrees(np.arcsin(rng.uniform(-1, 1, n_stations))),
+                    "frac_var": rng.beta(2, 12, n_stations),
+                }
+            )
+            index = StationIndex(table)
+            # Base map features are left out, they cost the same in both modes
+            seconds = {}
+            for mode in make_maps.MAP_MODES:
+                (output_path / mode).mkdir(parents=True, exist_ok=True)
+                seconds[mode] = make_maps.render_region(
+                    region, index, output_path / mode, features=[], mode=mode
+                )
+            logging.info(
+                "%7d stations: %s",
+                n_stations,
+                ", ".join(f"{mode} {s:.2f}s" for mode, s in seconds.items()),
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
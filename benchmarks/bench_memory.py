@@ -0,0 +1,82 @@
+"""
+Measure peak worker memory and daily file size with all weather columns and pressure only
+"""
+
+import logging
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_hourly_stations
+from migraine_weather import data_acquisition, processing, storage
+
+app = typer.Typer()
+
+# Weather columns besides pressure returned by a default meteostat hourly fetch
+OTHER_COLUMNS: list[str] = ["temp", "rhum", "prcp", "snwd", "wdir", "wspd", "wpgt", "tsun", "cldc"]
+
+
+def _hourly(n_stations: int, hours: int, all_columns: bool) -> dict[str, pd.DataFrame]:
+    stations = make_hourly_stations(n_stations, hours)
+    for station_id, hourly in stations.items():
+        hourly["pres"] = hourly["pres"].astype("Float64")
+        if all_columns:
+            stations[station_id] = hourly.assign(
+                **{column: hourly["pres"] for column in OTHER_COLUMNS}
+            )
+    return stations
+
+
+def _peak_rss_mb(n_stations: int, hours: int, all_columns: bool) -> float:
+    """Process one batch in a fresh worker and return the worker's peak RSS."""
+    hourly = _hourly(n_stations, hours, all_columns)
+    data_acquisition.process_batch(list(hourly.items()))
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@app.command()
+def main(stations: int = 200, hours: int = 24 * 365 * 2):
+    results = {}
+    for all_columns in (True, False):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results[all_columns] = executor.submit(
+                _peak_rss_mb, stations, hours, all_columns
+            ).result()
+    logging.info(
+        "Peak worker RSS for %d stations x %d h: all columns %.0f MB, pressure only %.0f MB.",
+        stations,
+        hours,
+        results[True],
+        results[False],
+    )
+
+    daily = processing.get_daily_pressure_range_batch(
+        processing.stack_stations(_hourly(stations, hours, all_columns=False))
+    )
+    years = pd.DatetimeIndex(daily["date"]).year
+    with TemporaryDirectory() as tmpdir:
+        float_bytes = compact_bytes = 0
+        for i, (_, rows) in enumerate(daily.groupby(["station", years])):
+            rows = rows[storage.DAILY_COLUMNS].reset_index(drop=True)
+            float_path = Path(tmpdir) / f"{i}-float.parquet"
+            compact_path = Path(tmpdir) / f"{i}.parquet"
+            rows.to_parquet(float_path, index=False)
+            storage.write_daily(rows, compact_path)
+            float_bytes += float_path.stat().st_size
+            compact_bytes += compact_path.stat().st_size
+            pd.testing.assert_frame_equal(storage.read_daily(compact_path), rows)
+    logging.info(
+        "Daily station-year files: float64 %.1f MB, int16 tenths %.1f MB (%.1fx smaller).",
+        float_bytes / 1e6,
+        compact_bytes / 1e6,
+        float_bytes / compact_bytes,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
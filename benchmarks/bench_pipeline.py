@@ -0,0 +1,98 @@
+"""
+Regression benchmarks of the pipeline stages on synthetic data, run with pytest-benchmark
+
+Run with `make bench` to compare against the baseline stored in benchmarks/baselines, and
+`make bench-baseline` to record a new one.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+import pytest
+
+from benchmarks.standin import LocalMeteostat, write_synthetic_fixture
+from benchmarks.synthetic import make_hourly_stations
+from migraine_weather import data_acquisition, engine, processing
+from migraine_weather.metrics import METRICS
+from migraine_weather.storage import DailyStore
+
+YEARS: int = 10
+FIXTURE_STATIONS: int = 40
+FIXTURE_HOURS: int = 24 * 366
+START: datetime = datetime(2020, 1, 1)
+END: datetime = datetime(2020, 12, 31, 23, 59, 59)
+
+
+@pytest.fixture(scope="module")
+def hourly() -> pd.DataFrame:
+    """Ten years of hourly pressure for one station, as fetched from meteostat."""
+    rows = make_hourly_stations(1, 24 * 365 * YEARS)["S00000"]
+    rows["pres"] = rows["pres"].astype("Float64")
+    return rows
+
+
+@pytest.fixture(scope="module")
+def daily(hourly: pd.DataFrame) -> pd.DataFrame:
+    return processing.get_daily_pressure_range(hourly)
+
+
+@pytest.fixture(scope="module")
+def standin(tmp_path_factory: pytest.TempPathFactory) -> LocalMeteostat:
+    """A year of hourly pressure for synthetic stations, served in place of meteostat."""
+    path = tmp_path_factory.mktemp("meteostat")
+    standin = write_synthetic_fixture(path, FIXTURE_STATIONS, FIXTURE_HOURS, n_countries=4)
+    with standin.patch():
+        yield standin
+
+
+@pytest.fixture(scope="module")
+def stations(standin: LocalMeteostat) -> pd.DataFrame:
+    return data_acquisition.get_eligible_stations(START, END)
+
+
+def test_remove_outliers(benchmark, hourly: pd.DataFrame):
+    result = benchmark(processing.remove_outliers, hourly)
+    assert len(result) < len(hourly)
+
+
+@pytest.mark.parametrize("use_kernel", [True, False], ids=["kernel", "pandas"])
+def test_get_daily_pressure_range(
+    benchmark, hourly: pd.DataFrame, daily: pd.DataFrame, use_kernel: bool
+):
+    result = benchmark(processing.get_daily_pressure_range, hourly, use_kernel=use_kernel)
+    pd.testing.assert_frame_equal(result, daily)
+
+
+def test_compute_frac_var(benchmark, daily: pd.DataFrame):
+    result = benchmark(processing.compute_frac_var, daily)
+    assert 0 <= result <= 1
+
+
+def test_get_eligible_stations(benchmark, stations: pd.DataFrame):
+    result = benchmark(data_acquisition.get_eligible_stations, START, END)
+    assert len(result) == FIXTURE_STATIONS
+
+
+def test_process_country(benchmark, stations: pd.DataFrame):
+    """
+    Plan, fetch, process and store every station into an empty store, as a country run of
+    the pipeline does.
+    """
+
+    def run(store_path: Path) -> int:
+        store = DailyStore(store_path)
+        jobs = engine.plan_jobs(stations, store, START, END)
+        batches = engine.balance_batches(jobs, target_rows=24 * 366 * 8)
+        return engine.run_batches(batches, engine.MeteostatSource(), store, cpu_workers=2)
+
+    with TemporaryDirectory() as tmpdir:
+        rounds = iter(range(100))
+
+        def setup():
+            return (Path(tmpdir) / str(next(rounds)),), {}
+
+        written = benchmark.pedantic(run, setup=setup, rounds=5)
+    METRICS.reset()
+    assert written == FIXTURE_STATIONS
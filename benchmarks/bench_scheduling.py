@@ -0,0 +1,79 @@
+"""
+Simulate the makespan of per-country and work-balanced scheduling of station jobs
+"""
+
+import heapq
+import logging
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_station_catalog
+from migraine_weather import engine
+from migraine_weather.storage import DailyStore
+
+app = typer.Typer()
+
+
+def _makespan(task_costs: list[float], workers: int) -> float:
+    """
+    Return the finish time of tasks taken in order by the first free worker.
+    """
+    finish = [0.0] * workers
+    for cost in task_costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+
+@app.command()
+def main(
+    stations: int = 10000,
+    workers: int = 16,
+    batch_rows: int = 200_000,
+    seconds_per_station: float = 0.5,
+    seconds_per_million_rows: float = 2.0,
+    stations_csv: Path | None = None,
+):
+    """
+    Compare simulated run times using a cost model of per-station latency plus per-row work.
+
+    Pass stations_csv (e.g. get_eligible_stations(...).to_csv(...)) to use the real catalog.
+    """
+    if stations_csv is not None:
+        catalog = pd.read_csv(stations_csv, index_col=0)
+    else:
+        catalog = make_station_catalog(stations)
+    start, end = datetime(1990, 1, 1), datetime(2025, 12, 31)
+    with TemporaryDirectory() as tmpdir:
+        jobs = engine.plan_jobs(catalog, DailyStore(Path(tmpdir)), start, end)
+
+    def cost(batch: list[engine.StationJob]) -> float:
+        rows = sum(job.expected_rows for job in batch)
+        return len(batch) * seconds_per_station + rows / 1e6 * seconds_per_million_rows
+
+    by_country: dict[str, list[engine.StationJob]] = {}
+    for job in jobs:
+        by_country.setdefault(job.country, []).append(job)
+    balanced = engine.balance_batches(jobs, batch_rows)
+
+    total = cost(jobs)
+    for name, tasks in [
+        ("per-country", list(by_country.values())),
+        ("balanced", balanced),
+    ]:
+        makespan = _makespan([cost(batch) for batch in tasks], workers)
+        logging.info(
+            "%-12s %5d tasks: makespan %8.0fs, %.0f%% worker utilisation",
+            name,
+            len(tasks),
+            makespan,
+            100 * total / (makespan * workers),
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
@@ -0,0 +1,53 @@
+"""
+Benchmark a one-pass multi-threshold frac_var sweep against one pass per threshold
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_daily_stations
+from migraine_weather import processing
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    stations: list[int] = typer.Option([100, 1000, 10000]),
+    years: int = 10,
+    thresholds: list[float] = typer.Option([5.0, 8.0, 10.0, 12.0, 15.0]),
+):
+    for n_stations in stations:
+        daily = make_daily_stations(n_stations, years)
+
+        t0 = time.perf_counter()
+        looped = pd.concat(
+            {thresh: processing.compute_frac_var_batch(daily, thresh) for thresh in thresholds},
+            axis=1,
+        )
+        per_threshold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        swept = processing.compute_frac_var_sweep(daily, thresholds)
+        one_pass = time.perf_counter() - t0
+
+        assert np.allclose(looped.to_numpy(), swept.to_numpy(), equal_nan=True)
+        logging.info(
+            "%6d stations x %d years x %d thresholds: per threshold %.3fs, sweep %.3fs, "
+            "speedup %.1fx",
+            n_stations,
+            years,
+            len(thresholds),
+            per_threshold,
+            one_pass,
+            per_threshold / one_pass,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
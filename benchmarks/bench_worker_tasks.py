@@ -0,0 +1,92 @@
+"""
+Benchmark shipping the station table with every worker task against sharing it once per worker
+"""
+
+import logging
+import os
+import pickle
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_station_catalog
+from migraine_weather import data_acquisition
+
+app = typer.Typer()
+
+
+def _peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _task_with_table(stations: pd.DataFrame, country: str) -> tuple[int, float, int]:
+    """Previous pattern: the whole table is bound into the task and filtered in the worker."""
+    station_ids = stations.index[stations["country"] == country]
+    return os.getpid(), _peak_rss_mib(), len(station_ids)
+
+
+def _task_with_ids(station_ids: list[str]) -> tuple[int, float, int]:
+    """Current pattern: the table is shared by the initializer and tasks carry station ids."""
+    countries = {data_acquisition._station_countries[station_id] for station_id in station_ids}
+    return os.getpid(), _peak_rss_mib(), len(countries)
+
+
+def _run(executor_args: dict, function, tasks: list, label: str, task_bytes: int, n_workers: int):
+    with ProcessPoolExecutor(max_workers=n_workers, **executor_args) as executor:
+        list(executor.map(int, range(n_workers)))  # start all workers before timing
+        t0 = time.perf_counter()
+        results = list(executor.map(function, tasks))
+        elapsed = time.perf_counter() - t0
+
+    peak_rss = {}
+    for pid, rss, _ in results:
+        peak_rss[pid] = max(rss, peak_rss.get(pid, 0.0))
+    logging.info(
+        "%-14s %4d tasks: %7.2f ms/task, %9d bytes/task, peak RSS max %.0f MiB / sum %.0f MiB",
+        label,
+        len(tasks),
+        1000 * elapsed / len(tasks),
+        task_bytes,
+        max(peak_rss.values()),
+        sum(peak_rss.values()),
+    )
+
+
+@app.command()
+def main(stations: int = 40000, countries: int = 250, workers: int = 8):
+    catalog = make_station_catalog(stations, n_countries=countries)
+    rng = np.random.default_rng(0)
+    # Text columns as returned by get_eligible_stations
+    catalog["name"] = [
+        f"Station {i} {'x' * int(n)}" for i, n in enumerate(rng.integers(5, 30, stations))
+    ]
+    catalog["region"] = "RG"
+    catalog["timezone"] = "Australia/Canberra"
+    catalog["latitude"] = rng.uniform(-90, 90, stations)
+    catalog["longitude"] = rng.uniform(-180, 180, stations)
+    catalog["elevation"] = rng.uniform(0, 3000, stations)
+
+    country_codes = sorted(catalog["country"].unique())
+    with_table = partial(_task_with_table, catalog)
+    _run({}, with_table, country_codes, "table-per-task", len(pickle.dumps(with_table)), workers)
+
+    station_countries = catalog["country"].to_dict()
+    id_tasks = [list(ids) for _, ids in catalog.groupby("country").groups.items()]
+    _run(
+        {"initializer": data_acquisition.init_worker, "initargs": (station_countries,)},
+        _task_with_ids,
+        id_tasks,
+        "shared-table",
+        int(np.mean([len(pickle.dumps(task)) for task in id_tasks])),
+        workers,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
@@ -0,0 +1,273 @@
+"""
+Local stand-in for the meteostat stations database and hourly API, served from fixtures
+"""
+
+import logging
+import sqlite3
+import warnings
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import meteostat
+import numpy as np
+import pandas as pd
+import typer
+
+from benchmarks.synthetic import make_hourly_stations, make_station_catalog
+
+app = typer.Typer()
+
+# Columns of the meteostat stations database tables the pipeline queries
+TABLES: dict[str, list[str]] = {
+    "stations": ["id", "country", "region", "latitude", "longitude", "elevation", "timezone"],
+    "names": ["station", "language", "name"],
+    "inventory": ["station", "parameter", "start", "end", "completeness"],
+}
+
+
+class _Series:
+    """Result of LocalMeteostat.hourly, fetched like a meteostat time series."""
+
+    def __init__(self, data: pd.DataFrame | None):
+        self.data = data
+
+    def fetch(self, **kwargs) -> pd.DataFrame | None:
+        return self.data
+
+
+class LocalMeteostat:
+    """
+    Stations database and hourly series of a fixture directory, in place of meteostat.
+
+    A fixture directory holds stations.db, an SQLite database with the stations, names and
+    inventory tables of the meteostat stations database, and hourly/<station>.parquet with
+    the hourly series of each station. Within patch(), meteostat.stations.query and
+    meteostat.hourly answer from the fixture, so the pipeline runs offline and on the same
+    data every time.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.db_file = self.path / "stations.db"
+        self.hourly_path = self.path / "hourly"
+        self._hourly: dict[str, pd.DataFrame | None] = {}
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Connect to the fixture's stations database.
+
+        Returns:
+            sqlite3.Connection
+        """
+        return sqlite3.connect(self.db_file)
+
+    def _read_hourly(self, station_id: str) -> pd.DataFrame | None:
+        if station_id not in self._hourly:
+            path = self.hourly_path / f"{station_id}.parquet"
+            self._hourly[station_id] = pd.read_parquet(path) if path.exists() else None
+        return self._hourly[station_id]
+
+    def hourly(
+        self,
+        station: str | list[str],
+        start: datetime,
+        end: datetime,
+        timezone: str | None = None,
+        parameters: list[str] | None = None,
+        providers: list | None = None,
+    ) -> _Series:
+        """
+        Select hourly series over a time range, as meteostat.hourly.
+
+        Args:
+            station: Station id, or a list of ids for a frame indexed by station and time.
+            start: Start datetime of the range.
+            end: End datetime of the range, inclusive.
+            timezone: Unused, fixtures are in UTC.
+            parameters: Columns to return, all if None.
+            providers: Unused.
+
+        Returns:
+            Object whose fetch() returns the hourly DataFrame, or None if there is no data.
+        """
+        frames = {}
+        for station_id in [station] if isinstance(station, str) else station:
+            hourly = self._read_hourly(station_id)
+            if hourly is None:
+                continue
+            hourly = hourly.loc[pd.Timestamp(start) : pd.Timestamp(end)]
+            if parameters is not None:
+                hourly = hourly[[str(parameter) for parameter in parameters]]
+            if len(hourly):
+                frames[station_id] = hourly
+        if not frames:
+            return _Series(None)
+        if isinstance(station, str):
+            return _Series(frames[station].copy())
+        return _Series(pd.concat(frames, names=["station"]))
+
+    @contextmanager
+    def patch(self) -> Iterator["LocalMeteostat"]:
+        """
+        Serve meteostat.stations and meteostat.hourly from the fixture within a with block.
+
+        Only the calling process is patched, which covers fetching and catalog queries; the
+        processing workers of the engine never call meteostat.
+        """
+        with (
+            patch.object(meteostat, "hourly", self.hourly),
+            patch.object(meteostat.stations, "connect", self.connect),
+            patch.object(meteostat.config, "stations_db_file", str(self.db_file)),
+        ):
+            yield self
+
+
+def write_fixture(
+    path: Path,
+    stations: pd.DataFrame,
+    names: pd.DataFrame,
+    inventory: pd.DataFrame,
+    hourly: dict[str, pd.DataFrame],
+) -> LocalMeteostat:
+    """
+    Write a fixture directory for LocalMeteostat.
+
+    Args:
+        path: Fixture directory, created if needed. Existing files are replaced.
+        stations: Rows of the stations table, with the columns in TABLES.
+        names: Rows of the names table.
+        inventory: Rows of the inventory table, with start and end as 'YYYY-MM-DD' strings.
+        hourly: dict mapping station_id -> hourly DataFrame indexed by time.
+
+    Returns:
+        LocalMeteostat serving the fixture.
+    """
+    standin = LocalMeteostat(path)
+    standin.hourly_path.mkdir(parents=True, exist_ok=True)
+    standin.db_file.unlink(missing_ok=True)
+    with closing(standin.connect()) as conn:
+        for table, rows in (("stations", stations), ("names", names), ("inventory", inventory)):
+            rows[TABLES[table]].to_sql(table, conn, index=False)
+    for station_id, rows in hourly.items():
+        rows.to_parquet(standin.hourly_path / f"{station_id}.parquet")
+    return standin
+
+
+def write_synthetic_fixture(
+    path: Path,
+    n_stations: int,
+    hours: int,
+    n_countries: int = 10,
+    seed: int = 0,
+    start: str = "2020-01-01",
+    **hourly_options,
+) -> LocalMeteostat:
+    """
+    Write a fixture of synthetic stations, see make_hourly_stations and make_station_catalog.
+
+    Each station's inventory covers the days of its hourly series, with the share of hours
+    that have a pressure as its completeness.
+
+    Args:
+        path: Fixture directory.
+        n_stations: Number of stations.
+        hours: Number of hourly slots per station.
+        n_countries: Number of countries to spread the stations over.
+        seed: Random seed.
+        start: Timestamp of the first hourly slot.
+        hourly_options: gap_fraction, missing_fraction and spike_interval of the series.
+
+    Returns:
+        LocalMeteostat serving the fixture.
+    """
+    hourly = make_hourly_stations(n_stations, hours, seed=seed, start=start, **hourly_options)
+    catalog = make_station_catalog(n_stations, n_countries=n_countries, seed=seed)
+    rng = np.random.default_rng(seed)
+    stations = pd.DataFrame(
+        {
+            "id": catalog.index,
+            "country": catalog["country"].to_numpy(),
+            "region": None,
+            "latitude": np.round(rng.uniform(-60, 70, n_stations), 4),
+            "longitude": np.round(rng.uniform(-180, 180, n_stations), 4),
+            "elevation": rng.integers(0, 2000, n_stations),
+            "timezone": "UTC",
+        }
+    )
+    names = pd.DataFrame(
+        {
+            "station": catalog.index,
+            "language": "en",
+            "name": [f"Station {i}" for i in catalog.index],
+        }
+    )
+    inventory = pd.DataFrame(
+        {
+            "station": list(hourly),
+            "parameter": "pres",
+            "start": [rows.index[0].strftime("%Y-%m-%d") for rows in hourly.values()],
+            "end": [rows.index[-1].strftime("%Y-%m-%d") for rows in hourly.values()],
+            "completeness": [rows["pres"].notna().sum() / hours for rows in hourly.values()],
+        }
+    )
+    for rows in hourly.values():
+        rows["pres"] = rows["pres"].astype("Float64")
+    return write_fixture(path, stations, names, inventory, hourly)
+
+
+def record_fixture(
+    path: Path, station_ids: list[str], start: datetime, end: datetime
+) -> LocalMeteostat:
+    """
+    Record a fixture from the live meteostat stations database and hourly pressure.
+
+    Args:
+        path: Fixture directory.
+        station_ids: Stations to record.
+        start: Start datetime of the hourly series.
+        end: End datetime of the hourly series.
+
+    Returns:
+        LocalMeteostat serving the fixture.
+    """
+    placeholders = ", ".join("?" * len(station_ids))
+    tables = {
+        table: meteostat.stations.query(
+            f"SELECT {', '.join(columns)} FROM {table} "
+            f"WHERE {'id' if table == 'stations' else 'station'} IN ({placeholders})",
+            params=tuple(station_ids),
+        )
+        for table, columns in TABLES.items()
+    }
+    hourly = {}
+    for station_id in station_ids:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=FutureWarning)
+            rows = meteostat.hourly(
+                station_id, start, end, parameters=[meteostat.Parameter.PRES]
+            ).fetch()
+        if rows is not None and len(rows):
+            hourly[station_id] = rows
+    logging.info("Recorded %d of %d stations to %s.", len(hourly), len(station_ids), path)
+    return write_fixture(path, tables["stations"], tables["names"], tables["inventory"], hourly)
+
+
+@app.command()
+def record(path: Path, station_ids: list[str], start: str = "2020-01-01", end: str = "2020-12-31"):
+    record_fixture(
+        path, station_ids, datetime.fromisoformat(start), datetime.fromisoformat(f"{end} 23:59")
+    )
+
+
+@app.command()
+def synthetic(path: Path, stations: int = 50, hours: int = 24 * 365 * 2, countries: int = 10):
+    write_synthetic_fixture(path, stations, hours, n_countries=countries)
+    logging.info("Wrote %d synthetic stations to %s.", stations, path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    app()
@@ -0,0 +1,111 @@
+"""
+Synthetic hourly pressure data for benchmarks
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def make_hourly_stations(
+    n_stations: int,
+    hours: int,
+    seed: int = 0,
+    start: str = "2020-01-01",
+    gap_fraction: float = 0.1,
+    missing_fraction: float = 0.02,
+    spike_interval: int = 500,
+) -> dict[str, pd.DataFrame]:
+    """
+    Generate random-walk hourly pressure series with gaps, missing values and spikes.
+
+    Args:
+        n_stations: Number of stations to generate.
+        hours: Number of hourly slots per station (before gaps are removed).
+        seed: Random seed.
+        start: Timestamp of the first hourly slot.
+        gap_fraction: Share of hourly slots without a row.
+        missing_fraction: Share of rows with a missing pressure.
+        spike_interval: One +-40 hPa outlier spike per this many rows, 0 for none.
+
+    Returns:
+        dict mapping station_id -> DataFrame indexed by time with a 'pres' column.
+    """
+    rng = np.random.default_rng(seed)
+    all_times = pd.date_range(start, periods=hours, freq="h", name="time")
+    stations = {}
+    for i in range(n_stations):
+        times = all_times[rng.random(hours) >= gap_fraction]
+        pres = np.round(1013 + np.cumsum(rng.normal(0, 0.8, len(times))), 1)
+        if spike_interval:
+            spikes = rng.integers(0, len(times), size=max(1, len(times) // spike_interval))
+            pres[spikes] += rng.choice([-40.0, 40.0], size=len(spikes))
+        pres[rng.random(len(times)) < missing_fraction] = np.nan
+        stations[f"S{i:05d}"] = pd.DataFrame({"pres": pres}, index=times)
+    return stations
+
+
+def make_daily_stations(
+    n_stations: int, years: int, seed: int = 0, start: str = "2010-01-01"
+) -> pd.DataFrame:
+    """
+    Generate daily pressure ranges in the long format of the daily store.
+
+    Args:
+        n_stations: Number of stations to generate.
+        years: Number of years of daily data per station.
+        seed: Random seed.
+        start: First day.
+
+    Returns:
+        DataFrame with columns: station, date, pres_min, pres_max. About 5% of days are missing.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=365 * years, freq="D")
+    n_rows = n_stations * len(dates)
+    pres_min = np.round(rng.normal(1005, 8, n_rows), 1)
+    pres_max = pres_min + np.round(rng.gamma(2.0, 3.5, n_rows), 1)
+    missing = rng.random(n_rows) < 0.05
+    pres_min[missing] = np.nan
+    pres_max[missing] = np.nan
+    return pd.DataFrame(
+        {
+            "station": np.repeat([f"S{i:05d}" for i in range(n_stations)], len(dates)),
+            "date": np.tile(dates, n_stations),
+            "pres_min": pres_min,
+            "pres_max": pres_max,
+        }
+    )
+
+
+def make_station_catalog(
+    n_stations: int, n_countries: int = 200, seed: int = 0, start: str = "1990-01-01"
+) -> pd.DataFrame:
+    """
+    Generate an eligible-station table with skewed country sizes and inventory ranges.
+
+    Country sizes follow a Zipf-like distribution, so a few countries hold most stations, as in
+    the meteostat catalog.
+
+    Args:
+        n_stations: Number of stations to generate.
+        n_countries: Number of countries to spread the stations over.
+        seed: Random seed.
+        start: Earliest inventory start date.
+
+    Returns:
+        DataFrame indexed by station id with columns: country, inventory_start, inventory_end.
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_countries + 1) ** 1.2
+    countries = rng.choice(n_countries, size=n_stations, p=weights / weights.sum())
+    first = pd.Timestamp(start)
+    span_days = (pd.Timestamp("2025-12-31") - first).days
+    start_offsets = rng.integers(0, span_days, size=n_stations)
+    return pd.DataFrame(
+        {
+            "country": [f"C{country:03d}" for country in countries],
+            "inventory_start": first + pd.to_timedelta(start_offsets, unit="D"),
+            "inventory_end": pd.Timestamp("2025-12-31"),
+        },
+        index=[f"S{i:05d}" for i in range(n_stations)],
+    )
@@ -4,122 +4,208 @@ Main functions for processing weather data
 
 import logging
 from pathlib import Path
-from datetime import datetime, timedelta
-from functools import partial
+from datetime import datetime
 import pandas as pd
 import typer
-import pycountry
 from typing import Optional
 
-from concurrent.futures import ProcessPoolExecutor
 import multiprocessing as mp
 
 import meteostat
-from migraine_weather import data_acquisition
-from migraine_weather.consts import DATA_DIR, PROCESSED_DATA_DIR
-from migraine_weather.utils import get_country_codes, save_station_metadata
+from migraine_weather import data_acquisition, engine, storage, summary
+from migraine_weather.cache import HourlyCache
+from migraine_weather.catalog import StationCatalog
+from migraine_weather.consts import (
+    CONSOLIDATED_DATA_DIR,
+    DATA_DIR,
+    FIGURES_DIR,
+    PROCESSED_DATA_DIR,
+    RAW_DATA_DIR,
+    REPORTS_DIR,
+)
+from migraine_weather.metrics import METRICS
+from migraine_weather.storage import DailyStore
+from migraine_weather.utils import save_station_metadata
+from migraine_weather.visualisation import make_maps, tiles
 
 meteostat.config.block_large_requests = False
 app = typer.Typer()
 
-
-def _init_worker():
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-    logging.getLogger("meteostat").setLevel(logging.WARNING)
-
-
-def process_country(
-    country_code: str,
-    all_eligible_stations: pd.DataFrame,
-    start: datetime,
-    end: datetime,
-    daily_output_path: Path,
-):
-    """Process a single country, doing full fetch for new stations and incremental for existing."""
-    country = pycountry.countries.get(alpha_2=country_code)
-    country_name = country.name if country else country_code
-    country_stations = all_eligible_stations[all_eligible_stations["country"] == country_code]
-    if country_stations.empty:
-        logging.debug("No eligible stations for %s (%s), skipping.", country_name, country_code)
-        return
-
-    new_stations = country_stations[
-        ~country_stations.index.map(lambda s: (daily_output_path / f"{s}.parquet").exists())
-    ]
-    existing_stations = country_stations[~country_stations.index.isin(new_stations.index)]
-    logging.info(
-        "Processing %s (%s): %d new, %d to update...",
-        country_name,
-        country_code,
-        len(new_stations),
-        len(existing_stations),
-    )
-
-    # Full fetch for new stations
-    if not new_stations.empty:
-        for station_id, daily_df in data_acquisition.make_dataset(
-            country_code, new_stations, start, end
-        ).items():
-            daily_df.to_parquet(daily_output_path / f"{station_id}.parquet", index=False)
-
-    # Incremental fetch for existing stations
-    for station_id in existing_stations.index:
-        parquet_file = daily_output_path / f"{station_id}.parquet"
-        existing = pd.read_parquet(parquet_file)
-        incremental_start = pd.to_datetime(existing["date"].max()).to_pydatetime() + timedelta(
-            days=1
-        )
-        if incremental_start >= end:
-            continue
-        station_df = existing_stations.loc[[station_id]]
-        result = data_acquisition.make_dataset(country_code, station_df, incremental_start, end)
-        if station_id in result:
-            updated = pd.concat([existing, result[station_id]], ignore_index=True)
-            updated.to_parquet(parquet_file, index=False)
-
-    logging.info("Done %s (%s).", country_name, country_code)
+DEFAULT_DATA_DIR = DATA_DIR.format(project_root=".")
 
 
 @app.command()
 def main(
-    daily_output_path: Path = Path(DATA_DIR.format(project_root=".") + "/daily"),
+    daily_output_path: Path = Path(DEFAULT_DATA_DIR + "/daily"),
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
     max_workers: int = max(1, mp.cpu_count() - 2),
+    concurrency: int = 16,
+    batch_rows: int = 200_000,
+    min_completeness: float = engine.MIN_EXPECTED_COMPLETENESS,
     start_date: datetime = datetime(2010, 1, 1),
     end_date: Optional[datetime] = None,
+    hourly_cache_path: Path = Path(RAW_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR) + "/hourly"),
+    cache_max_gb: float = 20.0,
+    use_cache: bool = True,
+    consolidated_path: Optional[Path] = None,
+    catalog_path: Path = Path(RAW_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR) + "/catalog"),
+    metrics_path: Path = Path(REPORTS_DIR.format(project_root=".") + "/metrics"),
+    progress_interval: float = engine.PROGRESS_INTERVAL,
+    resume: bool = False,
 ):
-    end_date = end_date or datetime.now()
-    daily_output_path.mkdir(exist_ok=True)
-
-    logging.info("Fetching eligible stations for %s to %s...", start_date.date(), end_date.date())
-    all_eligible_stations = data_acquisition.get_eligible_stations(start_date, end_date)
-    logging.info(
-        "Found %d eligible stations across %d countries.",
-        len(all_eligible_stations),
-        all_eligible_stations["country"].nunique(),
-    )
+    """Fetch and process hourly data for all eligible stations into the daily store."""
+    try:
+        store = DailyStore(daily_output_path)
+        interrupted = store.interrupted_run()
+        if interrupted is not None:
+            store.recover()
+        store.migrate_legacy()
+        if resume and interrupted is not None:
+            run_id, start_date, end_date = interrupted
+            logging.info(
+                "Resuming run %d over %s to %s.", run_id, start_date.date(), end_date.date()
+            )
+        else:
+            if resume:
+                logging.warning("No interrupted run to resume, starting a new run.")
+            end_date = end_date or datetime.now()
+            run_id = store.start_run(start_date, end_date)
+        cache = HourlyCache(hourly_cache_path, int(cache_max_gb * 1024**3)) if use_cache else None
+
+        catalog = StationCatalog(catalog_path)
+        logging.info(
+            "Finding eligible stations for %s to %s...", start_date.date(), end_date.date()
+        )
+        with METRICS.timer("stage_seconds", stage="catalog"):
+            catalog.refresh()
+            all_eligible_stations = data_acquisition.get_eligible_stations(
+                start_date, end_date, catalog
+            )
+        logging.info(
+            "Found %d eligible stations across %d countries.",
+            len(all_eligible_stations),
+            all_eligible_stations["country"].nunique(),
+        )
 
-    # Process countries in parallel
-    country_codes = get_country_codes()
+        with METRICS.timer("stage_seconds", stage="planning"):
+            stations = engine.prescreen(all_eligible_stations, store, min_completeness)
+            if resume and interrupted is not None:
+                stations = engine.skip_finished(stations, store, run_id)
+            jobs = engine.plan_jobs(stations, store, start_date, end_date)
+            batches = engine.balance_batches(jobs, batch_rows)
+        logging.info(
+            "%d stations in %d countries to fetch in %d batches (%d already up to date).",
+            len(jobs),
+            len({job.country for job in jobs}),
+            len(batches),
+            len(stations) - len(jobs),
+        )
 
-    process_func = partial(
-        process_country,
-        all_eligible_stations=all_eligible_stations,
-        start=start_date,
-        end=end_date,
-        daily_output_path=daily_output_path,
-    )
-    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
-        futures = executor.map(process_func, country_codes)
         try:
-            for _ in futures:
-                pass
+            written = engine.run_batches(
+                batches,
+                engine.MeteostatSource(cache),
+                store,
+                concurrency,
+                cpu_workers=max_workers,
+                progress_interval=progress_interval,
+                run_id=run_id,
+            )
         except KeyboardInterrupt:
-            logging.info("Interrupted, shutting down...")
-            executor.shutdown(wait=False, cancel_futures=True)
+            logging.info("Interrupted, shutting down. Run again with --resume to continue.")
             return
+        store.finish_run(run_id)
+
+        # Compaction deletes parts an update may be reading, so only once all writes are done
+        with METRICS.timer("stage_seconds", stage="compaction"):
+            store.compact()
+        logging.info("Processing dataset complete, %d stations written.", written)
+        processed_output_path.mkdir(parents=True, exist_ok=True)
+        save_station_metadata(all_eligible_stations, daily_output_path, processed_output_path)
+        if consolidated_path is not None:
+            storage.consolidate(store, all_eligible_stations, consolidated_path)
+    finally:
+        METRICS.write(metrics_path)
+        logging.info("Wrote run metrics to %s.", metrics_path)
 
-    logging.info("Processing dataset complete.")
-    save_station_metadata(all_eligible_stations, daily_output_path, PROCESSED_DATA_DIR)
+
+@app.command()
+def aggregate(
+    daily_output_path: Path = Path(DEFAULT_DATA_DIR + "/daily"),
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+    thresh: float = 10.0,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Compute frac_var for every station and write the all.csv table used by the maps."""
+    summaries = DailyStore(daily_output_path).summary(start_year=start_year, end_year=end_year)
+    frac_var = summary.frac_var(summaries, [thresh])[thresh].rename("frac_var")
+
+    stations = pd.read_csv(processed_output_path / "stations.csv", index_col="id")
+    table = stations.join(frac_var, how="inner")
+    table.to_csv(processed_output_path / "all.csv")
+    logging.info("Saved frac_var for %d stations.", len(table))
+
+
+@app.command()
+def sweep(
+    daily_output_path: Path = Path(DEFAULT_DATA_DIR + "/daily"),
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+    thresholds: list[float] = typer.Option([5.0, 8.0, 10.0, 12.0, 15.0]),
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+):
+    """Compute frac_var for every station at several thresholds into frac_var_sweep.csv."""
+    summaries = DailyStore(daily_output_path).summary(start_year=start_year, end_year=end_year)
+    table = summary.frac_var(summaries, thresholds)
+
+    processed_output_path.mkdir(parents=True, exist_ok=True)
+    table.to_csv(processed_output_path / "frac_var_sweep.csv")
+    logging.info("Saved frac_var at %d thresholds for %d stations.", len(thresholds), len(table))
+
+
+@app.command()
+def consolidate(
+    daily_output_path: Path = Path(DEFAULT_DATA_DIR + "/daily"),
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+    consolidated_path: Path = Path(CONSOLIDATED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+):
+    """Write the daily store to a single dataset partitioned by country."""
+    stations = pd.read_csv(processed_output_path / "stations.csv", index_col="id")
+    storage.consolidate(DailyStore(daily_output_path), stations, consolidated_path)
+
+
+@app.command()
+def maps(
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+    figures_path: Path = Path(
+        FIGURES_DIR.format(reports_dir=REPORTS_DIR.format(project_root="."))
+    ),
+    max_workers: Optional[int] = None,
+    mode: str = "scatter",
+):
+    """Render the frac_var map of every region in LONG_LAT_DICT."""
+    make_maps.plots(processed_output_path, figures_path, max_workers, mode=mode)
+
+
+@app.command("tiles")
+def export_tiles(
+    processed_output_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DEFAULT_DATA_DIR)),
+    tiles_path: Path = Path(
+        FIGURES_DIR.format(reports_dir=REPORTS_DIR.format(project_root=".")) + "/tiles"
+    ),
+    min_zoom: int = 0,
+    max_zoom: int = 6,
+    max_workers: Optional[int] = None,
+):
+    """Export the frac_var layer as XYZ map tiles, re-rendering only tiles that changed."""
+    tiles.export_tiles(
+        make_maps.load_stations(processed_output_path),
+        tiles_path,
+        min_zoom,
+        max_zoom,
+        max_workers,
+    )
 
 
 if __name__ == "__main__":
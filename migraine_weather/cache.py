@@ -0,0 +1,290 @@
+"""
+Persistent on-disk cache of raw hourly station data
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterator
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+HourlySource = Callable[[str, datetime, datetime], pd.DataFrame | None]
+MultiHourlySource = Callable[[list[str], datetime, datetime], dict[str, pd.DataFrame]]
+
+DEFAULT_MAX_BYTES: int = 20 * 1024**3
+SETTLE_TIME: timedelta = timedelta(days=7)
+QUERY_SIZE: int = 500
+
+
+class HourlyCache:
+    """
+    Per-station, per-year Parquet chunks of hourly data with LRU eviction under a byte budget.
+
+    Each chunk holds a station's data from the start of a year up to the latest time fetched
+    so far for that year. Data newer than SETTLE_TIME is not marked as covered, so late
+    observations are picked up on the next fetch. The index of chunks lives in a small SQLite
+    database next to the chunks, so the cache can be shared between threads and processes.
+
+    Eviction skips the stations of fetches in progress in the same process. A chunk that is
+    indexed but whose file is gone, e.g. evicted by another process, is fetched again.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pinned: Counter[str] = Counter()
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    station TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    covered_until TEXT NOT NULL,
+                    n_bytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (station, year)
+                )
+                """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path / "index.sqlite", timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def _chunk_path(self, station_id: str, year: int) -> Path:
+        return self.path / station_id / f"{year}.parquet"
+
+    def fetch(
+        self, station_id: str, start: datetime, end: datetime, source: HourlySource
+    ) -> pd.DataFrame | None:
+        """
+        Return hourly data for a station, fetching only uncached parts of the range from source.
+
+        Args:
+            station_id: Meteostat station id.
+            start: Start datetime of the range.
+            end: End datetime of the range.
+            source: Callable(station_id, start, end) returning hourly data, or None if empty.
+
+        Returns:
+            Hourly DataFrame indexed by time for the range, or None if there is no data.
+        """
+
+        def source_many(
+            station_ids: list[str], range_start: datetime, range_end: datetime
+        ) -> dict[str, pd.DataFrame]:
+            hourly = source(station_ids[0], range_start, range_end)
+            return {} if hourly is None else {station_ids[0]: hourly}
+
+        return self.fetch_many([station_id], start, end, source_many)[station_id]
+
+    def fetch_many(
+        self, station_ids: list[str], start: datetime, end: datetime, source: MultiHourlySource
+    ) -> dict[str, pd.DataFrame | None]:
+        """
+        Return hourly data for several stations, fetching the uncached parts in few requests.
+
+        The uncached years of each station are coalesced into contiguous ranges, and stations
+        missing the same range, counted from the start of the day it begins, are fetched
+        together in one request. Rows a request returns that are already cached are dropped.
+
+        Args:
+            station_ids: Meteostat station ids.
+            start: Start datetime of the range.
+            end: End datetime of the range.
+            source: Callable(station_ids, start, end) returning a dict mapping station_id ->
+                hourly data, leaving out stations without data.
+
+        Returns:
+            dict mapping station_id -> hourly DataFrame indexed by time for the range, or None
+            if there is no data.
+        """
+        with self._lock:
+            self._pinned.update(station_ids)
+        try:
+            results = self._fetch_pinned(station_ids, start, end, source)
+        finally:
+            with self._lock:
+                self._pinned -= Counter(station_ids)
+        self._evict()
+        return results
+
+    def _fetch_pinned(
+        self, station_ids: list[str], start: datetime, end: datetime, source: MultiHourlySource
+    ) -> dict[str, pd.DataFrame | None]:
+        years = range(start.year, end.year + 1)
+        covered, stored = self._read_covered(station_ids, years)
+
+        requests: dict[tuple[datetime, datetime], list[str]] = defaultdict(list)
+        for station_id in station_ids:
+            for missing in self._missing_ranges(station_id, covered, years, end):
+                requests[missing].append(station_id)
+        fetched: dict[str, list[pd.DataFrame]] = defaultdict(list)
+        for (range_start, range_end), request_ids in requests.items():
+            for station_id, hourly in source(request_ids, range_start, range_end).items():
+                fetched[station_id].append(hourly)
+
+        results = {}
+        for station_id in station_ids:
+            new = pd.concat(fetched[station_id]) if fetched[station_id] else None
+            chunks = []
+            for year in years:
+                year_start = datetime(year, 1, 1)
+                year_end = min(end, datetime(year, 12, 31, 23))  # last hourly slot of the year
+                is_covered = (station_id, year) in covered
+                cached_until = covered.get((station_id, year), year_start - timedelta(seconds=1))
+                cached = stored.get((station_id, year))
+                if is_covered and cached_until >= year_end:
+                    chunks.append(cached)
+                    continue
+
+                if cached is not None:
+                    cached = cached[cached.index <= cached_until]
+                if new is not None:
+                    new_rows = new[(new.index > cached_until) & (new.index <= year_end)]
+                else:
+                    new_rows = None
+                parts = [df for df in (cached, new_rows) if df is not None and not df.empty]
+                chunk = pd.concat(parts) if parts else None
+                settled = max(cached_until, datetime.now() - SETTLE_TIME)
+                self._write_chunk(station_id, year, chunk, min(year_end, settled))
+                chunks.append(chunk)
+
+            frames = [df for df in chunks if df is not None and not df.empty]
+            hourly = pd.concat(frames) if frames else None
+            if hourly is not None:
+                hourly = hourly[(hourly.index >= start) & (hourly.index <= end)]
+            results[station_id] = hourly
+
+        self._touch(station_ids, years)
+        return results
+
+    def _read_covered(
+        self, station_ids: list[str], years: range
+    ) -> tuple[dict[tuple[str, int], datetime], dict[tuple[str, int], pd.DataFrame]]:
+        """
+        Return how far each indexed station-year is covered, and the data of its chunk.
+
+        Station-years whose chunk file has gone missing are left out, so they are refetched.
+        """
+        index = []
+        with self._connect() as conn:
+            for i in range(0, len(station_ids), QUERY_SIZE):
+                chunk = station_ids[i : i + QUERY_SIZE]
+                index += conn.execute(
+                    "SELECT station, year, covered_until, n_bytes FROM chunks "
+                    f"WHERE station IN ({', '.join('?' * len(chunk))}) AND year BETWEEN ? AND ?",
+                    (*chunk, years[0], years[-1]),
+                ).fetchall()
+
+        covered, stored = {}, {}
+        for station_id, year, covered_until, n_bytes in index:
+            if n_bytes:  # empty chunks are indexed without a file
+                chunk = self._read_chunk(station_id, year)
+                if chunk is None:
+                    logging.debug("Hourly cache chunk %s/%d is missing.", station_id, year)
+                    continue
+                stored[(station_id, year)] = chunk
+            covered[(station_id, year)] = datetime.fromisoformat(covered_until)
+        return covered, stored
+
+    @staticmethod
+    def _missing_ranges(
+        station_id: str,
+        covered: dict[tuple[str, int], datetime],
+        years: range,
+        end: datetime,
+    ) -> list[tuple[datetime, datetime]]:
+        """
+        Return the ranges to fetch for a station, one per run of consecutive uncached years,
+        each starting at midnight of the first uncached day.
+        """
+        ranges = []
+        for year in years:
+            year_end = min(end, datetime(year, 12, 31, 23))
+            cached_until = covered.get(
+                (station_id, year), datetime(year, 1, 1) - timedelta(seconds=1)
+            )
+            if cached_until >= year_end:
+                continue
+            if ranges and ranges[-1][1].year == year - 1:
+                ranges[-1] = (ranges[-1][0], year_end)
+            else:
+                first = cached_until + timedelta(seconds=1)
+                ranges.append((datetime(first.year, first.month, first.day), year_end))
+        return ranges
+
+    def _read_chunk(self, station_id: str, year: int) -> pd.DataFrame | None:
+        try:
+            return pd.read_parquet(self._chunk_path(station_id, year))
+        except FileNotFoundError:
+            return None
+
+    def _write_chunk(
+        self, station_id: str, year: int, chunk: pd.DataFrame | None, covered_until: datetime
+    ):
+        chunk_path = self._chunk_path(station_id, year)
+        n_bytes = 0
+        if chunk is not None and not chunk.empty:
+            chunk_path.parent.mkdir(exist_ok=True)
+            tmp_path = chunk_path.with_suffix(f".{os.getpid()}.tmp")
+            chunk.to_parquet(tmp_path)
+            os.replace(tmp_path, chunk_path)
+            n_bytes = chunk_path.stat().st_size
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+                (station_id, year, covered_until.isoformat(), n_bytes, time.time()),
+            )
+
+    def _touch(self, station_ids: list[str], years: range):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE chunks SET last_access = ? WHERE station = ? AND year BETWEEN ? AND ?",
+                [(now, station_id, years[0], years[-1]) for station_id in station_ids],
+            )
+
+    def _evict(self):
+        """
+        Delete least recently used chunks until the cache fits in its byte budget, leaving out
+        the stations of fetches in progress.
+        """
+        with self._lock, self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(n_bytes), 0) FROM chunks").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(
+                "SELECT station, year, n_bytes FROM chunks ORDER BY last_access"
+            ).fetchall()
+            evicted = []
+            for station_id, year, n_bytes in rows:
+                if total <= self.max_bytes:
+                    break
+                if station_id in self._pinned:
+                    continue
+                self._chunk_path(station_id, year).unlink(missing_ok=True)
+                evicted.append((station_id, year))
+                total -= n_bytes
+            conn.executemany("DELETE FROM chunks WHERE station = ? AND year = ?", evicted)
+        logging.debug("Evicted %d hourly cache chunks.", len(evicted))
+
+    def size(self) -> int:
+        """
+        Return the total size of all cached chunks in bytes.
+
+        Returns:
+            Size in bytes.
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(n_bytes), 0) FROM chunks").fetchone()[0]
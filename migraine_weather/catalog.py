@@ -0,0 +1,246 @@
+"""
+Versioned on-disk snapshot of the meteostat station catalog
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import meteostat
+import numpy as np
+import pandas as pd
+
+STATION_QUERY: str = """
+    SELECT s.id, n.name, s.country, s.region,
+           s.latitude, s.longitude, s.elevation, s.timezone
+    FROM stations s
+    INNER JOIN names n ON s.id = n.station AND n.language = 'en'
+    """
+INVENTORY_QUERY: str = """
+    SELECT station, parameter, start, end, completeness
+    FROM inventory
+    """
+
+
+class StationCatalog:
+    """
+    Parquet snapshot of the meteostat stations, names and inventory tables.
+
+    The snapshot is rebuilt only when the upstream stations database changes, identified by
+    a hash of its content. Each version lives in its own directory and CURRENT.json points to
+    the active one, so a rebuild never leaves a half-written snapshot in use. Stations are
+    sorted by country and inventory rows by parameter and start date, so eligibility queries
+    for any date window are a binary search plus a vectorized filter.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._loaded_version: str | None = None
+        self._stations: pd.DataFrame | None = None
+        self._inventory: dict[str, dict[str, np.ndarray]] = {}
+
+    @property
+    def _current_path(self) -> Path:
+        return self.path / "CURRENT.json"
+
+    def _read_current(self) -> dict | None:
+        if not self._current_path.exists():
+            return None
+        return json.loads(self._current_path.read_text())
+
+    def _write_current(self, current: dict):
+        tmp_path = self._current_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(current))
+        os.replace(tmp_path, self._current_path)
+
+    def version(self) -> str | None:
+        """
+        Return the version of the active snapshot.
+
+        Returns:
+            Content hash of the stations database the snapshot was built from, or None if no
+            snapshot exists yet.
+        """
+        current = self._read_current()
+        return current["version"] if current else None
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuild the snapshot if the upstream stations database has changed.
+
+        The database file is hashed only when its size or modification time differs from the
+        one recorded for the active snapshot. If the database cannot be reached, the existing
+        snapshot is kept.
+
+        Args:
+            force: Rebuild even if the upstream database is unchanged.
+
+        Returns:
+            True if a new snapshot was built.
+        """
+        current = self._read_current()
+        db_file = meteostat.config.stations_db_file
+        try:
+            meteostat.stations.connect().close()  # downloads the database when it is stale
+        except Exception:  # pylint: disable=broad-except
+            if current is None:
+                raise
+            logging.warning("Stations database unavailable, using catalog %s.", current["version"])
+            return False
+
+        stat = os.stat(db_file) if db_file else None
+        source_stat = [stat.st_size, stat.st_mtime_ns] if stat else None
+        if not force and current is not None and source_stat is not None:
+            if current["source_stat"] == source_stat:
+                return False
+            version = _file_hash(db_file)
+            if version == current["version"]:
+                self._write_current({**current, "source_stat": source_stat})
+                return False
+        else:
+            version = _file_hash(db_file) if db_file else f"memory-{time.time_ns()}"
+
+        self._build(version, source_stat)
+        return True
+
+    def _build(self, version: str, source_stat: list[int] | None):
+        version_path = self.path / version
+        tmp_path = self.path / f"{version}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir()
+
+        stations = meteostat.stations.query(STATION_QUERY, index_col="id")
+        stations = stations[~stations.index.duplicated()].sort_values(["country"], kind="stable")
+        inventory = meteostat.stations.query(INVENTORY_QUERY)
+        inventory = inventory[inventory["station"].isin(stations.index)]
+        inventory["start"] = pd.to_datetime(inventory["start"])
+        inventory["end"] = pd.to_datetime(inventory["end"])
+        inventory = inventory.sort_values(["parameter", "start"], ignore_index=True)
+        stations.to_parquet(tmp_path / "stations.parquet")
+        inventory.to_parquet(tmp_path / "inventory.parquet", index=False)
+
+        shutil.rmtree(version_path, ignore_errors=True)
+        os.replace(tmp_path, version_path)
+        previous = self.version()
+        self._write_current(
+            {"version": version, "source_stat": source_stat, "built_at": time.time()}
+        )
+        if previous is not None and previous != version:
+            shutil.rmtree(self.path / previous, ignore_errors=True)
+        logging.info(
+            "Built station catalog %s: %d stations, %d inventory rows.",
+            version,
+            len(stations),
+            len(inventory),
+        )
+
+    def _load(self):
+        version = self.version()
+        if version is None:
+            self.refresh()
+            version = self.version()
+        if version == self._loaded_version:
+            return
+        self._stations = pd.read_parquet(self.path / version / "stations.parquet")
+        inventory = pd.read_parquet(self.path / version / "inventory.parquet")
+        inventory["code"] = self._stations.index.get_indexer(inventory["station"])
+        self._inventory = {
+            parameter: {
+                "start": rows["start"].to_numpy("datetime64[ns]"),
+                "end": rows["end"].to_numpy("datetime64[ns]"),
+                "code": rows["code"].to_numpy(),
+                "completeness": rows["completeness"].to_numpy("float64", na_value=np.nan),
+            }
+            for parameter, rows in inventory.groupby("parameter", sort=False)
+        }
+        self._loaded_version = version
+
+    def stations(self, countries: list[str] | None = None) -> pd.DataFrame:
+        """
+        Return station metadata from the snapshot, building it first if there is none.
+
+        Args:
+            countries: Only return stations in these ISO 2 country codes.
+
+        Returns:
+            DataFrame of stations indexed by station id, sorted by country.
+        """
+        self._load()
+        if countries is None:
+            return self._stations
+        return self._stations[self._stations["country"].isin(countries)]
+
+    def eligible_stations(
+        self, start: datetime, end: datetime, parameter: str = "pres"
+    ) -> pd.DataFrame:
+        """
+        Return stations with inventory for a parameter overlapping a date window.
+
+        Gives the same result as the eligibility query run against the stations database.
+
+        Args:
+            start: Start datetime of the window.
+            end: End datetime of the window.
+            parameter: Meteostat parameter that must be in the inventory.
+
+        Returns:
+            DataFrame of eligible stations indexed by station id, including the date range of
+            the parameter's inventory rows that overlap the window (inventory_start,
+            inventory_end) and the share of hours in that range the inventory expects to have
+            data (inventory_completeness, NaN if unknown).
+        """
+        self._load()
+        inventory = self._inventory.get(parameter)
+        if inventory is None:
+            return self._stations.iloc[:0].assign(
+                inventory_start=pd.NaT, inventory_end=pd.NaT, inventory_completeness=np.nan
+            )
+
+        window_start = np.datetime64(pd.Timestamp(start).normalize(), "ns")
+        window_end = np.datetime64(pd.Timestamp(end).normalize(), "ns")
+        n_started = np.searchsorted(inventory["start"], window_end, side="right")
+        overlaps = inventory["end"][:n_started] >= window_start
+        codes = inventory["code"][:n_started][overlaps]
+        starts = inventory["start"][:n_started][overlaps]
+        ends = inventory["end"][:n_started][overlaps]
+        completeness = inventory["completeness"][:n_started][overlaps]
+
+        # Rows are sorted by start, so each station's first row has its earliest start
+        station_codes, first_rows = np.unique(codes, return_index=True)
+        latest_end = np.full(len(self._stations), np.datetime64("NaT"), dtype="datetime64[ns]")
+        np.maximum.at(latest_end.view("int64"), codes, ends.view("int64"))
+        earliest_start = starts[first_rows]
+        latest_end = latest_end[station_codes]
+
+        # Completeness of each row weighted by its days in the window, over the station's span
+        one_day = np.timedelta64(1, "D")
+        overlap_days = (np.minimum(ends, window_end) - np.maximum(starts, window_start)) / one_day
+        weighted = np.zeros(len(self._stations))
+        n_known = np.zeros(len(self._stations), dtype=np.int64)
+        np.add.at(weighted, codes, np.nan_to_num(completeness * (overlap_days + 1)))
+        np.add.at(n_known, codes, ~np.isnan(completeness))
+        span_days = (
+            np.minimum(latest_end, window_end) - np.maximum(earliest_start, window_start)
+        ) / one_day + 1
+        expected = np.minimum(1.0, weighted[station_codes] / span_days)
+        expected[n_known[station_codes] == 0] = np.nan
+
+        return self._stations.iloc[station_codes].assign(
+            inventory_start=earliest_start,
+            inventory_end=latest_end,
+            inventory_completeness=expected,
+        )
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
@@ -8,6 +8,7 @@ DATA_DIR: LiteralString = "{project_root}/data"
 RAW_DATA_DIR: LiteralString = "{data_dir}/raw"
 INTERIM_DATA_DIR: LiteralString = "{data_dir}/interim"
 PROCESSED_DATA_DIR: LiteralString = "{data_dir}/processed"
+CONSOLIDATED_DATA_DIR: LiteralString = "{data_dir}/consolidated"
 MODELS_DIR: LiteralString = "{project_root}/models"
 REPORTS_DIR: LiteralString = "{project_root}/reports"
 FIGURES_DIR: LiteralString = "{reports_dir}/figures"
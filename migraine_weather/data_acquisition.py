@@ -4,123 +4,337 @@ Functions for fetching data
 
 import logging
 import warnings
-import functools
-from functools import partial
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
 
 import meteostat
 import pandas as pd
 
 from . import processing
+from .cache import HourlyCache
+from .catalog import StationCatalog
+from .metrics import METRICS
+from .utils import init_worker_logging
 
+# Country code of each station, shared once per processing worker by init_worker
+_station_countries: dict[str, str] = {}
 
-def _process_station(
-    args: tuple[str, pd.Series],
-    country_code: str,
-    start: datetime,
-    end: datetime,
-) -> tuple[str, pd.DataFrame] | None:
+
+def init_worker(station_countries: dict[str, str]):
     """
-    Fetch and process hourly data for a single station.
+    Initialise a processing worker with logging and the country code of each station.
+
+    Passing the station table through the pool initializer sends it to each worker once,
+    so tasks only need to carry station ids and their data.
 
     Args:
-        args: Tuple of (station_id, station_metadata).
-        country_code: ISO 2 country code, used for logging.
+        station_countries: dict mapping station_id -> ISO 2 country code.
+
+    Returns:
+        None
+    """
+    init_worker_logging()
+    _station_countries.clear()
+    _station_countries.update(station_countries)
+
+
+def _fetch_from_meteostat(station_id: str, start: datetime, end: datetime) -> pd.DataFrame | None:
+    """
+    Fetch hourly pressure for a single station directly from meteostat.
+
+    Only the pressure parameter is requested, so frames carry one column instead of every
+    weather parameter.
+
+    Args:
+        station_id: Meteostat station id.
         start: Start datetime for data fetch.
         end: End datetime for data fetch.
 
     Returns:
-        Tuple of (station_id, daily DataFrame) if station passes quality checks, else None.
+        Hourly DataFrame indexed by time with a 'pres' column, or None if no data is available.
     """
-    station_id, station_meta = args
-    logging.debug("Processing station %s, %s.", station_id, country_code)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=FutureWarning)
+        hourly = meteostat.hourly(
+            station_id, start, end, parameters=[meteostat.Parameter.PRES]
+        ).fetch()
+    return _pressure_only(hourly)
 
+
+def _fetch_many_from_meteostat(
+    station_ids: list[str], start: datetime, end: datetime
+) -> dict[str, pd.DataFrame]:
+    """
+    Fetch hourly pressure for several stations in one meteostat request.
+
+    Args:
+        station_ids: Meteostat station ids.
+        start: Start datetime for data fetch.
+        end: End datetime for data fetch.
+
+    Returns:
+        dict mapping station_id -> hourly DataFrame indexed by time with a 'pres' column,
+        leaving out stations without data.
+    """
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=FutureWarning)
-        station_df = meteostat.hourly(station_id, start, end).fetch()
+        hourly = meteostat.hourly(
+            list(station_ids), start, end, parameters=[meteostat.Parameter.PRES]
+        ).fetch()
+    if hourly is None or hourly.empty:
+        return {}
+    hourly = _pressure_only(hourly)
+    return {
+        station_id: rows.droplevel("station")
+        for station_id, rows in hourly.groupby(level="station", sort=False)
+    }
+
+
+def _pressure_only(hourly: pd.DataFrame | None) -> pd.DataFrame | None:
+    """Keep only the 'pres' column, e.g. of cache chunks written with every weather column."""
+    if hourly is None or list(hourly.columns) == ["pres"]:
+        return hourly
+    return hourly[["pres"]]
+
+
+def fetch_hourly(
+    station_id: str, start: datetime, end: datetime, cache: HourlyCache | None = None
+) -> pd.DataFrame | None:
+    """
+    Fetch hourly data for a single station, reading through the cache if one is given.
+
+    Args:
+        station_id: Meteostat station id.
+        start: Start datetime for data fetch.
+        end: End datetime for data fetch.
+        cache: Optional hourly data cache to read through.
+
+    Returns:
+        Hourly DataFrame indexed by time with a 'pres' column, or None if no data is available.
+    """
+    if cache is not None:
+        return _pressure_only(cache.fetch(station_id, start, end, _fetch_from_meteostat))
+    return _fetch_from_meteostat(station_id, start, end)
+
+
+def fetch_hourly_many(
+    station_ids: list[str], start: datetime, end: datetime, cache: HourlyCache | None = None
+) -> dict[str, pd.DataFrame | None]:
+    """
+    Fetch hourly data for several stations over the same range in as few requests as possible.
+
+    Without a cache, all stations are fetched in one meteostat request. With a cache, only
+    the uncached parts are fetched, with stations missing the same range in one request.
+
+    Args:
+        station_ids: Meteostat station ids.
+        start: Start datetime for data fetch.
+        end: End datetime for data fetch.
+        cache: Optional hourly data cache to read through.
+
+    Returns:
+        dict mapping station_id -> hourly DataFrame indexed by time with a 'pres' column, or
+        None if no data is available.
+    """
+    if cache is not None:
+        hourly = cache.fetch_many(station_ids, start, end, _fetch_many_from_meteostat)
+        return {station_id: _pressure_only(rows) for station_id, rows in hourly.items()}
+    hourly = _fetch_many_from_meteostat(station_ids, start, end)
+    return {station_id: hourly.get(station_id) for station_id in station_ids}
+
+
+def process_hourly(
+    station_id: str, station_df: pd.DataFrame | None, country_code: str
+) -> pd.DataFrame | None:
+    """
+    Quality check hourly data for a single station and reduce it to daily min/max.
 
+    Args:
+        station_id: Meteostat station id, used for logging.
+        station_df: Hourly data for the station. Must contain a 'pres' column.
+        country_code: ISO 2 country code, used for logging.
+
+    Returns:
+        DataFrame(date, pres_min, pres_max) if station passes quality checks, else None.
+    """
     if station_df is None or station_df.empty:
         return None
+    with METRICS.timer("stage_seconds", stage="quality_checks"):
+        passed = _passes_quality_checks(station_id, station_df, country_code)
+    if not passed:
+        return None
+    with METRICS.timer("stage_seconds", stage="daily_reduction"):
+        return processing.get_daily_pressure_range(station_df)
+
+
+def _passes_quality_checks(
+    station_id: str,
+    station_df: pd.DataFrame,
+    country_code: str,
+    state: processing.StationState | None = None,
+) -> bool:
+    """
+    Check that a station's hourly data is complete enough to use.
+
+    Args:
+        station_id: Meteostat station id, used for logging.
+        station_df: Non-empty hourly data for the station. Must contain a 'pres' column.
+        country_code: ISO 2 country code, used for logging.
+        state: State of the station's earlier history, checked together with station_df.
 
+    Returns:
+        True if the station passes the completeness and underreporting checks.
+    """
     # Check completeness
-    na_mask = station_df["pres"].isna()
-    completeness = 1 - na_mask.sum() / len(na_mask)
-    day_complete = (
-        station_df.groupby(pd.Grouper(freq="D")).count()["pres"].value_counts(normalize=True)
-    )
-    underreported_days = sum(day_complete[day_complete.index < 6])
+    n_readings, n_missing, n_days, n_short_days = processing.reading_counts(station_df, state)
+    completeness = 1 - n_missing / n_readings
+    underreported_days = n_short_days / n_days
 
     if completeness < 0.5:
         logging.debug("Completeness below 50%% for station %s, %s.", station_id, country_code)
-        return None
+        return False
     if underreported_days > 0.5:
         logging.debug(
             "More than 50%% underreported days for station %s, %s.", station_id, country_code
         )
-        return None
+        return False
+    return True
+
 
-    daily_df = processing.get_daily_pressure_range(station_df)
-    return (station_id, daily_df)
+def process_batch(
+    items: list[tuple[str, pd.DataFrame | None]],
+) -> list[tuple[str, pd.DataFrame]]:
+    """
+    Quality check hourly data for several stations and reduce them to daily min/max together.
 
+    Gives the same result as process_hourly on each station, but computes the daily ranges of
+    all passing stations in one vectorized pass. Country codes for logging are looked up in
+    the table shared by init_worker.
 
-@functools.lru_cache(maxsize=1)
-def get_eligible_stations(start: datetime, end: datetime) -> pd.DataFrame:
+    Args:
+        items: List of (station_id, hourly DataFrame).
+
+    Returns:
+        List of (station_id, daily DataFrame) for the stations that pass quality checks.
+    """
+    with METRICS.timer("stage_seconds", stage="quality_checks"):
+        passed = {
+            station_id: station_df
+            for station_id, station_df in items
+            if station_df is not None
+            and not station_df.empty
+            and _passes_quality_checks(
+                station_id, station_df, _station_countries.get(station_id, "unknown")
+            )
+        }
+    if not passed:
+        return []
+
+    with METRICS.timer("stage_seconds", stage="daily_reduction"):
+        daily = processing.get_daily_pressure_range_batch(processing.stack_stations(passed))
+        return list(processing.split_stations(daily).items())
+
+
+def update_batch(
+    items: list[tuple[str, pd.DataFrame | None, processing.StationState | None]],
+) -> list[tuple[str, pd.DataFrame, pd.DataFrame, processing.StationState]]:
+    """
+    Quality check and reduce hourly data for several stations, continuing stored stations.
+
+    New stations (without a state) give the same daily rows as process_batch. For stored
+    stations, the hourly data from their state's last day on is folded into the state, so
+    the quality checks and outlier bounds cover the whole history, and daily rows are only
+    computed for the new days. DailyStore.update then re-evaluates earlier days if the
+    bounds moved.
+
+    Args:
+        items: List of (station_id, hourly DataFrame, state or None).
+
+    Returns:
+        List of (station_id, daily DataFrame, day statistics, new state) for the stations
+        that pass quality checks.
+    """
+    updates = {}
+    for station_id, station_df, state in items:
+        if station_df is None or station_df.empty:
+            continue
+        if state is not None:
+            station_df = station_df[station_df.index >= state.until]
+        country_code = _station_countries.get(station_id, "unknown")
+        with METRICS.timer("stage_seconds", stage="quality_checks"):
+            passed = not station_df.empty and _passes_quality_checks(
+                station_id, station_df, country_code, state
+            )
+        if not passed:
+            continue
+        with METRICS.timer("stage_seconds", stage="daily_reduction"):
+            updates[station_id] = (
+                station_df,
+                *processing.advance_station_state(station_df, state),
+            )
+        METRICS.count("rows_processed", len(station_df))
+
+    new = {
+        station_id: station_df
+        for (station_id, station_df, state) in items
+        if state is None and station_id in updates
+    }
+    with METRICS.timer("stage_seconds", stage="daily_reduction"):
+        daily = {}
+        if new:
+            daily = processing.split_stations(
+                processing.get_daily_pressure_range_batch(processing.stack_stations(new))
+            )
+
+        results = []
+        for station_id, (station_df, stats, state) in updates.items():
+            if station_id in new and station_id not in daily:
+                continue  # Every day removed as outliers
+            if station_id not in daily:
+                dtype = str(station_df["pres"].dtype)
+                daily[station_id] = processing.daily_from_day_stats(stats, state.bounds, dtype)
+            results.append((station_id, daily[station_id], stats, state))
+    return results
+
+
+def get_eligible_stations(
+    start: datetime, end: datetime, catalog: StationCatalog | None = None
+) -> pd.DataFrame:
     """
     Fetch all weather stations with pressure data available in the given time range.
 
     Args:
         start: Start datetime for data availability check.
         end: End datetime for data availability check.
+        catalog: Optional station catalog snapshot to answer from instead of querying the
+            meteostat stations database.
 
     Returns:
-        DataFrame of eligible stations indexed by station id.
+        DataFrame of eligible stations indexed by station id, including the date range of
+        pressure data in the inventory (inventory_start, inventory_end) and the share of hours
+        in that range the inventory expects to have data (inventory_completeness).
     """
+    if catalog is not None:
+        return catalog.eligible_stations(start, end)
     return meteostat.stations.query(
         """
-          SELECT DISTINCT s.id, n.name, s.country, s.region,
-                 s.latitude, s.longitude, s.elevation, s.timezone
+          SELECT s.id, n.name, s.country, s.region,
+                 s.latitude, s.longitude, s.elevation, s.timezone,
+                 MIN(i.start) AS inventory_start, MAX(i.end) AS inventory_end,
+                 MIN(
+                     1.0,
+                     SUM(i.completeness * (julianday(MIN(i.end, :end))
+                                           - julianday(MAX(i.start, :start)) + 1))
+                     / (julianday(MIN(MAX(i.end), :end))
+                        - julianday(MAX(MIN(i.start), :start)) + 1)
+                 ) AS inventory_completeness
           FROM stations s
           INNER JOIN names n ON s.id = n.station AND n.language = 'en'
           INNER JOIN inventory i ON s.id = i.station
           WHERE i.parameter = 'pres'
             AND i.start <= :end
             AND i.end >= :start
+          GROUP BY s.id
           """,
         index_col="id",
         params={"start": start.strftime("%Y-%m-%d"), "end": end.strftime("%Y-%m-%d")},
     )
-
-
-def make_dataset(
-    country_code: str, country_station_data: pd.DataFrame, start: datetime, end: datetime
-) -> dict[str, pd.DataFrame]:
-    """
-    Fetch and process hourly pressure data per station, returning daily min/max.
-
-    Args:
-        country_code: ISO 2 country code.
-        country_station_data: DataFrame of eligible stations.
-        start: Start datetime for data analysis.
-        end: End datetime for data analysis.
-
-    Returns:
-        dict mapping station_id -> DataFrame(date, pres_min, pres_max)
-    """
-    if country_station_data.empty:
-        logging.warning("No suitable stations available for country code %s.", country_code)
-        return {}
-
-    process = partial(_process_station, country_code=country_code, start=start, end=end)
-    station_items = list(country_station_data.iterrows())
-
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = executor.map(process, station_items)
-        try:
-            results = list(futures)
-        except KeyboardInterrupt:
-            logging.info("Interrupted during station processing for %s.", country_code)
-            executor.shutdown(wait=False, cancel_futures=True)
-            raise
-
-    return {station_id: daily_df for r in results if r is not None for station_id, daily_df in [r]}
@@ -0,0 +1,535 @@
+"""
+Asynchronous engine for fetching and processing station data
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Protocol
+
+import numpy as np
+import pandas as pd
+
+from . import data_acquisition
+from .cache import HourlyCache
+from .metrics import METRICS, Progress
+from .processing import StationState
+from .storage import DailyStore
+
+# A station needs at least 6 readings on half of its days, i.e. 12.5% of hours, to pass the
+# quality checks. Stations the inventory expects to be below this (with some margin for the
+# estimate) are rejected before fetching.
+MIN_EXPECTED_COMPLETENESS: float = 0.1
+RETRY_REJECTED_AFTER: timedelta = timedelta(days=365)
+PROGRESS_INTERVAL: float = 60.0
+# meteostat fetches the stations of a multi-station request one after another, so requests
+# are kept small enough that every fetch slot stays busy
+MAX_FETCH_GROUP: int = 64
+
+
+@dataclass(frozen=True)
+class StationJob:
+    """
+    A single station to fetch and process over a time range.
+
+    inventory_end is only set for stations that are not in the store yet, so that a station
+    failing its first fetch is recorded in the rejection ledger. state is the stored state of
+    a station that is continued from its last day.
+    """
+
+    station_id: str
+    country: str
+    start: datetime
+    end: datetime
+    expected_rows: int = 0
+    inventory_end: datetime | None = None
+    state: StationState | None = None
+
+
+@dataclass(frozen=True)
+class FetchRequest:
+    """
+    Station jobs fetched together in one request over a shared range.
+
+    start is midnight of the day the jobs start, so jobs starting at different times on the
+    same day share a request. Rows before a job's own start are dropped after fetching.
+    """
+
+    jobs: tuple[StationJob, ...]
+    start: datetime
+    end: datetime
+
+
+class HourlySource(Protocol):
+    """
+    Anything that can fetch hourly data for a station, e.g. meteostat or a local stand-in.
+
+    Sources that also have a fetch_many(station_ids, start, end) method, returning a dict
+    mapping station_id -> hourly data or None, get stations that share a range in one call.
+    """
+
+    def fetch(self, station_id: str, start: datetime, end: datetime) -> pd.DataFrame | None:
+        """
+        Fetch hourly data for a station over a time range.
+        """
+        ...
+
+
+class MeteostatSource:
+    """
+    Hourly data from meteostat, read through the hourly cache if one is given.
+    """
+
+    def __init__(self, cache: HourlyCache | None = None):
+        self.cache = cache
+
+    def fetch(self, station_id: str, start: datetime, end: datetime) -> pd.DataFrame | None:
+        """
+        Fetch hourly data for a station over a time range.
+
+        Args:
+            station_id: Meteostat station id.
+            start: Start datetime for data fetch.
+            end: End datetime for data fetch.
+
+        Returns:
+            Hourly DataFrame indexed by time, or None if no data is available.
+        """
+        return data_acquisition.fetch_hourly(station_id, start, end, self.cache)
+
+    def fetch_many(
+        self, station_ids: list[str], start: datetime, end: datetime
+    ) -> dict[str, pd.DataFrame | None]:
+        """
+        Fetch hourly data for several stations over the same range in as few requests as
+        possible.
+
+        Args:
+            station_ids: Meteostat station ids.
+            start: Start datetime for data fetch.
+            end: End datetime for data fetch.
+
+        Returns:
+            dict mapping station_id -> hourly DataFrame indexed by time, or None if no data
+            is available.
+        """
+        return data_acquisition.fetch_hourly_many(station_ids, start, end, self.cache)
+
+
+def prescreen(
+    stations: pd.DataFrame,
+    store: DailyStore,
+    min_completeness: float = MIN_EXPECTED_COMPLETENESS,
+    now: datetime | None = None,
+) -> pd.DataFrame:
+    """
+    Drop stations not stored yet that are known or expected to fail the quality checks.
+
+    Stations in the rejection ledger are skipped until their inventory has grown by
+    RETRY_REJECTED_AFTER, or for that long since the rejection if the inventory is unknown.
+    Stations whose inventory completeness is below min_completeness are added to the ledger
+    without fetching. Stations already in the store are always kept.
+
+    Args:
+        stations: DataFrame of eligible stations indexed by station id, optionally with
+            inventory_end and inventory_completeness columns.
+        store: Daily store holding previously processed stations and the rejection ledger.
+        min_completeness: Minimum expected share of hours with data.
+        now: Current time, for the retry interval of rejections without inventory.
+
+    Returns:
+        The stations to plan jobs for.
+    """
+    now = now or datetime.now()
+    new = ~stations.index.isin(store.manifest().index)
+    ledger = store.rejections().reindex(stations.index)
+    if "inventory_end" in stations.columns:
+        inventory_end = pd.to_datetime(stations["inventory_end"])
+    else:
+        inventory_end = pd.Series(pd.NaT, index=stations.index)
+
+    retry = (inventory_end >= ledger["inventory_end"] + RETRY_REJECTED_AFTER) | (
+        (inventory_end.isna() | ledger["inventory_end"].isna())
+        & (ledger["rejected_at"] + RETRY_REJECTED_AFTER <= now)
+    )
+    ledgered = new & ledger["reason"].notna().to_numpy() & ~retry.to_numpy()
+
+    screened = np.zeros(len(stations), dtype=bool)
+    if "inventory_completeness" in stations.columns:
+        screened = new & ~ledgered & (stations["inventory_completeness"] < min_completeness)
+        screened = screened.to_numpy()
+        for station_id in stations.index[screened]:
+            store.reject(station_id, "inventory", inventory_end[station_id])
+
+    METRICS.count("stations_skipped", int(ledgered.sum()), reason="ledger")
+    METRICS.count("stations_skipped", int(screened.sum()), reason="inventory")
+    logging.info(
+        "Pre-screen skipped %d stations: %d in the rejection ledger, %d with low inventory "
+        "completeness.",
+        ledgered.sum() + screened.sum(),
+        ledgered.sum(),
+        screened.sum(),
+    )
+    return stations[~(ledgered | screened)]
+
+
+def plan_jobs(
+    stations: pd.DataFrame, store: DailyStore, start: datetime, end: datetime
+) -> list[StationJob]:
+    """
+    Create full fetch jobs for new stations and incremental jobs for stations already stored.
+
+    Args:
+        stations: DataFrame of eligible stations indexed by station id, with a country column.
+        store: Daily store holding previously processed stations.
+        start: Start datetime for new stations.
+        end: End datetime for all stations.
+
+    Stations with a stored state start again from its last day, which may have been partial.
+    Stored stations already fetched up to the end, or past the end of their inventory, are up
+    to date. Stations stored before states were kept are fetched in full once, so that their
+    outlier bounds cover their whole history, unless they are up to date. Every decision is
+    answered from one read of the store's manifest and one of the states of stations to fetch.
+
+    Freshness is measured against this run's end, so when the end moves on every run, as the
+    default end of now does, stations still reporting are fetched again from their last day
+    each run. Only a repeated window, or a station whose inventory has ended, is skipped.
+
+    Returns:
+        List of station jobs, skipping stations that are already up to date. Each job's
+        expected_rows is the number of hours in its range covered by the station's inventory
+        (inventory_start, inventory_end), or in the whole range if the inventory is unknown.
+    """
+    has_inventory = {"inventory_start", "inventory_end"} <= set(stations.columns)
+    manifest = store.manifest().reindex(stations.index)
+    fresh_until = pd.Series(pd.Timestamp(end), index=stations.index)
+    if has_inventory:
+        inventory_end = pd.to_datetime(stations["inventory_end"]) + timedelta(days=1)
+        fresh_until = fresh_until.where(fresh_until <= inventory_end, inventory_end)
+    fresh = (manifest["fetched_until"] >= fresh_until).to_numpy()
+    METRICS.count("stations_skipped", int(fresh.sum()), reason="up_to_date")
+    stations, manifest = stations[~fresh], manifest[~fresh]
+    states = store.station_states(list(manifest.index[manifest["last_date"].notna()]))
+
+    jobs = []
+    refetched = 0
+    for (station_id, station), last_date in zip(stations.iterrows(), manifest["last_date"]):
+        state = states.get(station_id)
+        if state is not None:
+            job_start = state.until.to_pydatetime()
+        elif pd.notna(last_date) and last_date.to_pydatetime() + timedelta(days=1) >= end:
+            METRICS.count("stations_skipped", reason="up_to_date")
+            continue
+        else:
+            job_start = start
+            refetched += pd.notna(last_date)
+        if job_start >= end:
+            METRICS.count("stations_skipped", reason="up_to_date")
+            continue
+        covered_start, covered_end = job_start, end
+        if has_inventory:
+            covered_start = max(job_start, pd.Timestamp(station["inventory_start"]))
+            covered_end = min(end, pd.Timestamp(station["inventory_end"]) + timedelta(days=1))
+        expected_rows = max(0, int((covered_end - covered_start) / timedelta(hours=1)))
+        inventory_end = None
+        if pd.isna(last_date):
+            inventory_end = pd.Timestamp(station["inventory_end"]) if has_inventory else end
+        jobs.append(
+            StationJob(
+                station_id, station["country"], job_start, end, expected_rows, inventory_end, state
+            )
+        )
+    if refetched:
+        logging.info("Refetching %d stored stations in full to start their state.", refetched)
+    return jobs
+
+
+def skip_finished(stations: pd.DataFrame, store: DailyStore, run_id: int) -> pd.DataFrame:
+    """
+    Drop stations that a resumed run already finished before it was interrupted.
+
+    Args:
+        stations: DataFrame of eligible stations indexed by station id.
+        store: Daily store holding the run's journal.
+        run_id: Id of the run being resumed.
+
+    Returns:
+        The stations the run has not finished yet.
+    """
+    finished = stations.index.isin(list(store.finished_stations(run_id)))
+    METRICS.count("stations_skipped", int(finished.sum()), reason="resumed")
+    return stations[~finished]
+
+
+def balance_batches(jobs: list[StationJob], target_rows: int) -> list[list[StationJob]]:
+    """
+    Split jobs into batches of roughly equal expected cost, most expensive first.
+
+    Jobs expected to return at least target_rows hourly rows get a batch of their own, and
+    smaller jobs are packed together up to target_rows. Running the batches in this order
+    keeps the largest stations away from the tail of the run.
+
+    Args:
+        jobs: Station jobs to schedule.
+        target_rows: Expected hourly rows per batch.
+
+    Returns:
+        List of batches, in decreasing order of expected cost.
+    """
+    batches: list[list[StationJob]] = []
+    batch: list[StationJob] = []
+    batch_rows = 0
+    for job in sorted(jobs, key=lambda job: job.expected_rows, reverse=True):
+        if batch and batch_rows + job.expected_rows > target_rows:
+            batches.append(batch)
+            batch, batch_rows = [], 0
+        batch.append(job)
+        batch_rows += job.expected_rows
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def group_fetches(jobs: list[StationJob], concurrency: int) -> list[FetchRequest]:
+    """
+    Group jobs that start on the same day and share an end into multi-station requests.
+
+    In a daily incremental run most stored stations continue from the same day, so they are
+    fetched in a few requests instead of one each. Each group is split into at most
+    `concurrency` requests of at most MAX_FETCH_GROUP stations.
+
+    Args:
+        jobs: Station jobs, e.g. a batch from balance_batches.
+        concurrency: Number of requests that can be in flight at once.
+
+    Returns:
+        List of fetch requests covering every job once.
+    """
+    groups: dict[tuple[datetime, datetime], list[StationJob]] = defaultdict(list)
+    for job in jobs:
+        groups[(datetime(job.start.year, job.start.month, job.start.day), job.end)].append(job)
+    requests = []
+    for (start, end), group in groups.items():
+        size = min(MAX_FETCH_GROUP, -(-len(group) // concurrency))
+        for i in range(0, len(group), size):
+            requests.append(FetchRequest(tuple(group[i : i + size]), start, end))
+    return requests
+
+
+def run_batches(
+    batches: list[list[StationJob]],
+    source: HourlySource,
+    store: DailyStore,
+    concurrency: int = 16,
+    cpu_workers: int = 1,
+    progress_interval: float = PROGRESS_INTERVAL,
+    run_id: int | None = None,
+) -> int:
+    """
+    Fetch, process and store batches of stations with a global limit on in-flight fetches.
+
+    Batches are taken in order from one bounded queue. At most `concurrency` fetches run at
+    once across all batches, in a thread pool. If the source has a fetch_many method, the
+    jobs of a batch that start on the same day are fetched together, see group_fetches. Once
+    a batch is fetched, its quality checks and daily aggregation run as one task on a
+    separate process pool of `cpu_workers` processes, continuing the stored state of
+    stations already in the store.
+    The station table is sent to each process once, so tasks only carry ids and hourly data.
+
+    Stage timings, rows fetched and their in-memory size, station outcomes and queue depths
+    are recorded in METRICS, including those of the processing workers, and a progress line
+    with the rate and estimated time remaining is logged every `progress_interval` seconds.
+
+    The end of every fetch that did not fail is recorded in the store's manifest, so later
+    runs skip stations until their window or inventory extends past it.
+    With a run_id, the stations each batch wrote or rejected are recorded in the store's
+    journal once the batch is done, so an interrupted run can be resumed without them.
+    Stations that failed to fetch or process are not recorded and are tried again.
+
+    Args:
+        batches: Batches of station jobs, e.g. from balance_batches.
+        source: Source of hourly data.
+        store: Daily store to append results to.
+        concurrency: Maximum number of fetches in flight at once.
+        cpu_workers: Number of processes for the processing step.
+        progress_interval: Seconds between progress lines.
+        run_id: Run to journal finished stations under, see DailyStore.start_run.
+
+    Returns:
+        Number of stations written to the store.
+    """
+    return asyncio.run(
+        _run_batches(batches, source, store, concurrency, cpu_workers, progress_interval, run_id)
+    )
+
+
+def _process_batch_task(
+    items: list[tuple[str, pd.DataFrame | None, StationState | None]],
+) -> tuple[list[tuple[str, pd.DataFrame, pd.DataFrame, StationState]], dict]:
+    """Run update_batch in a worker and return its results with the metrics it recorded."""
+    METRICS.reset()
+    return data_acquisition.update_batch(items), METRICS.snapshot()
+
+
+async def _run_batches(
+    batches: list[list[StationJob]],
+    source: HourlySource,
+    store: DailyStore,
+    concurrency: int,
+    cpu_workers: int,
+    progress_interval: float,
+    run_id: int | None,
+) -> int:
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[list[StationJob] | None] = asyncio.Queue(maxsize=cpu_workers)
+    fetch_slots = asyncio.Semaphore(concurrency)
+    io_pool = ThreadPoolExecutor(max_workers=concurrency)
+    station_countries = {job.station_id: job.country for batch in batches for job in batch}
+    cpu_pool = ProcessPoolExecutor(
+        max_workers=cpu_workers,
+        initializer=data_acquisition.init_worker,
+        initargs=(station_countries,),
+    )
+    progress = Progress(sum(len(batch) for batch in batches))
+    n_workers = min(concurrency, max(1, len(batches)))
+    written = 0
+    in_flight = 0
+    failed: set[str] = set()
+
+    async def produce():
+        for batch in batches:
+            await queue.put(batch)
+            METRICS.gauge("batch_queue_depth", queue.qsize())
+        for _ in range(n_workers):
+            await queue.put(None)
+
+    fetch_many = getattr(source, "fetch_many", None)
+
+    def record_fetched(hourly: pd.DataFrame | None):
+        if hourly is not None:
+            METRICS.count("rows_fetched", len(hourly))
+            # In-memory size of the returned frames, not the bytes downloaded
+            METRICS.count("frame_bytes_fetched", int(hourly.memory_usage(deep=True).sum()))
+
+    async def fetch(job: StationJob) -> pd.DataFrame | None:
+        nonlocal in_flight
+        async with fetch_slots:
+            in_flight += 1
+            METRICS.gauge("fetches_in_flight", in_flight)
+            try:
+                with METRICS.timer("stage_seconds", stage="fetch"):
+                    hourly = await loop.run_in_executor(
+                        io_pool, source.fetch, job.station_id, job.start, job.end
+                    )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Failed to fetch station %s, %s.", job.station_id, job.country)
+                failed.add(job.station_id)
+                METRICS.count("stations_failed", stage="fetch")
+                return None
+            finally:
+                in_flight -= 1
+        METRICS.count("fetch_requests")
+        record_fetched(hourly)
+        return hourly
+
+    async def fetch_request(request: FetchRequest) -> dict[str, pd.DataFrame | None]:
+        nonlocal in_flight
+        station_ids = [job.station_id for job in request.jobs]
+        async with fetch_slots:
+            in_flight += 1
+            METRICS.gauge("fetches_in_flight", in_flight)
+            try:
+                with METRICS.timer("stage_seconds", stage="fetch"):
+                    hourly = await loop.run_in_executor(
+                        io_pool, fetch_many, station_ids, request.start, request.end
+                    )
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(
+                    "Failed to fetch %d stations from %s.", len(station_ids), request.start
+                )
+                failed.update(station_ids)
+                METRICS.count("stations_failed", len(station_ids), stage="fetch")
+                return {}
+            finally:
+                in_flight -= 1
+        METRICS.count("fetch_requests")
+        results = {}
+        for job in request.jobs:
+            rows = hourly.get(job.station_id)
+            if rows is not None:
+                rows = rows[rows.index >= job.start]
+            record_fetched(rows)
+            results[job.station_id] = rows
+        return results
+
+    async def fetch_batch(batch: list[StationJob]) -> list[pd.DataFrame | None]:
+        if fetch_many is None:
+            return await asyncio.gather(*(fetch(job) for job in batch))
+        fetched = {}
+        requests = group_fetches(batch, concurrency)
+        for results in await asyncio.gather(*(fetch_request(r) for r in requests)):
+            fetched.update(results)
+        return [fetched.get(job.station_id) for job in batch]
+
+    async def work():
+        nonlocal written
+        while (batch := await queue.get()) is not None:
+            METRICS.gauge("batch_queue_depth", queue.qsize())
+            hourly = await fetch_batch(batch)
+            items = [(job.station_id, df, job.state) for job, df in zip(batch, hourly)]
+            no_data = {job.station_id for job, df in zip(batch, hourly) if df is None or df.empty}
+            del hourly
+            try:
+                results, worker_metrics = await loop.run_in_executor(
+                    cpu_pool, _process_batch_task, items
+                )
+                METRICS.merge(worker_metrics)
+                del items
+                for station_id, daily, stats, state in results:
+                    with METRICS.timer("stage_seconds", stage="store"):
+                        await loop.run_in_executor(
+                            io_pool, store.update, station_id, daily, stats, state
+                        )
+                    written += 1
+                METRICS.count("stations_written", len(results))
+                outcomes = {station_id: "written" for station_id, *_ in results}
+                for job in batch:
+                    if job.station_id in outcomes or job.station_id in failed:
+                        continue
+                    outcomes[job.station_id] = "rejected"
+                    reason = "no data" if job.station_id in no_data else "quality"
+                    METRICS.count("stations_rejected", reason=reason)
+                    if job.inventory_end is None:
+                        continue
+                    await loop.run_in_executor(
+                        io_pool, store.reject, job.station_id, reason, job.inventory_end
+                    )
+                fetched = {
+                    job.station_id: job.end for job in batch if job.station_id not in failed
+                }
+                await loop.run_in_executor(io_pool, store.mark_fetched, fetched)
+                if run_id is not None:
+                    await loop.run_in_executor(io_pool, store.journal, run_id, outcomes)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception("Failed to process a batch of %d stations.", len(batch))
+                METRICS.count("stations_failed", len(batch), stage="process")
+            progress.done += len(batch)
+            logging.debug(progress.line())
+
+    async def report():
+        while True:
+            await asyncio.sleep(progress_interval)
+            logging.info(progress.line())
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(n_workers)))
+    finally:
+        reporter.cancel()
+        io_pool.shutdown(wait=False, cancel_futures=True)
+        cpu_pool.shutdown(wait=False, cancel_futures=True)
+    logging.info(progress.line())
+    return written
@@ -0,0 +1,155 @@
+"""
+Array kernels for the per-station hourly to daily reduction
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    import numba
+except ImportError:  # numba is an optional dependency
+    numba = None
+
+BACKEND: str = "numba" if numba is not None else "numpy"
+NS_PER_HOUR: float = 3.6e12
+NS_PER_DAY: int = 86_400 * 10**9
+
+
+def supports(dataframe: pd.DataFrame) -> bool:
+    """
+    Check that an hourly frame can be reduced by daily_pressure_range.
+
+    Args:
+        dataframe: Hourly pressure data for a single station.
+
+    Returns:
+        True if the frame is non-empty with a sorted, timezone-naive DatetimeIndex.
+    """
+    index = dataframe.index
+    return (
+        len(dataframe) > 0
+        and isinstance(index, pd.DatetimeIndex)
+        and index.tz is None
+        and index.is_monotonic_increasing
+    )
+
+
+def daily_pressure_range(dataframe: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    Remove outlier days and reduce hourly pressure to daily min/max in a few linear passes.
+
+    Gives the same result as get_daily_pressure_range: the hourly rate of change and its IQR
+    bounds, the number of outliers per day and the daily min/max of the remaining days are
+    computed on contiguous int64 timestamps and float64 pressures, with the per-row loops
+    compiled by numba when it is installed.
+
+    Args:
+        dataframe: Hourly pressure data for a single station, accepted by supports(). Must
+            contain a 'pres' column.
+
+    Returns:
+        DataFrame with columns: date, pres_min, pres_max, or None if every day is removed.
+    """
+    index = pd.DatetimeIndex(dataframe.index)
+    times = index.to_numpy().astype("datetime64[ns]").view(np.int64)
+    pres = dataframe["pres"].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    dpres = np.full(len(pres), np.nan)
+    dpres[1:] = np.diff(pres) / (np.diff(times) / NS_PER_HOUR)
+    if np.isnan(dpres).all():
+        lower, upper = -np.inf, np.inf
+    else:
+        q25, q75 = np.nanquantile(dpres, [0.25, 0.75])
+        iqr = q75 - q25
+        lower, upper = q25 - 3 * iqr, q75 + 3 * iqr
+
+    day_offsets = times // NS_PER_DAY
+    first_day = day_offsets[0]
+    day_offsets -= first_day
+    kept, pres_min, pres_max = _day_min_max(day_offsets, pres, dpres, lower, upper)
+    kept_days = np.flatnonzero(kept)
+    if len(kept_days) == 0:
+        return None
+
+    # Days between the first and last kept day, as pd.Grouper reinstates them
+    days = slice(kept_days[0], kept_days[-1] + 1)
+    dates = (np.arange(days.start, days.stop) + first_day) * NS_PER_DAY
+    dtype = dataframe["pres"].dtype
+    return pd.DataFrame(
+        {
+            "date": dates.astype("datetime64[ns]").astype(index.dtype),
+            "pres_min": pd.array(pres_min[days]).astype(dtype),
+            "pres_max": pd.array(pres_max[days]).astype(dtype),
+        }
+    )
+
+
+def _day_min_max_numpy(
+    day_offsets: np.ndarray, pres: np.ndarray, dpres: np.ndarray, lower: float, upper: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Count outliers per day, then take the min/max of days with at most one outlier.
+
+    Args:
+        day_offsets: Sorted day of each reading, counted from the first day.
+        pres: Pressure of each reading, NaN if missing.
+        dpres: Hourly rate of change of each reading, NaN if undefined.
+        lower: Rates below this are outliers.
+        upper: Rates above this are outliers.
+
+    Returns:
+        Tuple of arrays over days: kept (day has readings and is not removed), pres_min and
+        pres_max (NaN for days without kept pressures).
+    """
+    n_days = day_offsets[-1] + 1
+    is_outlier = (dpres < lower) | (dpres > upper)
+    outliers = np.bincount(day_offsets[is_outlier], minlength=n_days)
+    keep = outliers[day_offsets] <= 1
+    kept = np.bincount(day_offsets[keep], minlength=n_days) > 0
+
+    valid = keep & ~np.isnan(pres)
+    valid_days, valid_pres = day_offsets[valid], pres[valid]
+    pres_min = np.full(n_days, np.nan)
+    pres_max = np.full(n_days, np.nan)
+    if len(valid_days):
+        starts = np.flatnonzero(np.diff(valid_days, prepend=-1))
+        pres_min[valid_days[starts]] = np.minimum.reduceat(valid_pres, starts)
+        pres_max[valid_days[starts]] = np.maximum.reduceat(valid_pres, starts)
+    return kept, pres_min, pres_max
+
+
+def _day_min_max_loops(
+    day_offsets: np.ndarray, pres: np.ndarray, dpres: np.ndarray, lower: float, upper: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same as _day_min_max_numpy as two explicit loops over the readings, for numba to compile.
+    """
+    n_days = day_offsets[-1] + 1
+    outliers = np.zeros(n_days, dtype=np.int64)
+    for i in range(len(day_offsets)):
+        if dpres[i] < lower or dpres[i] > upper:
+            outliers[day_offsets[i]] += 1
+
+    kept = np.zeros(n_days, dtype=np.bool_)
+    pres_min = np.full(n_days, np.nan)
+    pres_max = np.full(n_days, np.nan)
+    for i in range(len(day_offsets)):
+        day = day_offsets[i]
+        if outliers[day] > 1:
+            continue
+        kept[day] = True
+        value = pres[i]
+        if np.isnan(value):
+            continue
+        if np.isnan(pres_min[day]) or value < pres_min[day]:
+            pres_min[day] = value
+        if np.isnan(pres_max[day]) or value > pres_max[day]:
+            pres_max[day] = value
+    return kept, pres_min, pres_max
+
+
+_day_min_max = (
+    numba.njit(cache=True, nogil=True)(_day_min_max_loops)
+    if numba is not None
+    else _day_min_max_numpy
+)
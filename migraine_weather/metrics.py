@@ -0,0 +1,251 @@
+"""
+Counters, timers and gauges for pipeline runs, with JSON and Prometheus text reports
+"""
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+PROMETHEUS_PREFIX: str = "migraine_weather_"
+
+Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _key(name: str, labels: dict[str, str]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+class Metrics:
+    """
+    Thread-safe registry of named metrics, each optionally split by labels.
+
+    Counters add up, timers keep the count, total and maximum of their durations, and
+    gauges keep their last and maximum value. Process-pool workers record into their own
+    registry and send a snapshot back with each result, which the main process merges.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Remove every recorded metric.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.counters: dict[Key, float] = {}
+            self.timers: dict[Key, list[float]] = {}
+            self.gauges: dict[Key, list[float]] = {}
+
+    def count(self, name: str, value: float = 1, **labels: str):
+        """
+        Add to a counter.
+
+        Args:
+            name: Counter name, e.g. 'rows_fetched'.
+            value: Amount to add.
+            labels: Labels splitting the counter, e.g. reason='quality'.
+
+        Returns:
+            None
+        """
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        """
+        Record a duration in a timer.
+
+        Args:
+            name: Timer name, e.g. 'stage_seconds'.
+            seconds: Duration to record.
+            labels: Labels splitting the timer, e.g. stage='fetch'.
+
+        Returns:
+            None
+        """
+        key = _key(name, labels)
+        with self._lock:
+            count, total, longest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = [count + 1, total + seconds, max(longest, seconds)]
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Time the body of a with statement into a timer, see observe.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name: str, value: float, **labels: str):
+        """
+        Set a gauge, e.g. a queue depth, keeping the highest value seen.
+
+        Args:
+            name: Gauge name.
+            value: Current value.
+            labels: Labels splitting the gauge.
+
+        Returns:
+            None
+        """
+        key = _key(name, labels)
+        with self._lock:
+            _, highest = self.gauges.get(key, (value, value))
+            self.gauges[key] = [value, max(highest, value)]
+
+    def snapshot(self) -> dict[str, dict[Key, float | list[float]]]:
+        """
+        Copy the recorded metrics, e.g. to send them from a worker to the main process.
+
+        Returns:
+            dict with counters, timers and gauges, for merge.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {key: list(value) for key, value in self.timers.items()},
+                "gauges": {key: list(value) for key, value in self.gauges.items()},
+            }
+
+    def merge(self, snapshot: dict[str, dict[Key, float | list[float]]]):
+        """
+        Add the metrics of a snapshot taken in another registry.
+
+        Args:
+            snapshot: Snapshot returned by another registry's snapshot().
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (count, total, longest) in snapshot["timers"].items():
+                mine = self.timers.get(key, [0, 0.0, 0.0])
+                self.timers[key] = [mine[0] + count, mine[1] + total, max(mine[2], longest)]
+            for key, (value, highest) in snapshot["gauges"].items():
+                mine = self.gauges.get(key, [value, highest])
+                self.gauges[key] = [value, max(mine[1], highest)]
+
+    def to_dict(self) -> dict[str, list[dict]]:
+        """
+        Return the recorded metrics in a JSON serialisable form.
+
+        Returns:
+            dict with lists of counters (name, labels, value), timers (name, labels, count,
+            total_seconds, max_seconds) and gauges (name, labels, value, max).
+        """
+        snapshot = self.snapshot()
+
+        def entries(metrics: dict, fields: list[str]) -> list[dict]:
+            return [
+                {"name": name, "labels": dict(labels)}
+                | dict(zip(fields, value if isinstance(value, list) else [value]))
+                for (name, labels), value in sorted(metrics.items())
+            ]
+
+        return {
+            "counters": entries(snapshot["counters"], ["value"]),
+            "timers": entries(snapshot["timers"], ["count", "total_seconds", "max_seconds"]),
+            "gauges": entries(snapshot["gauges"], ["value", "max"]),
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Return the recorded metrics in the Prometheus text exposition format.
+
+        Counters get a _total suffix, timers are summaries with _count and _sum samples, and
+        the maximum of each timer and gauge is a separate _max gauge.
+
+        Returns:
+            Text with one sample per line.
+        """
+        snapshot = self.snapshot()
+        lines: list[str] = []
+
+        def family(name: str, kind: str, samples: list[tuple[str, tuple, float]]):
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{label}="{value}"' for label, value in labels)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{PROMETHEUS_PREFIX}{name}{suffix}{label_text} {value:g}")
+
+        for name in sorted({name for name, _ in snapshot["counters"]}):
+            family(
+                f"{name}_total",
+                "counter",
+                [("", labels, v) for (n, labels), v in snapshot["counters"].items() if n == name],
+            )
+        for name in sorted({name for name, _ in snapshot["timers"]}):
+            timers = [(labels, v) for (n, labels), v in snapshot["timers"].items() if n == name]
+            family(
+                name,
+                "summary",
+                [("_count", labels, v[0]) for labels, v in timers]
+                + [("_sum", labels, v[1]) for labels, v in timers],
+            )
+            family(f"{name}_max", "gauge", [("", labels, v[2]) for labels, v in timers])
+        for name in sorted({name for name, _ in snapshot["gauges"]}):
+            gauges = [(labels, v) for (n, labels), v in snapshot["gauges"].items() if n == name]
+            family(name, "gauge", [("", labels, v[0]) for labels, v in gauges])
+            family(f"{name}_max", "gauge", [("", labels, v[1]) for labels, v in gauges])
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_path: Path):
+        """
+        Write the report as metrics.json and metrics.prom.
+
+        Args:
+            output_path: Directory to write the report to.
+
+        Returns:
+            None
+        """
+        output_path.mkdir(parents=True, exist_ok=True)
+        (output_path / "metrics.json").write_text(json.dumps(self.to_dict(), indent=2))
+        (output_path / "metrics.prom").write_text(self.to_prometheus())
+
+
+class Progress:
+    """
+    Rate and estimated time remaining of a run over a known number of items.
+    """
+
+    def __init__(self, total: int, unit: str = "stations"):
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.start = time.monotonic()
+
+    def line(self) -> str:
+        """
+        Describe the progress so far.
+
+        Returns:
+            e.g. 'Processed 120/4000 stations (3.2 stations/s, ETA 0:20:12).'
+        """
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = "unknown"
+        if rate > 0:
+            eta = str(timedelta(seconds=round((self.total - self.done) / rate)))
+        return (
+            f"Processed {self.done}/{self.total} {self.unit} "
+            f"({rate:.1f} {self.unit}/s, ETA {eta})."
+        )
+
+
+# Registry of the current process
+METRICS = Metrics()
@@ -2,20 +2,35 @@
 Functions for processing data
 """
 
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
 from pandas import DatetimeIndex
 
+from . import kernels
+from .quantiles import QuantileSketch
+
 
-def get_daily_pressure_range(dataframe: pd.DataFrame) -> pd.DataFrame:
+def get_daily_pressure_range(dataframe: pd.DataFrame, use_kernel: bool = True) -> pd.DataFrame:
     """
     Calculate daily min/max pressure after removing outliers.
 
+    Uses the array kernel in kernels.py when the frame allows it, and pandas otherwise.
+
     Args:
         dataframe: Hourly pressure data for a single station. Must contain a 'pres' column.
+        use_kernel: Use the array kernel if it supports the frame.
 
     Returns:
         DataFrame with columns: date, pres_min, pres_max.
     """
+    if use_kernel and kernels.supports(dataframe):
+        daily = kernels.daily_pressure_range(dataframe)
+        if daily is not None:
+            return daily
+
     cleaned = remove_outliers(dataframe)  # Remove days with outliers from dataset
 
     daily = cleaned["pres"].groupby(pd.Grouper(freq="D")).agg(["min", "max"])
@@ -24,32 +39,543 @@ def get_daily_pressure_range(dataframe: pd.DataFrame) -> pd.DataFrame:
     return daily.reset_index()
 
 
-def remove_outliers(dataframe: pd.DataFrame) -> pd.DataFrame:
+def remove_outliers(
+    dataframe: pd.DataFrame,
+    bounds: tuple[float, float] | None = None,
+    previous: pd.DataFrame | None = None,
+) -> pd.DataFrame:
     """
     Remove days with outlier pressure measurements from a station DataFrame.
 
     Args:
         dataframe: Hourly pressure data for a single station. Must contain a 'pres' column.
+        bounds: Lower and upper bounds on the hourly pressure change, e.g. from outlier_bounds
+            over the station's whole history. Computed from dataframe if not given.
+        previous: Readings before dataframe, when a station is processed in chunks, so the
+            change at its first reading is defined. Should end on a day boundary.
 
     Returns:
         DataFrame with outlier days removed.
     """
-    # Calculate pressure variation per hour
-    dt = dataframe.index.to_series().diff().dt.total_seconds() / 3600
-    dpres = dataframe["pres"].diff() / dt
+    # Calculate pressure variation per hour on plain arrays, without copying the frame
+    dpres = pressure_rates(dataframe, previous)
+    if bounds is None:
+        if np.isnan(dpres).all():
+            return dataframe
+        # Find outliers with >=2 variations outside 3 IQR
+        q25, q75 = np.nanquantile(dpres, [0.25, 0.75])
+        iqr = q75 - q25
+        bounds = (q25 - 3 * iqr, q75 + 3 * iqr)
 
-    # Find outliers with >=2 variations outside 3 IQR
-    q25, q75 = dpres.quantile([0.25, 0.75])
-    iqr = q75 - q25
-    is_outlier: pd.Series = (dpres < (q25 - 3 * iqr)) | (dpres > (q75 + 3 * iqr))
+    is_outlier = (dpres < bounds[0]) | (dpres > bounds[1])
     if not is_outlier.any():
         return dataframe
-    outlier_dates = pd.DatetimeIndex(dpres[is_outlier].index).normalize()
-    drop_dates = set(outlier_dates.value_counts()[lambda x: x > 1].index)
+    days = DatetimeIndex(dataframe.index).to_numpy().astype("datetime64[D]")
+    outlier_days, counts = np.unique(days[is_outlier], return_counts=True)
 
     # Mask outlier days from dataframe
-    mask = DatetimeIndex(dataframe.index).normalize().isin(drop_dates)
-    return dataframe[~mask]
+    return dataframe[~np.isin(days, outlier_days[counts > 1])]
+
+
+def pressure_rates(dataframe: pd.DataFrame, previous: pd.DataFrame | None = None) -> np.ndarray:
+    """
+    Calculate the hourly rate of pressure change at each reading.
+
+    Args:
+        dataframe: Hourly pressure data for a single station. Must contain a 'pres' column.
+        previous: Readings before dataframe. Its last reading defines the change at the first
+            reading of dataframe, which is NaN otherwise.
+
+    Returns:
+        Array of pressure changes in hPa per hour, aligned with dataframe.
+    """
+    times = DatetimeIndex(dataframe.index).to_numpy()
+    pres = dataframe["pres"].to_numpy(dtype=np.float64, na_value=np.nan)
+    rates = np.full(len(pres), np.nan)
+    rates[1:] = np.diff(pres) / (np.diff(times) / np.timedelta64(1, "h"))
+    if previous is not None and not previous.empty and len(pres):
+        last_time = DatetimeIndex(previous.index).to_numpy()[-1]
+        last_pres = previous["pres"].to_numpy(dtype=np.float64, na_value=np.nan)[-1]
+        rates[0] = (pres[0] - last_pres) / ((times[0] - last_time) / np.timedelta64(1, "h"))
+    return rates
+
+
+def outlier_bounds(sketch: QuantileSketch) -> tuple[float, float]:
+    """
+    Calculate the bounds outside which hourly pressure changes are outliers.
+
+    Args:
+        sketch: Sketch of the hourly pressure changes, e.g. from pressure_rate_sketch.
+
+    Returns:
+        Tuple of (lower, upper) bounds 3 IQR beyond the quartiles, NaN if the sketch is empty.
+    """
+    q25, q75 = sketch.quantile([0.25, 0.75])
+    iqr = q75 - q25
+    return q25 - 3 * iqr, q75 + 3 * iqr
+
+
+def pressure_rate_sketch(
+    chunks: Iterable[pd.DataFrame],
+    resolution: float | None = None,
+    sketch: QuantileSketch | None = None,
+    previous: pd.DataFrame | None = None,
+) -> QuantileSketch:
+    """
+    Summarise the hourly pressure changes of a station read in consecutive chunks.
+
+    Only one chunk is held at a time. With resolution=None the bounds from outlier_bounds are
+    identical to those remove_outliers computes over the whole history; otherwise they are
+    within 3.5 * resolution of them (see QuantileSketch).
+
+    Args:
+        chunks: Consecutive hourly chunks of one station, e.g. one per cached year.
+        resolution: Resolution of the sketch in hPa per hour, or None for an exact sketch.
+        sketch: Sketch of earlier data to add to, e.g. persisted from a previous run.
+        previous: Readings before the first chunk, if sketch covers them.
+
+    Returns:
+        QuantileSketch of the hourly pressure changes.
+    """
+    sketch = sketch if sketch is not None else QuantileSketch(resolution)
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        sketch.update(pressure_rates(chunk, previous))
+        previous = chunk.iloc[-1:]
+    return sketch
+
+
+DAY_STATS_COLUMNS: list[str] = [
+    "date",
+    "pres_min",
+    "pres_max",
+    "rate_low",
+    "rate_low2",
+    "rate_high",
+    "rate_high2",
+]
+
+
+@dataclass
+class StationState:
+    """
+    Statistics of a station's hourly history, for continuing it from its last day.
+
+    The sketch, last reading and reading counts cover the readings before `until`, the start
+    of the last day fetched. That day may have been partial, so the next run fetches it again
+    and folds it in with the new days. lower and upper are the outlier bounds over the whole
+    history fetched, which the stored daily rows were computed with.
+    """
+
+    until: pd.Timestamp
+    sketch: QuantileSketch
+    last_time: pd.Timestamp | None
+    last_pres: float
+    lower: float
+    upper: float
+    n_readings: int = 0
+    n_missing: int = 0
+    n_days: int = 0
+    n_short_days: int = 0
+
+    @property
+    def bounds(self) -> tuple[float, float]:
+        """Outlier bounds of the hourly pressure change."""
+        return self.lower, self.upper
+
+    def previous(self) -> pd.DataFrame | None:
+        """The last reading before `until` as a one-row hourly frame, if there is one."""
+        if self.last_time is None:
+            return None
+        return pd.DataFrame(
+            {"pres": [self.last_pres]}, index=DatetimeIndex([self.last_time], name="time")
+        )
+
+
+def reading_counts(
+    dataframe: pd.DataFrame, state: StationState | None = None
+) -> tuple[int, int, int, int]:
+    """
+    Count the readings and days used by the quality checks, continuing a station's state.
+
+    Args:
+        dataframe: Hourly pressure data for a single station, sorted by time and after
+            state.until. Must contain a 'pres' column.
+        state: State of the station's earlier history, if any.
+
+    Returns:
+        Tuple of (readings, missing readings, days, days with fewer than 6 readings), over
+        every day from the first to the last reading as pd.Grouper counts them.
+    """
+    n_readings, n_missing, n_days, n_short_days = (
+        (state.n_readings, state.n_missing, state.n_days, state.n_short_days)
+        if state
+        else (0,) * 4
+    )
+    if dataframe.empty:
+        return n_readings, n_missing, n_days, n_short_days
+
+    days = DatetimeIndex(dataframe.index).to_numpy().astype("datetime64[D]").astype(np.int64)
+    valid = dataframe["pres"].notna().to_numpy()
+    per_day = np.bincount(days[valid] - days[0], minlength=days[-1] - days[0] + 1)
+    # Days between the earlier history and this frame have no readings
+    gap = 0
+    if state is not None and state.last_time is not None:
+        gap = days[0] - np.datetime64(state.last_time, "D").astype(np.int64) - 1
+    return (
+        n_readings + len(dataframe),
+        n_missing + int((~valid).sum()),
+        n_days + len(per_day) + int(gap),
+        n_short_days + int((per_day < 6).sum()) + int(gap),
+    )
+
+
+def day_stats(dataframe: pd.DataFrame, previous: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Summarise each day with readings by what decides its daily range and outlier status.
+
+    A day is removed by remove_outliers if at least two of its hourly changes are outliers,
+    which only depends on its two lowest and two highest changes. Stored with the raw daily
+    min/max, the days can be re-evaluated for any bounds without the hourly data.
+
+    Args:
+        dataframe: Hourly pressure data for a single station, sorted by time. Must contain a
+            'pres' column.
+        previous: Readings before dataframe, see pressure_rates.
+
+    Returns:
+        DataFrame with DAY_STATS_COLUMNS: date, pres_min and pres_max over all readings, and
+        the lowest, second lowest, highest and second highest hourly changes (NaN if the day
+        has too few).
+    """
+    if dataframe.empty:
+        return pd.DataFrame({column: [] for column in DAY_STATS_COLUMNS}).astype(
+            {"date": DatetimeIndex(dataframe.index).dtype}
+        )
+
+    index = DatetimeIndex(dataframe.index)
+    days = index.to_numpy().astype("datetime64[D]")
+    pres = dataframe["pres"].to_numpy(dtype=np.float64, na_value=np.nan)
+    rates = pressure_rates(dataframe, previous)
+
+    starts = np.flatnonzero(np.diff(days.astype(np.int64), prepend=days[0].astype(np.int64) - 1))
+    day_codes = np.repeat(np.arange(len(starts)), np.diff(starts, append=len(days)))
+    with np.errstate(all="ignore"):
+        pres_min = np.fmin.reduceat(pres, starts)
+        pres_max = np.fmax.reduceat(pres, starts)
+
+    # Sort each day's changes, NaN last, and pick from both ends of its valid ones
+    sorted_rates = rates[np.lexsort((rates, day_codes))]
+    n_valid = np.add.reduceat(~np.isnan(rates), starts)
+    padded = np.append(sorted_rates, np.nan)
+
+    def pick(offsets: np.ndarray, needed: int) -> np.ndarray:
+        return padded[np.where(n_valid >= needed, starts + offsets, len(rates))]
+
+    return pd.DataFrame(
+        {
+            "date": days[starts].astype(index.dtype),
+            "pres_min": pres_min,
+            "pres_max": pres_max,
+            "rate_low": pick(0, 1),
+            "rate_low2": pick(1, 2),
+            "rate_high": pick(n_valid - 1, 1),
+            "rate_high2": pick(n_valid - 2, 2),
+        }
+    )
+
+
+def removed_days(stats: pd.DataFrame, bounds: tuple[float, float]) -> np.ndarray:
+    """
+    Find the days remove_outliers removes for given bounds, from their day statistics.
+
+    Args:
+        stats: Day statistics, as returned by day_stats.
+        bounds: Lower and upper bounds on the hourly pressure change.
+
+    Returns:
+        Boolean array, True for days with at least two changes outside the bounds.
+    """
+    lower, upper = bounds
+    low, low2, high, high2 = (
+        stats[column].to_numpy(dtype=np.float64)
+        for column in ["rate_low", "rate_low2", "rate_high", "rate_high2"]
+    )
+    return (low2 < lower) | (high2 > upper) | ((low < lower) & (high > upper))
+
+
+def daily_from_day_stats(
+    stats: pd.DataFrame, bounds: tuple[float, float], dtype: str = "Float64"
+) -> pd.DataFrame:
+    """
+    Calculate daily min/max pressure from day statistics, as get_daily_pressure_range does.
+
+    Args:
+        stats: Day statistics, as returned by day_stats.
+        bounds: Lower and upper bounds on the hourly pressure change.
+        dtype: Dtype of the pressure columns.
+
+    Returns:
+        DataFrame with columns: date, pres_min, pres_max, from the first to the last day not
+        removed, with empty rows for removed days and days without readings.
+    """
+    kept = stats[~removed_days(stats, bounds)]
+    date_dtype = kept["date"].dtype
+    if kept.empty:
+        return pd.DataFrame(
+            {
+                "date": pd.Series([], dtype=date_dtype),
+                "pres_min": pd.Series([], dtype=dtype),
+                "pres_max": pd.Series([], dtype=dtype),
+            }
+        )
+
+    # Days between the first and last kept day, as pd.Grouper reinstates them
+    days = kept["date"].to_numpy().astype("datetime64[D]")
+    dates = np.arange(days[0], days[-1] + 1)
+    kept = kept.set_index(days)[["pres_min", "pres_max"]].reindex(dates)
+    return pd.DataFrame(
+        {
+            "date": dates.astype(date_dtype),
+            "pres_min": pd.array(kept["pres_min"].to_numpy()).astype(dtype),
+            "pres_max": pd.array(kept["pres_max"].to_numpy()).astype(dtype),
+        }
+    )
+
+
+def advance_station_state(
+    dataframe: pd.DataFrame, state: StationState | None = None
+) -> tuple[pd.DataFrame, StationState]:
+    """
+    Fold newly fetched hourly data into a station's state.
+
+    The hourly changes before the new last day are merged into the sketch, and the bounds
+    are taken over every change so far, so they are identical to those of remove_outliers
+    over the whole history. The day statistics of the new data, including the refetched last
+    day of the state, can then be turned into daily rows with daily_from_day_stats.
+
+    Args:
+        dataframe: Non-empty hourly pressure data for a single station, sorted by time and
+            starting at state.until if a state is given. Must contain a 'pres' column.
+        state: State of the station's earlier history, or None for a new station.
+
+    Returns:
+        Tuple of (day statistics of dataframe, new state).
+    """
+    previous = state.previous() if state is not None else None
+    times = DatetimeIndex(dataframe.index)
+    until = times[-1].normalize()
+    before = np.asarray(times < until)
+    rates = pressure_rates(dataframe, previous)
+
+    sketch = QuantileSketch(state.sketch.resolution if state else None)
+    if state is not None:
+        sketch.merge(state.sketch)
+    sketch.update(rates[before])
+    everything = QuantileSketch(sketch.resolution).merge(sketch).update(rates[~before])
+    lower, upper = outlier_bounds(everything)
+
+    folded = dataframe[before]
+    last_time, last_pres = (state.last_time, state.last_pres) if state else (None, np.nan)
+    if not folded.empty:
+        last_time = DatetimeIndex(folded.index)[-1]
+        last_pres = folded["pres"].to_numpy(dtype=np.float64, na_value=np.nan)[-1]
+    new_state = StationState(
+        until, sketch, last_time, float(last_pres), lower, upper, *reading_counts(folded, state)
+    )
+    return day_stats(dataframe, previous), new_state
+
+
+def stack_stations(station_data: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combine per-station hourly frames into a single long-format frame.
+
+    Args:
+        station_data: dict mapping station_id -> hourly DataFrame indexed by time.
+
+    Returns:
+        DataFrame indexed by (station, time), as returned by a multi-station meteostat query.
+    """
+    return pd.concat(station_data, names=["station", "time"])
+
+
+def get_outlier_bounds_batch(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate the IQR outlier bounds on the hourly pressure change for many stations at once.
+
+    Args:
+        dataframe: Hourly pressure data indexed by (station, time). Must contain a 'pres' column.
+
+    Returns:
+        DataFrame indexed by station with columns: lower, upper.
+    """
+    hourly = _BatchHourly(dataframe)
+    return pd.DataFrame(
+        {"lower": hourly.lower, "upper": hourly.upper},
+        index=pd.Index(hourly.stations, name="station"),
+    )
+
+
+def remove_outliers_batch(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Remove days with outlier pressure measurements for many stations in one pass.
+
+    Equivalent to calling remove_outliers on each station separately.
+
+    Args:
+        dataframe: Hourly pressure data indexed by (station, time). Must contain a 'pres' column.
+
+    Returns:
+        DataFrame with outlier days removed.
+    """
+    hourly = _BatchHourly(dataframe)
+    return hourly.frame[~hourly.outlier_day_mask()]
+
+
+def get_daily_pressure_range_batch(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate daily min/max pressure after removing outliers for many stations in one pass.
+
+    Equivalent to calling get_daily_pressure_range on each station separately.
+
+    Args:
+        dataframe: Hourly pressure data indexed by (station, time). Must contain a 'pres' column.
+
+    Returns:
+        DataFrame with columns: station, date, pres_min, pres_max. Stations with every day
+        removed as outliers have no rows.
+    """
+    if dataframe.empty:
+        return pd.DataFrame(columns=["station", "date", "pres_min", "pres_max"])
+
+    hourly = _BatchHourly(dataframe)
+    keep = ~hourly.outlier_day_mask()
+    codes = hourly.codes[keep]
+    days = hourly.days[keep]
+
+    daily = hourly.frame["pres"][keep].groupby([codes, days]).agg(["min", "max"])
+    daily.columns = ["pres_min", "pres_max"]
+
+    # Reinstate empty days between each station's first and last day, as pd.Grouper does
+    spans = (
+        pd.Series(daily.index.get_level_values(1).to_numpy())
+        .groupby(daily.index.get_level_values(0).to_numpy())
+        .agg(["min", "max"])
+    )
+    lengths = (spans["max"] - spans["min"] + 1).to_numpy()
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    full_codes = np.repeat(spans.index.to_numpy(), lengths)
+    full_days = np.repeat(spans["min"].to_numpy(), lengths) + offsets
+    daily = daily.reindex(pd.MultiIndex.from_arrays([full_codes, full_days]))
+
+    return pd.DataFrame(
+        {
+            "station": hourly.stations[full_codes],
+            "date": full_days.astype("datetime64[D]").astype(hourly.time_dtype),
+            "pres_min": daily["pres_min"].array,
+            "pres_max": daily["pres_max"].array,
+        }
+    )
+
+
+def split_stations(daily: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Split a long-format daily frame into per-station frames.
+
+    Args:
+        daily: Daily pressure data with columns: station, date, pres_min, pres_max.
+
+    Returns:
+        dict mapping station_id -> DataFrame(date, pres_min, pres_max)
+    """
+    return {
+        str(station_id): group.drop(columns="station").reset_index(drop=True)
+        for station_id, group in daily.groupby("station", sort=False)
+    }
+
+
+class _BatchHourly:
+    """
+    Flat NumPy view of a long-format hourly frame, shared by the batch functions.
+    """
+
+    def __init__(self, dataframe: pd.DataFrame):
+        if not dataframe.index.is_monotonic_increasing:
+            dataframe = dataframe.sort_index()
+        self.frame = dataframe
+
+        station_values = dataframe.index.get_level_values(0)
+        times = DatetimeIndex(dataframe.index.get_level_values(1))
+        self.codes, self.stations = pd.factorize(station_values)
+        self.time_dtype = times.dtype
+        time_values = times.to_numpy()
+        self.days = time_values.astype("datetime64[D]").astype(np.int64)
+
+        # Rate of change, with the first reading of each station left undefined
+        pres = dataframe["pres"].to_numpy(dtype=np.float64, na_value=np.nan)
+        dpres = np.empty_like(pres)
+        dpres[0:1] = np.nan
+        dpres[1:] = np.diff(pres) / (np.diff(time_values) / np.timedelta64(1, "h"))
+        dpres[np.flatnonzero(np.diff(self.codes)) + 1] = np.nan
+        self.dpres = dpres
+
+        q25, q75 = _grouped_quantiles(self.codes, dpres, len(self.stations), [0.25, 0.75])
+        iqr = q75 - q25
+        self.lower = q25 - 3 * iqr
+        self.upper = q75 + 3 * iqr
+
+    def outlier_day_mask(self) -> np.ndarray:
+        """
+        Return a boolean mask of hourly rows falling on days with more than one outlier.
+        """
+        is_outlier = (self.dpres < self.lower[self.codes]) | (self.dpres > self.upper[self.codes])
+        if not is_outlier.any():
+            return np.zeros(len(self.codes), dtype=bool)
+
+        span = self.days.max() - self.days.min() + 1
+        keys = self.codes.astype(np.int64) * span + (self.days - self.days.min())
+        outlier_keys, counts = np.unique(keys[is_outlier], return_counts=True)
+        return np.isin(keys, outlier_keys[counts > 1])
+
+
+def _grouped_quantiles(
+    codes: np.ndarray, values: np.ndarray, n_groups: int, quantiles: list[float]
+) -> list[np.ndarray]:
+    """
+    Linear-interpolated quantiles per group, ignoring NaN, matching pd.Series.quantile.
+
+    Args:
+        codes: Group code of each value, in 0..n_groups-1.
+        values: Values to take quantiles of.
+        n_groups: Number of groups.
+        quantiles: Quantiles to compute, each in [0, 1].
+
+    Returns:
+        One array of length n_groups per requested quantile (nan for groups with no values).
+    """
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    sorted_values = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    has_values = counts > 0
+
+    results = []
+    for q in quantiles:
+        result = np.full(n_groups, np.nan)
+        virtual = (counts[has_values] - 1) * q
+        previous = np.floor(virtual)
+        gamma = virtual - previous
+        lower_idx = starts[has_values] + previous.astype(np.intp)
+        upper_idx = np.minimum(lower_idx + 1, starts[has_values] + counts[has_values] - 1)
+        a, b = sorted_values[lower_idx], sorted_values[upper_idx]
+
+        # Same interpolation as numpy's linear method, so bounds are bit-identical
+        diff = b - a
+        result[has_values] = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+        results.append(result)
+    return results
 
 
 def compute_frac_var(daily_df: pd.DataFrame, thresh: float = 10.0) -> float:
@@ -74,3 +600,83 @@ def compute_frac_var(daily_df: pd.DataFrame, thresh: float = 10.0) -> float:
         return float("nan")
 
     return float((yearly["sum"] / yearly["count"]).mean())
+
+
+def compute_frac_var_batch(daily: pd.DataFrame, thresh: float = 10.0) -> pd.Series:
+    """
+    Calculate compute_frac_var for many stations in one pass.
+
+    Args:
+        daily: Daily pressure data with columns: station, date, pres_min, pres_max.
+        thresh: Pressure change threshold in hPa.
+
+    Returns:
+        Series of the mean fraction of high-variation days per year, indexed by station.
+    """
+    high = (daily["pres_max"] - daily["pres_min"]) >= thresh
+    years = pd.DatetimeIndex(daily["date"]).year
+    yearly = high.groupby([daily["station"].to_numpy(), years]).agg(["sum", "count"])
+    yearly = yearly[yearly["count"] > 0]
+
+    frac_var = (yearly["sum"] / yearly["count"]).groupby(level=0).mean().astype(float)
+    frac_var.index.name = "station"
+    return frac_var.rename("frac_var")
+
+
+def compute_frac_var_sweep(daily: pd.DataFrame, thresholds: list[float]) -> pd.DataFrame:
+    """
+    Calculate compute_frac_var for many stations and thresholds in one pass.
+
+    Gives the same result as compute_frac_var_batch for each threshold. Daily ranges are
+    computed once and binned between the sorted thresholds, so each station-year holds a
+    histogram of days per bin. The number of days at or above each threshold is then a
+    cumulative sum over the bins, whatever the number of thresholds.
+
+    Args:
+        daily: Daily pressure data with columns: station, date, pres_min, pres_max.
+        thresholds: Pressure change thresholds in hPa.
+
+    Returns:
+        DataFrame of the mean fraction of high-variation days per year, indexed by station
+        with one column per threshold, in the order given.
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    order = np.argsort(thresholds, kind="stable")
+    pres_range = daily["pres_max"] - daily["pres_min"]
+    if isinstance(pres_range.dtype, pd.api.extensions.ExtensionDtype):
+        # Comparisons with NA are NA, which compute_frac_var_batch leaves out of the day count
+        daily = daily[pres_range.notna().to_numpy()]
+        pres_range = pres_range[pres_range.notna()]
+    pres_range = pres_range.to_numpy(dtype=float, na_value=np.nan)
+    if not len(pres_range):
+        return pd.DataFrame(
+            index=pd.Index([], name="station"),
+            columns=pd.Index(thresholds, name="thresh"),
+            dtype=float,
+        )
+
+    # Bin b holds days with a range at or above the b lowest thresholds; missing days are in bin 0
+    bins = np.searchsorted(thresholds[order], pres_range, side="right")
+    bins[np.isnan(pres_range)] = 0
+
+    station_codes, stations = pd.factorize(daily["station"])
+    years = pd.DatetimeIndex(daily["date"]).year.to_numpy()
+    first_year = years.min()
+    n_years = years.max() - first_year + 1
+    n_bins = len(thresholds) + 1
+    histogram = np.bincount(
+        ((station_codes * n_years + years - first_year) * n_bins + bins).astype(np.intp),
+        minlength=len(stations) * n_years * n_bins,
+    ).reshape(len(stations) * n_years, n_bins)
+    days = histogram.sum(axis=1)
+    station_years = np.flatnonzero(days)
+    histogram, days = histogram[station_years], days[station_years]
+
+    # Days at or above sorted threshold j are those in bins j+1 and above
+    at_or_above = np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    yearly = at_or_above / days[:, None]
+    frac_var = pd.DataFrame(yearly[:, np.argsort(order)]).groupby(station_years // n_years).mean()
+
+    frac_var.index = pd.Index(stations[frac_var.index], name="station")
+    frac_var.columns = pd.Index(thresholds, name="thresh")
+    return frac_var
@@ -0,0 +1,228 @@
+"""
+Spatial index of station locations
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM: float = 6371.0
+
+
+class StationIndex:
+    """
+    Uniform latitude/longitude grid over station locations.
+
+    Stations are sorted by grid cell, with cells numbered row by row, so the stations in a
+    run of cells along one row are a contiguous slice. A bounding box query reads one slice
+    per grid row it covers and filters only those candidates exactly. Longitudes above 180
+    wrap around, as in LONG_LAT_DICT.
+    """
+
+    def __init__(self, stations: pd.DataFrame, cell_size: float = 2.0):
+        self.stations = stations
+        self.cell_size = cell_size
+        self.n_cols = int(np.ceil(360 / cell_size))
+        self.n_rows = int(np.ceil(180 / cell_size))
+
+        longitude = _wrap_longitude(stations["longitude"].to_numpy(dtype=float))
+        latitude = stations["latitude"].to_numpy(dtype=float)
+        cells = self._row(latitude) * self.n_cols + self._col(longitude)
+        self._order = np.argsort(cells, kind="stable")
+        self._offsets = np.searchsorted(
+            cells[self._order], np.arange(self.n_rows * self.n_cols + 1)
+        )
+        self._station_longitude = longitude
+        self._station_latitude = latitude
+        self._longitude = longitude[self._order]
+        self._latitude = latitude[self._order]
+
+    @classmethod
+    def from_csv(cls, path: Path, cell_size: float = 2.0) -> "StationIndex":
+        """
+        Build an index from a station table such as stations.csv or all.csv.
+
+        Args:
+            path: CSV file with id, latitude and longitude columns.
+            cell_size: Grid cell size in degrees.
+
+        Returns:
+            StationIndex over the stations in the file.
+        """
+        return cls(pd.read_csv(path, index_col="id"), cell_size)
+
+    def _col(self, longitude: np.ndarray) -> np.ndarray:
+        return np.clip(((longitude + 180) // self.cell_size).astype(int), 0, self.n_cols - 1)
+
+    def _row(self, latitude: np.ndarray) -> np.ndarray:
+        return np.clip(((latitude + 90) // self.cell_size).astype(int), 0, self.n_rows - 1)
+
+    def query_positions(
+        self, lon_min: float, lon_max: float, lat_min: float, lat_max: float
+    ) -> np.ndarray:
+        """
+        Return the positions in the station table of stations within a bounding box.
+
+        Args:
+            lon_min: Western edge of the box. May be below -180 to wrap around.
+            lon_max: Eastern edge of the box. May be above 180 to wrap around.
+            lat_min: Southern edge of the box.
+            lat_max: Northern edge of the box.
+
+        Returns:
+            Sorted array of row positions in the station table.
+        """
+        if lon_max - lon_min >= 360:
+            lon_ranges = [(-180.0, 180.0)]
+        else:
+            west, east = _wrap_longitude(np.array([lon_min, lon_max], dtype=float))
+            lon_ranges = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+        row_min, row_max = self._row(np.array([lat_min, lat_max], dtype=float))
+        found = []
+        for west, east in lon_ranges:
+            col_min, col_max = self._col(np.array([west, east]))
+            rows = np.arange(row_min, row_max + 1) * self.n_cols
+            starts = self._offsets[rows + col_min]
+            stops = self._offsets[rows + col_max + 1]
+            candidates = np.concatenate(
+                [np.arange(start, stop) for start, stop in zip(starts, stops)] or [[]]
+            ).astype(int)
+            longitude = self._longitude[candidates]
+            latitude = self._latitude[candidates]
+            inside = (
+                (longitude >= west)
+                & (longitude <= east)
+                & (latitude >= lat_min)
+                & (latitude <= lat_max)
+            )
+            found.append(self._order[candidates[inside]])
+        return np.sort(np.concatenate(found))
+
+    def query(
+        self, lon_min: float, lon_max: float, lat_min: float, lat_max: float
+    ) -> pd.DataFrame:
+        """
+        Return the stations within a bounding box.
+
+        Args:
+            lon_min: Western edge of the box. May be below -180 to wrap around.
+            lon_max: Eastern edge of the box. May be above 180 to wrap around.
+            lat_min: Southern edge of the box.
+            lat_max: Northern edge of the box.
+
+        Returns:
+            Rows of the station table within the box, in their original order.
+        """
+        return self.stations.iloc[self.query_positions(lon_min, lon_max, lat_min, lat_max)]
+
+    def nearest(
+        self, longitude: float, latitude: float, k: int = 1, radius_km: float = 100.0
+    ) -> pd.DataFrame:
+        """
+        Return the k stations nearest to a point by great-circle distance.
+
+        Searches the bounding box of a circle around the point, doubling the radius until
+        it holds k stations, so the result is exact.
+
+        Args:
+            longitude: Longitude of the point.
+            latitude: Latitude of the point.
+            k: Number of stations to return.
+            radius_km: Initial search radius.
+
+        Returns:
+            Rows of the station table for the nearest stations, closest first, with an added
+            distance_km column.
+        """
+        k = min(k, len(self.stations))
+        while True:
+            positions = self.query_positions(*_circle_bbox(longitude, latitude, radius_km))
+            distance = haversine_km(
+                longitude,
+                latitude,
+                self._station_longitude[positions],
+                self._station_latitude[positions],
+            )
+            within = distance <= radius_km
+            if within.sum() >= k or radius_km >= np.pi * EARTH_RADIUS_KM:
+                closest = np.argsort(distance, kind="stable")[:k]
+                return self.stations.iloc[positions[closest]].assign(distance_km=distance[closest])
+            radius_km *= 2
+
+
+def haversine_km(
+    lon1: float | np.ndarray, lat1: float | np.ndarray, lon2: np.ndarray, lat2: np.ndarray
+) -> np.ndarray:
+    """
+    Great-circle distance between points in kilometres.
+
+    Args:
+        lon1: Longitude of the first point(s) in degrees.
+        lat1: Latitude of the first point(s) in degrees.
+        lon2: Longitude of the second point(s) in degrees.
+        lat2: Latitude of the second point(s) in degrees.
+
+    Returns:
+        Array of distances in kilometres.
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _circle_bbox(
+    longitude: float, latitude: float, radius_km: float
+) -> tuple[float, float, float, float]:
+    """Bounding box of all points within radius_km of a point."""
+    angle = np.degrees(radius_km / EARTH_RADIUS_KM)
+    lat_min, lat_max = latitude - angle, latitude + angle
+    if lat_min <= -90 or lat_max >= 90:
+        # The circle contains a pole, so it covers all longitudes
+        return -180.0, 180.0, max(lat_min, -90.0), min(lat_max, 90.0)
+    half_width = np.degrees(np.arcsin(np.sin(np.radians(angle)) / np.cos(np.radians(latitude))))
+    return longitude - half_width, longitude + half_width, lat_min, lat_max
+
+
+def _wrap_longitude(longitude: np.ndarray) -> np.ndarray:
+    """Wrap longitudes into [-180, 180]."""
+    wrapped = (longitude + 180) % 360 - 180
+    return np.where((longitude == 180) | (wrapped == -180) & (longitude > 0), 180.0, wrapped)
+
+
+def grid_mean(
+    x: np.ndarray,
+    y: np.ndarray,
+    values: np.ndarray,
+    bounds: tuple[float, float, float, float],
+    shape: tuple[int, int],
+) -> np.ndarray:
+    """
+    Average values into the cells of a regular grid.
+
+    Args:
+        x: Horizontal coordinate of each value, e.g. longitude.
+        y: Vertical coordinate of each value, e.g. latitude.
+        values: Values to average. NaN values are ignored.
+        bounds: Grid bounds (x_min, x_max, y_min, y_max). Points outside are ignored.
+        shape: Number of grid (rows, columns).
+
+    Returns:
+        Array of the given shape with the mean value in each cell, NaN for empty cells. Row 0
+        is at y_min.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    n_rows, n_cols = shape
+    x, y, values = (np.asarray(a, dtype=float) for a in (x, y, values))
+    keep = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max) & ~np.isnan(values)
+    col = np.minimum(((x[keep] - x_min) / (x_max - x_min) * n_cols).astype(int), n_cols - 1)
+    row = np.minimum(((y[keep] - y_min) / (y_max - y_min) * n_rows).astype(int), n_rows - 1)
+    cells = row * n_cols + col
+    sums = np.bincount(cells, weights=values[keep], minlength=n_rows * n_cols)
+    counts = np.bincount(cells, minlength=n_rows * n_cols)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).reshape(shape)
@@ -0,0 +1,986 @@
+"""
+Storage of processed daily station data
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import zlib
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from . import processing, summary
+from .processing import DAY_STATS_COLUMNS, StationState
+from .quantiles import QuantileSketch
+
+DAILY_COLUMNS: list[str] = ["date", "pres_min", "pres_max"]
+PRESSURE_COLUMNS: list[str] = ["pres_min", "pres_max"]
+PRESSURE_SCALE: int = 10
+STATION_COLUMNS: list[str] = ["latitude", "longitude"]
+STATE_QUERY_SIZE: int = 500
+STATION_MANIFEST_COLUMNS: dict[str, str] = {
+    "write_hash": "TEXT",
+    "fetched_until": "TEXT",
+    "compacted_version": "INTEGER NOT NULL DEFAULT 0",
+}
+DAY_STATS_DTYPE: np.dtype = np.dtype(
+    [("date", "datetime64[D]")] + [(column, "<f8") for column in DAY_STATS_COLUMNS[1:]]
+)
+
+
+def write_daily(daily: pd.DataFrame, path: Path):
+    """
+    Write daily rows to a Parquet file in the compact on-disk layout of the daily store.
+
+    Pressures are stored as int16 tenths of a hPa, the resolution of meteostat readings, and
+    every column is delta encoded, which makes station-year files several times smaller than
+    float64 columns.
+
+    Args:
+        daily: Daily pressure data with columns: date, pres_min, pres_max.
+        path: File to write.
+
+    Returns:
+        None
+    """
+    columns = {"date": pa.array(daily["date"])}
+    for column in PRESSURE_COLUMNS:
+        tenths = (daily[column].astype("Float64") * PRESSURE_SCALE).round().astype("Int16")
+        columns[column] = pa.array(tenths, type=pa.int16())
+    # The pressure dtype is restored on read, as NA and NaN days count differently in frac_var
+    metadata = {"pressure_dtype": str(daily[PRESSURE_COLUMNS[0]].dtype)}
+    pq.write_table(
+        pa.table(columns, metadata=metadata),
+        path,
+        compression="zstd",
+        use_dictionary=False,
+        column_encoding={column: "DELTA_BINARY_PACKED" for column in DAILY_COLUMNS},
+    )
+
+
+def read_daily(path: Path) -> pd.DataFrame:
+    """
+    Read daily rows written by write_daily, or by earlier versions as float columns.
+
+    Args:
+        path: File to read.
+
+    Returns:
+        DataFrame with columns: date, pres_min, pres_max, pressures in hPa with the dtype
+        they were written with.
+    """
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    daily = table.to_pandas()
+    if b"pressure_dtype" in metadata:
+        dtype = metadata[b"pressure_dtype"].decode()
+        for column in PRESSURE_COLUMNS:
+            daily[column] = (daily[column].astype("Float64") / PRESSURE_SCALE).astype(dtype)
+    return daily
+
+
+class DailyStore:
+    """
+    Append-only store of daily pressure data, partitioned by station and year.
+
+    Each update writes new part files (<station>/<year>/<part>.parquet) holding only the new
+    rows, so write volume scales with the number of new days rather than the full history.
+    When parts overlap, rows from the newest part win. A SQLite manifest records the last
+    date, row count, hash of its writes and the end of the last fetch of each station, so
+    scheduling is answered in one read without opening the data files, and a ledger of
+    stations that failed quality checks, so they are not fetched every run.
+    It also holds a summary of the daily pressure ranges of each station-year, rebuilt for
+    the years an append touches, so statistics such as frac_var are answered from the
+    manifest alone. Parts are merged back into one file per station-year by compact().
+
+    Stations written by update() also keep their StationState and the day statistics of
+    every day fetched, so an incremental run can continue the outlier bounds of the whole
+    history and re-evaluate earlier days when they move, without refetching them.
+
+    Runs over the store are recorded with a journal of the stations each one finished, so a
+    run that was interrupted can be resumed with only its unfinished stations, and the part
+    files it was writing when it stopped are cleaned up by recover().
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stations (
+                    station TEXT PRIMARY KEY,
+                    last_date TEXT NOT NULL,
+                    n_rows INTEGER NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """)
+            # Freshness columns, added to manifests created before they existed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(stations)")}
+            if "content_hash" in columns:  # earlier name of write_hash
+                conn.execute("ALTER TABLE stations RENAME COLUMN content_hash TO write_hash")
+                columns.add("write_hash")
+            for column, definition in STATION_MANIFEST_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE stations ADD COLUMN {column} {definition}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rejected (
+                    station TEXT PRIMARY KEY,
+                    reason TEXT NOT NULL,
+                    inventory_end TEXT,
+                    rejected_at REAL NOT NULL
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summary (
+                    station TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    n_days INTEGER NOT NULL,
+                    range_sum REAL NOT NULL,
+                    range_sq_sum REAL NOT NULL,
+                    histogram BLOB NOT NULL,
+                    PRIMARY KEY (station, year)
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS state (
+                    station TEXT PRIMARY KEY,
+                    until TEXT NOT NULL,
+                    last_time TEXT,
+                    last_pres REAL,
+                    lower REAL,
+                    upper REAL,
+                    n_readings INTEGER NOT NULL,
+                    n_missing INTEGER NOT NULL,
+                    n_days INTEGER NOT NULL,
+                    n_short_days INTEGER NOT NULL,
+                    sketch BLOB NOT NULL
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS day_stats (
+                    station TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    stats BLOB NOT NULL,
+                    PRIMARY KEY (station, year)
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    window_start TEXT NOT NULL,
+                    window_end TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    run_id INTEGER NOT NULL,
+                    station TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, station)
+                )
+                """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path / "manifest.sqlite", timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def _parts(self, station_id: str, year: int | None = None) -> list[Path]:
+        station_path = self.path / station_id
+        pattern = f"{year}/*.parquet" if year is not None else "*/*.parquet"
+        return sorted(station_path.glob(pattern), key=lambda p: (p.parent.name, p.name))
+
+    def append(self, station_id: str, daily: pd.DataFrame):
+        """
+        Add daily rows for a station, replacing any existing rows with the same date.
+
+        Args:
+            station_id: Meteostat station id.
+            daily: Daily pressure data with columns: date, pres_min, pres_max.
+
+        Returns:
+            None
+        """
+        if daily.empty:
+            return
+
+        daily = daily[DAILY_COLUMNS]
+        summaries = self._write_parts(station_id, daily)
+        with self._connect() as conn:
+            self._record_append(conn, station_id, daily, summaries)
+
+    def _write_parts(self, station_id: str, daily: pd.DataFrame) -> pd.DataFrame:
+        """
+        Write one part per year of daily rows and return the summaries of the years touched.
+
+        Each part is written to a temporary file and renamed into place, so an interrupted
+        write never leaves a truncated part. Parts only count once the manifest records them,
+        see recover().
+        """
+        years = pd.DatetimeIndex(daily["date"]).year
+        part_name = f"{time.time_ns()}-{os.getpid()}.parquet"
+        for year, rows in daily.groupby(years):
+            year_path = self.path / station_id / str(year)
+            year_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = (year_path / part_name).with_suffix(".tmp")
+            write_daily(rows, tmp_path)
+            os.replace(tmp_path, year_path / part_name)
+
+        return pd.concat(
+            [summary.summarise_daily(self._read_year(station_id, year)) for year in years.unique()]
+        )
+
+    def _record_append(
+        self,
+        conn: sqlite3.Connection,
+        station_id: str,
+        daily: pd.DataFrame,
+        summaries: pd.DataFrame,
+    ):
+        new_last = pd.Timestamp(daily["date"].max())
+        row = conn.execute(
+            "SELECT last_date, n_rows, version, write_hash FROM stations WHERE station = ?",
+            (station_id,),
+        ).fetchone()
+        if row is None:
+            last_date, n_rows, version, write_hash = new_last, len(daily), 1, None
+        else:
+            previous_last = pd.Timestamp(row[0])
+            last_date = max(previous_last, new_last)
+            n_rows = row[1] + int((daily["date"] > previous_last).sum())
+            version = row[2] + 1
+            write_hash = row[3]
+        conn.execute(
+            "INSERT INTO stations (station, last_date, n_rows, version, updated_at, write_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (station) DO UPDATE SET "
+            "last_date = excluded.last_date, n_rows = excluded.n_rows, "
+            "version = excluded.version, updated_at = excluded.updated_at, "
+            "write_hash = excluded.write_hash",
+            (
+                station_id,
+                last_date.isoformat(),
+                n_rows,
+                version,
+                time.time(),
+                _write_hash(write_hash, daily),
+            ),
+        )
+        conn.execute("DELETE FROM rejected WHERE station = ?", (station_id,))
+        self._write_summaries(conn, station_id, summaries)
+
+    def _read_year(self, station_id: str, year: int) -> pd.DataFrame:
+        daily = pd.concat([read_daily(part) for part in self._parts(station_id, year)])
+        return daily.drop_duplicates("date", keep="last")
+
+    @staticmethod
+    def _write_summaries(conn: sqlite3.Connection, station_id: str, summaries: pd.DataFrame):
+        conn.executemany(
+            "INSERT OR REPLACE INTO summary VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    station_id,
+                    int(year),
+                    int(row.n_days),
+                    row.range_sum,
+                    row.range_sq_sum,
+                    row.histogram,
+                )
+                for year, row in summaries.iterrows()
+            ],
+        )
+
+    def update(
+        self, station_id: str, daily: pd.DataFrame, stats: pd.DataFrame, state: StationState
+    ):
+        """
+        Store the result of update_batch for a station: its daily rows, day statistics and state.
+
+        For a station with a stored state, daily covers its previous last day onwards. Rows
+        from that day on that are no longer between kept days are emptied, and if the outlier
+        bounds moved, earlier days whose outlier status changed are rewritten from their day
+        statistics. The stored rows then match a full rebuild, except that a day at either end
+        of the record that becomes an outlier is left as an empty row instead of removed.
+
+        Args:
+            station_id: Meteostat station id.
+            daily: New daily rows, with columns: date, pres_min, pres_max.
+            stats: Day statistics of the hourly data daily was computed from.
+            state: New state of the station.
+
+        Returns:
+            None
+        """
+        previous = self.station_state(station_id)
+        last_date = self.last_date(station_id)
+        if previous is not None and last_date is not None:
+            if daily.empty:
+                # Corrections take the dtypes of the stored rows, as new rows would have
+                daily = read_daily(self._parts(station_id)[-1]).iloc[:0]
+            dtype = str(daily["pres_min"].dtype)
+            rows = {}
+
+            # Empty the days after the stored record up to the first new row, and refetched
+            # days that are no longer kept
+            first_new = daily["date"].min() if not daily.empty else None
+            pad_start = min(previous.until, last_date + timedelta(days=1))
+            pad_end = first_new - timedelta(days=1) if first_new is not None else last_date
+            for date in pd.date_range(pad_start, pad_end, freq="D"):
+                rows[date] = (np.nan, np.nan)
+
+            if not _same_bounds(previous.bounds, state.bounds):
+                old = self.day_stats(station_id)
+                old = old[old["date"] < previous.until]
+                removed = processing.removed_days(old, state.bounds)
+                flipped = processing.removed_days(old, previous.bounds) != removed
+                for date, pres_min, pres_max, is_removed in zip(
+                    old["date"][flipped],
+                    old["pres_min"][flipped],
+                    old["pres_max"][flipped],
+                    removed[flipped],
+                ):
+                    rows[date] = (np.nan, np.nan) if is_removed else (pres_min, pres_max)
+                logging.debug(
+                    "Outlier bounds of station %s moved, rewrote %d earlier days.",
+                    station_id,
+                    flipped.sum(),
+                )
+
+            if rows:
+                dates = sorted(rows)
+                corrections = pd.DataFrame(
+                    {
+                        "date": pd.DatetimeIndex(dates).astype(daily["date"].dtype),
+                        "pres_min": pd.array([rows[d][0] for d in dates]).astype(dtype),
+                        "pres_max": pd.array([rows[d][1] for d in dates]).astype(dtype),
+                    }
+                )
+                daily = pd.concat([corrections, daily], ignore_index=True)
+
+        # The rows, day statistics and state of a station are recorded in one transaction, so
+        # an interrupted update leaves the station as it was before
+        daily = daily[DAILY_COLUMNS]
+        summaries = self._write_parts(station_id, daily) if not daily.empty else None
+        with self._connect() as conn:
+            if summaries is not None:
+                self._record_append(conn, station_id, daily, summaries)
+            if not stats.empty:
+                years = pd.DatetimeIndex(stats["date"]).year
+                for year, rows in stats.groupby(years):
+                    blob = conn.execute(
+                        "SELECT stats FROM day_stats WHERE station = ? AND year = ?",
+                        (station_id, int(year)),
+                    ).fetchone()
+                    if blob is not None:
+                        existing = _decode_day_stats(blob[0])
+                        rows = pd.concat([existing[existing["date"] < rows["date"].min()], rows])
+                    conn.execute(
+                        "INSERT OR REPLACE INTO day_stats VALUES (?, ?, ?)",
+                        (station_id, int(year), _encode_day_stats(rows)),
+                    )
+            conn.execute(
+                "INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    station_id,
+                    state.until.isoformat(),
+                    state.last_time.isoformat() if state.last_time is not None else None,
+                    _nullable(state.last_pres),
+                    _nullable(state.lower),
+                    _nullable(state.upper),
+                    state.n_readings,
+                    state.n_missing,
+                    state.n_days,
+                    state.n_short_days,
+                    state.sketch.to_bytes(),
+                ),
+            )
+
+    def station_state(self, station_id: str) -> StationState | None:
+        """
+        Return the state stored by the last update of a station.
+
+        Args:
+            station_id: Meteostat station id.
+
+        Returns:
+            StationState, or None if the station was never stored by update().
+        """
+        return self.station_states([station_id]).get(station_id)
+
+    def station_states(self, station_ids: list[str]) -> dict[str, StationState]:
+        """
+        Return the states stored by the last update of several stations, in few reads.
+
+        Args:
+            station_ids: Meteostat station ids.
+
+        Returns:
+            dict mapping station_id -> StationState, for the stations stored by update().
+        """
+        states = {}
+        with self._connect() as conn:
+            for i in range(0, len(station_ids), STATE_QUERY_SIZE):
+                chunk = station_ids[i : i + STATE_QUERY_SIZE]
+                rows = conn.execute(
+                    "SELECT station, until, last_time, last_pres, lower, upper, n_readings, "
+                    "n_missing, n_days, n_short_days, sketch FROM state "
+                    f"WHERE station IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for station_id, until, last_time, last_pres, lower, upper, *rest in rows:
+                    *counts, sketch = rest
+                    states[station_id] = StationState(
+                        pd.Timestamp(until),
+                        QuantileSketch.from_bytes(sketch),
+                        pd.Timestamp(last_time) if last_time is not None else None,
+                        _float(last_pres),
+                        _float(lower),
+                        _float(upper),
+                        *counts,
+                    )
+        return states
+
+    def day_stats(self, station_id: str) -> pd.DataFrame:
+        """
+        Return the day statistics stored for a station.
+
+        Args:
+            station_id: Meteostat station id.
+
+        Returns:
+            DataFrame with DAY_STATS_COLUMNS sorted by date, see processing.day_stats.
+        """
+        with self._connect() as conn:
+            blobs = conn.execute(
+                "SELECT stats FROM day_stats WHERE station = ? ORDER BY year", (station_id,)
+            ).fetchall()
+        if not blobs:
+            return _decode_day_stats(zlib.compress(b""))
+        return pd.concat([_decode_day_stats(blob[0]) for blob in blobs], ignore_index=True)
+
+    def read(self, station_id: str) -> pd.DataFrame | None:
+        """
+        Read all daily rows for a station.
+
+        Args:
+            station_id: Meteostat station id.
+
+        Returns:
+            DataFrame with columns: date, pres_min, pres_max sorted by date, or None if the
+            station has no data.
+        """
+        parts = self._parts(station_id)
+        if not parts:
+            return None
+        daily = pd.concat([read_daily(part) for part in parts], ignore_index=True)
+        daily = daily.drop_duplicates("date", keep="last").sort_values("date")
+        return daily.reset_index(drop=True)
+
+    def last_date(self, station_id: str) -> pd.Timestamp | None:
+        """
+        Return the last recorded date for a station from the manifest.
+
+        Args:
+            station_id: Meteostat station id.
+
+        Returns:
+            Last recorded date, or None if the station has no data.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT last_date FROM stations WHERE station = ?", (station_id,)
+            ).fetchone()
+        return pd.Timestamp(row[0]) if row else None
+
+    def read_many(self, station_ids: list[str]) -> pd.DataFrame:
+        """
+        Read daily rows for several stations into one long-format frame.
+
+        Args:
+            station_ids: Meteostat station ids.
+
+        Returns:
+            DataFrame with columns: station, date, pres_min, pres_max.
+        """
+        frames = {}
+        for station_id in station_ids:
+            daily = self.read(station_id)
+            if daily is not None:
+                frames[station_id] = daily
+        if not frames:
+            return pd.DataFrame(columns=["station", *DAILY_COLUMNS])
+        return (
+            pd.concat(frames, names=["station", None]).reset_index(level=0).reset_index(drop=True)
+        )
+
+    def manifest(self) -> pd.DataFrame:
+        """
+        Return the manifest entries of all stations in one read.
+
+        Returns:
+            DataFrame indexed by station with columns: last_date, n_rows, version,
+            write_hash (a hash chained over the rows of every write, which changes whenever
+            rows are written but is not a hash of the stored rows) and fetched_until (end of
+            the last completed fetch, NaT if not recorded).
+        """
+        with self._connect() as conn:
+            manifest = pd.read_sql_query(
+                "SELECT station, last_date, n_rows, version, write_hash, fetched_until "
+                "FROM stations",
+                conn,
+                index_col="station",
+            )
+        manifest["last_date"] = pd.to_datetime(manifest["last_date"])
+        manifest["fetched_until"] = pd.to_datetime(manifest["fetched_until"])
+        return manifest
+
+    def mark_fetched(self, fetched_until: dict[str, datetime]):
+        """
+        Record the end of the fetch that stored stations were last brought up to date with.
+
+        Stations not in the store are ignored.
+
+        Args:
+            fetched_until: dict mapping station_id -> end datetime of the fetch.
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE stations SET fetched_until = ? WHERE station = ?",
+                [(pd.Timestamp(end).isoformat(), sid) for sid, end in fetched_until.items()],
+            )
+
+    def reject(self, station_id: str, reason: str, inventory_end: datetime | None = None):
+        """
+        Record in the rejection ledger that a station failed quality checks.
+
+        Args:
+            station_id: Meteostat station id.
+            reason: Short reason for the rejection, e.g. 'inventory' or 'quality'.
+            inventory_end: End of the station's inventory when it was rejected, used to
+                decide when to try it again.
+
+        Returns:
+            None
+        """
+        end = pd.Timestamp(inventory_end).isoformat() if inventory_end is not None else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO rejected VALUES (?, ?, ?, ?)",
+                (station_id, reason, end, time.time()),
+            )
+
+    def rejections(self) -> pd.DataFrame:
+        """
+        Return the rejection ledger.
+
+        Returns:
+            DataFrame indexed by station with columns: reason, inventory_end, rejected_at.
+        """
+        with self._connect() as conn:
+            rejections = pd.read_sql_query(
+                "SELECT station, reason, inventory_end, rejected_at FROM rejected",
+                conn,
+                index_col="station",
+                parse_dates=["inventory_end"],
+            )
+        rejections["inventory_end"] = pd.to_datetime(rejections["inventory_end"])
+        rejections["rejected_at"] = pd.to_datetime(rejections["rejected_at"], unit="s")
+        return rejections
+
+    def start_run(self, start: datetime, end: datetime) -> int:
+        """
+        Record the start of a run over a time window, abandoning any unfinished earlier run.
+
+        Args:
+            start: Start datetime of the run's window.
+            end: End datetime of the run's window.
+
+        Returns:
+            Id of the new run, for journal() and finish_run().
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE runs SET status = 'abandoned' WHERE status = 'running'")
+            cursor = conn.execute(
+                "INSERT INTO runs (window_start, window_end, status, started_at) "
+                "VALUES (?, ?, 'running', ?)",
+                (start.isoformat(), end.isoformat(), time.time()),
+            )
+            return cursor.lastrowid
+
+    def interrupted_run(self) -> tuple[int, datetime, datetime] | None:
+        """
+        Return the last run that was started but never finished.
+
+        Returns:
+            Tuple of the run id and the start and end of its window, or None if every run
+            finished.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT run_id, window_start, window_end FROM runs WHERE status = 'running' "
+                "ORDER BY run_id DESC LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], datetime.fromisoformat(row[1]), datetime.fromisoformat(row[2])
+
+    def finish_run(self, run_id: int):
+        """
+        Record that a run processed every station it planned.
+
+        Args:
+            run_id: Id returned by start_run.
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET status = 'finished', finished_at = ? WHERE run_id = ?",
+                (time.time(), run_id),
+            )
+
+    def journal(self, run_id: int, outcomes: dict[str, str]):
+        """
+        Record stations a run has finished with, e.g. after each batch.
+
+        Args:
+            run_id: Id returned by start_run.
+            outcomes: dict mapping station_id -> outcome, e.g. 'written' or 'rejected'.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO journal VALUES (?, ?, ?, ?)",
+                [(run_id, station_id, status, now) for station_id, status in outcomes.items()],
+            )
+
+    def finished_stations(self, run_id: int) -> set[str]:
+        """
+        Return the stations a run has recorded in its journal.
+
+        Args:
+            run_id: Id returned by start_run.
+
+        Returns:
+            Set of station ids.
+        """
+        with self._connect() as conn:
+            return {
+                row[0]
+                for row in conn.execute("SELECT station FROM journal WHERE run_id = ?", (run_id,))
+            }
+
+    def recover(self):
+        """
+        Remove files left by an interrupted run.
+
+        Temporary files are removed, as are parts written after the last manifest update of
+        their station, whose rows were never recorded. Part names start with the time they
+        were written, and the manifest is updated only after a station's parts are in place.
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            updated_at = {
+                station_id: int(at * 1e9)
+                for station_id, at in conn.execute("SELECT station, updated_at FROM stations")
+            }
+        n_tmp = n_orphans = 0
+        for tmp_path in self.path.glob("*/*/*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+            n_tmp += 1
+        for part in self.path.glob("*/*/*.parquet"):
+            written_at = int(part.stem.split("-")[0])
+            if written_at > updated_at.get(part.parent.parent.name, -1):
+                part.unlink()
+                n_orphans += 1
+        logging.info(
+            "Recovered %s: removed %d temporary files and %d unrecorded parts.",
+            self.path,
+            n_tmp,
+            n_orphans,
+        )
+
+    def summary(
+        self,
+        station_ids: list[str] | None = None,
+        start_year: int | None = None,
+        end_year: int | None = None,
+    ) -> pd.DataFrame:
+        """
+        Return the daily pressure range summaries of station-years, without reading daily files.
+
+        Stations written before the summary existed are summarised from their daily files
+        first.
+
+        Args:
+            station_ids: Only return these stations.
+            start_year: Only return years from this one.
+            end_year: Only return years up to and including this one.
+
+        Returns:
+            DataFrame with columns: station, year, n_days, range_sum, range_sq_sum, histogram,
+            for use with the functions in summary.py.
+        """
+        self._backfill_summary()
+        query = "SELECT station, year, n_days, range_sum, range_sq_sum, histogram FROM summary"
+        conditions, params = [], []
+        if start_year is not None:
+            conditions.append("year >= ?")
+            params.append(int(start_year))
+        if end_year is not None:
+            conditions.append("year <= ?")
+            params.append(int(end_year))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            summaries = pd.read_sql_query(query + " ORDER BY station, year", conn, params=params)
+        if station_ids is not None:
+            summaries = summaries[summaries["station"].isin(station_ids)]
+        return summaries.reset_index(drop=True)
+
+    def _backfill_summary(self):
+        with self._connect() as conn:
+            missing = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT station FROM stations WHERE station NOT IN "
+                    "(SELECT DISTINCT station FROM summary)"
+                )
+            ]
+        for station_id in missing:
+            daily = self.read(station_id)
+            if daily is None:
+                continue
+            with self._connect() as conn:
+                self._write_summaries(conn, station_id, summary.summarise_daily(daily))
+        if missing:
+            logging.info("Summarised %d stations written before the summary index.", len(missing))
+
+    def station_ids(self) -> list[str]:
+        """
+        Return the ids of all stations with data in the store.
+
+        Returns:
+            List of station ids.
+        """
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT station FROM stations")]
+
+    def compact(self, min_parts: int = 8):
+        """
+        Merge the parts of each station-year with at least min_parts parts into one file.
+
+        Only stations written since they were last compacted, and that can have min_parts
+        parts, are looked at, so compaction after a run that wrote nothing does not touch the
+        data files. Must not run while the store is being written, as the parts it replaces
+        are deleted.
+
+        Args:
+            min_parts: Minimum number of parts in a station-year before it is compacted.
+
+        Returns:
+            None
+        """
+        # A station never compacted has at most one part per version in any year
+        with self._connect() as conn:
+            written = conn.execute(
+                "SELECT station, version FROM stations WHERE version > compacted_version "
+                "AND (compacted_version > 0 OR version >= ?)",
+                (min_parts,),
+            ).fetchall()
+        compacted = 0
+        for station_id, version in written:
+            for year_path in (self.path / station_id).glob("*/"):
+                parts = self._parts(station_id, int(year_path.name))
+                if len(parts) < min_parts:
+                    continue
+                merged = pd.concat([read_daily(part) for part in parts], ignore_index=True)
+                merged = merged.drop_duplicates("date", keep="last").sort_values("date")
+                tmp_path = parts[-1].with_suffix(".tmp")
+                write_daily(merged, tmp_path)
+                os.replace(tmp_path, parts[-1])
+                for part in parts[:-1]:
+                    part.unlink()
+                compacted += 1
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE stations SET compacted_version = ? WHERE station = ?",
+                    (version, station_id),
+                )
+        logging.info("Compacted %d station-years in %s.", compacted, self.path)
+
+    def migrate_legacy(self):
+        """
+        Move flat <station>.parquet files from the previous layout into the store.
+
+        Returns:
+            None
+        """
+        for legacy_file in sorted(self.path.glob("*.parquet")):
+            self.append(legacy_file.stem, pd.read_parquet(legacy_file))
+            legacy_file.unlink()
+            logging.info("Migrated %s into the partitioned daily store.", legacy_file.name)
+
+
+def _encode_day_stats(stats: pd.DataFrame) -> bytes:
+    records = np.empty(len(stats), dtype=DAY_STATS_DTYPE)
+    records["date"] = stats["date"].to_numpy().astype("datetime64[D]")
+    for column in DAY_STATS_COLUMNS[1:]:
+        records[column] = stats[column].to_numpy(dtype=np.float64)
+    return zlib.compress(records.tobytes())
+
+
+def _decode_day_stats(blob: bytes) -> pd.DataFrame:
+    records = np.frombuffer(zlib.decompress(blob), dtype=DAY_STATS_DTYPE)
+    stats = pd.DataFrame({column: records[column] for column in DAY_STATS_COLUMNS})
+    stats["date"] = stats["date"].astype("datetime64[ns]")
+    return stats
+
+
+def _write_hash(previous: str | None, daily: pd.DataFrame) -> str:
+    """Chain the hash of a station's earlier writes with the rows written now."""
+    digest = hashlib.sha256((previous or "").encode())
+    digest.update(pd.util.hash_pandas_object(daily, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _same_bounds(a: tuple[float, float], b: tuple[float, float]) -> bool:
+    return all(x == y or (np.isnan(x) and np.isnan(y)) for x, y in zip(a, b))
+
+
+def _nullable(value: float) -> float | None:
+    """SQLite stores NaN as NULL, so write it as such explicitly."""
+    return None if np.isnan(value) else float(value)
+
+
+def _float(value: float | None) -> float:
+    return np.nan if value is None else float(value)
+
+
+def consolidate(store: DailyStore, stations: pd.DataFrame, output_path: Path):
+    """
+    Write all stations in a daily store to a single dataset partitioned by country.
+
+    Rows are sorted by station and date, and each station is written as its own row group,
+    so readers can skip straight to the stations they need using the row group statistics.
+    The new dataset replaces any existing one at output_path once it is complete.
+
+    Args:
+        store: Daily store to read station data from.
+        stations: Station metadata indexed by station id, with country, latitude and longitude.
+        output_path: Directory of the consolidated dataset.
+
+    Returns:
+        None
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    station_ids = sorted(set(store.station_ids()) & set(stations.index))
+
+    n_rows = 0
+    for country, country_ids in pd.Series(station_ids).groupby(
+        stations.loc[station_ids, "country"].to_numpy()
+    ):
+        country_path = tmp_path / f"country={country}"
+        country_path.mkdir(parents=True)
+        writer = None
+        for station_id in country_ids:
+            daily = store.read(station_id)
+            if daily is None:
+                continue
+            daily.insert(0, "station_id", station_id)
+            for column in STATION_COLUMNS:
+                daily[column] = float(stations.at[station_id, column])
+            table = pa.Table.from_pandas(daily, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(country_path / "part-0.parquet", table.schema)
+            writer.write_table(table)
+            n_rows += len(daily)
+        if writer is not None:
+            writer.close()
+
+    if output_path.exists():
+        old_path = output_path.with_name(output_path.name + ".old")
+        os.replace(output_path, old_path)
+        os.replace(tmp_path, output_path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, output_path)
+    logging.info("Consolidated %d rows for %d stations.", n_rows, len(station_ids))
+
+
+def read_consolidated(
+    path: Path,
+    station_ids: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> pd.DataFrame:
+    """
+    Read daily data from a consolidated dataset in a single scan.
+
+    Filters are pushed down to the Parquet reader, so only the row groups of matching
+    stations and dates are read.
+
+    Args:
+        path: Directory of the consolidated dataset.
+        station_ids: Only read these stations.
+        bbox: Only read stations within (lon_min, lon_max, lat_min, lat_max). Longitudes
+            above 180 wrap around, as in LONG_LAT_DICT.
+        start: Only read days on or after this date.
+        end: Only read days on or before this date.
+
+    Returns:
+        DataFrame with columns: station_id, date, pres_min, pres_max, latitude, longitude,
+        country.
+    """
+    conditions = []
+    if station_ids is not None:
+        conditions.append(pc.field("station_id").isin(list(station_ids)))
+    if bbox is not None:
+        lon_min, lon_max, lat_min, lat_max = bbox
+        longitude = pc.field("longitude")
+        if lon_max > 180:
+            conditions.append((longitude >= lon_min) | (longitude <= lon_max - 360))
+        else:
+            conditions.append((longitude >= lon_min) & (longitude <= lon_max))
+        conditions.append((pc.field("latitude") >= lat_min) & (pc.field("latitude") <= lat_max))
+    if start is not None:
+        conditions.append(pc.field("date") >= pd.Timestamp(start))
+    if end is not None:
+        conditions.append(pc.field("date") <= pd.Timestamp(end))
+
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    return dataset.to_table(filter=condition).to_pandas()
@@ -0,0 +1,120 @@
+"""
+Per station-year summaries of daily pressure ranges
+"""
+
+import zlib
+
+import numpy as np
+import pandas as pd
+
+RANGE_RESOLUTION: float = 0.1
+N_RANGE_BINS: int = 601
+SUMMARY_COLUMNS: list[str] = ["n_days", "range_sum", "range_sq_sum", "histogram"]
+
+
+def summarise_daily(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarise daily pressure ranges per year.
+
+    Ranges are binned at the 0.1 hPa resolution of meteostat pressure readings: bin i holds
+    days with a range of i tenths of a hPa, and the last bin every range of 60 hPa or more.
+    Days without a range are left out, as compute_frac_var_batch does for meteostat data.
+
+    Args:
+        daily: Daily pressure data for a single station with columns: date, pres_min, pres_max.
+
+    Returns:
+        DataFrame indexed by every year in daily with columns: n_days (days with a range),
+        range_sum and range_sq_sum (sum of ranges and of squared ranges in hPa) and histogram
+        (encoded day counts per range bin, see decode_histograms).
+    """
+    pres_range = (daily["pres_max"] - daily["pres_min"]).to_numpy(dtype=float, na_value=np.nan)
+    years = pd.DatetimeIndex(daily["date"]).year.to_numpy()
+    valid = ~np.isnan(pres_range)
+    bins = np.zeros(len(pres_range), dtype=np.intp)
+    bins[valid] = np.clip(np.rint(pres_range[valid] / RANGE_RESOLUTION), 0, N_RANGE_BINS - 1)
+
+    summaries = {}
+    for year in np.unique(years):
+        in_year = (years == year) & valid
+        histogram = np.bincount(bins[in_year], minlength=N_RANGE_BINS).astype(np.uint16)
+        summaries[int(year)] = {
+            "n_days": int(in_year.sum()),
+            "range_sum": float(pres_range[in_year].sum()),
+            "range_sq_sum": float((pres_range[in_year] ** 2).sum()),
+            "histogram": zlib.compress(histogram.tobytes()),
+        }
+    summary = pd.DataFrame.from_dict(summaries, orient="index", columns=SUMMARY_COLUMNS)
+    summary.index.name = "year"
+    return summary
+
+
+def decode_histograms(histograms: list[bytes]) -> np.ndarray:
+    """
+    Decode range histograms written by summarise_daily.
+
+    Args:
+        histograms: Encoded histograms.
+
+    Returns:
+        Array of shape (len(histograms), N_RANGE_BINS) of day counts.
+    """
+    decoded = np.zeros((len(histograms), N_RANGE_BINS), dtype=np.int64)
+    for i, histogram in enumerate(histograms):
+        decoded[i] = np.frombuffer(zlib.decompress(histogram), dtype=np.uint16)
+    return decoded
+
+
+def frac_var(summary: pd.DataFrame, thresholds: list[float]) -> pd.DataFrame:
+    """
+    Calculate frac_var from station-year summaries for several thresholds.
+
+    Equivalent to compute_frac_var_sweep on the daily data the summaries were built from,
+    with ranges rounded to 0.1 hPa before they are compared with a threshold.
+
+    Args:
+        summary: Station-year summaries with columns: station, year, n_days, histogram, as
+            returned by DailyStore.summary.
+        thresholds: Pressure change thresholds in hPa, up to 60 hPa.
+
+    Returns:
+        DataFrame of the mean fraction of high-variation days per year, indexed by station
+        with one column per threshold, in the order given.
+    """
+    summary = summary[summary["n_days"] > 0]
+    histograms = decode_histograms(list(summary["histogram"]))
+
+    # Days at or above bin b are the histogram's tail from b
+    tails = np.cumsum(histograms[:, ::-1], axis=1)[:, ::-1]
+    first_bins = np.ceil(np.asarray(thresholds, dtype=float) / RANGE_RESOLUTION - 1e-6)
+    first_bins = np.clip(first_bins, 0, N_RANGE_BINS - 1).astype(np.intp)
+    yearly = tails[:, first_bins] / summary["n_days"].to_numpy()[:, None]
+
+    result = pd.DataFrame(yearly).groupby(summary["station"].to_numpy()).mean()
+    result.index.name = "station"
+    result.columns = pd.Index(np.asarray(thresholds, dtype=float), name="thresh")
+    return result
+
+
+def range_stats(summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculate daily pressure range statistics per station from station-year summaries.
+
+    Args:
+        summary: Station-year summaries with columns: station, year, n_days, range_sum,
+            range_sq_sum, as returned by DailyStore.summary.
+
+    Returns:
+        DataFrame indexed by station with columns: n_years (years with data), n_days,
+        range_mean, range_std (population standard deviation).
+    """
+    summary = summary[summary["n_days"] > 0]
+    totals = summary.groupby("station").agg(
+        n_years=("year", "size"),
+        n_days=("n_days", "sum"),
+        range_sum=("range_sum", "sum"),
+        range_sq_sum=("range_sq_sum", "sum"),
+    )
+    mean = totals["range_sum"] / totals["n_days"]
+    variance = (totals["range_sq_sum"] / totals["n_days"] - mean**2).clip(lower=0)
+    return totals[["n_years", "n_days"]].assign(range_mean=mean, range_std=np.sqrt(variance))
@@ -3,12 +3,26 @@ Common utility functions
 """
 
 import logging
+import os
 
 from pathlib import Path
 
 import pandas as pd
 import pycountry
 
+from .storage import DailyStore
+
+
+def init_worker_logging():
+    """
+    Configure logging in a worker process the same way as the main process.
+
+    Returns:
+        None
+    """
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.getLogger("meteostat").setLevel(logging.WARNING)
+
 
 def get_country_codes() -> list[str]:
     """
@@ -27,17 +41,19 @@ def save_station_metadata(stations: pd.DataFrame, daily_path: Path, output_path:
 
     Args:
         stations: DataFrame of all eligible stations (from get_eligible_stations).
-        daily_path: Path to directory containing per-station Parquet files.
+        daily_path: Path to the daily data store.
         output_path: Path to save the metadata CSV.
 
     Returns:
         None
     """
-    processed_ids = {f.stem for f in daily_path.glob("*.parquet")}
+    processed_ids = set(DailyStore(daily_path).station_ids())
     if not processed_ids:
         logging.warning("No processed station data found at %s", daily_path)
         return
 
     metadata = stations[stations.index.isin(processed_ids)]
-    metadata.to_csv(output_path / "stations.csv")
+    tmp_path = output_path / "stations.csv.tmp"
+    metadata.to_csv(tmp_path)
+    os.replace(tmp_path, output_path / "stations.csv")
     logging.info("Saved metadata for %d stations.", len(metadata))
@@ -2,45 +2,140 @@
 Functions to make maps of weather data
 """
 
+import hashlib
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 import matplotlib.collections
+from matplotlib.image import AxesImage
+import cartopy
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from cartopy.mpl.geoaxes import GeoAxes
 
-from ..consts import LONG_LAT_DICT, FIGURES_DIR, FIG_SAVE_PATH, PROCESSED_DATA_DIR
+from ..consts import (
+    DATA_DIR,
+    FIG_SAVE_PATH,
+    FIGURES_DIR,
+    LONG_LAT_DICT,
+    PROCESSED_DATA_DIR,
+    REPORTS_DIR,
+)
+from ..spatial import StationIndex, grid_mean
+from ..utils import init_worker_logging
 
 plt.rcParams["font.family"] = "sans-serif"
 plt.rcParams["font.sans-serif"] = ["Open Sans"]
 
+FIG_SIZE: tuple[int, int] = (12, 8)
+BASE_MAP_DPI: int = 200
+BASE_FEATURES: list[tuple[cfeature.Feature, dict]] = [
+    (cfeature.LAND, {"color": "0.9"}),
+    (cfeature.OCEAN, {}),
+    (cfeature.COASTLINE, {}),
+    (cfeature.BORDERS, {}),
+]
+STATION_COLUMNS: list[str] = ["longitude", "latitude", "frac_var"]
+MAP_MODES: tuple[str, ...] = ("scatter", "grid")
+GRID_COLUMNS: int = 240
+
+# Station index built once per rendering worker by _init_renderer
+_index: StationIndex | None = None
+
+
+def load_stations(input_path: Path) -> pd.DataFrame:
+    """
+    Load the station table used by the maps.
+
+    Args:
+        input_path: Location of the processed station data.
+
+    Returns:
+        DataFrame indexed by station id with columns: longitude, latitude, frac_var.
+    """
+    return pd.read_csv(input_path / "all.csv", index_col="id", usecols=["id", *STATION_COLUMNS])
+
+
+def _init_renderer(stations: pd.DataFrame):
+    global _index  # pylint: disable=global-statement
+    init_worker_logging()
+    _index = StationIndex(stations)
+
+
+def _render_in_worker(
+    region: str,
+    output_path: Path,
+    base_map_path: Path | None,
+    features: list[tuple[cfeature.Feature, dict]],
+    mode: str,
+) -> tuple[str, float]:
+    return region, render_region(region, _index, output_path, base_map_path, features, mode)
+
 
 def plots(
-    input_path: Path = Path(PROCESSED_DATA_DIR),
-    output_path: Path = Path(FIGURES_DIR),
-):
+    input_path: Path = Path(PROCESSED_DATA_DIR.format(data_dir=DATA_DIR.format(project_root="."))),
+    output_path: Path = Path(FIGURES_DIR.format(reports_dir=REPORTS_DIR.format(project_root="."))),
+    max_workers: int | None = None,
+    base_map_path: Path | None = None,
+    regions: list[str] | None = None,
+    features: list[tuple[cfeature.Feature, dict]] = BASE_FEATURES,
+    mode: str = "scatter",
+) -> dict[str, float]:
     """
-    Generate plots for all predefined world regions.
+    Generate plots for all predefined world regions in parallel.
+
+    The station table is read once and shared with each worker process when it starts, where
+    it is indexed so that each region only draws its visible stations.
 
     Args:
         input_path: Location of the processed station data.
         output_path: Directory to save the resulting figures.
+        max_workers: Number of rendering processes. Defaults to one per region, up to the
+            number of CPUs.
+        base_map_path: Directory of cached base map rasters. Defaults to output_path/.base_map.
+        regions: Regions to plot. Defaults to all keys in LONG_LAT_DICT.
+        features: Base map features and their drawing options.
+        mode: 'scatter' to draw each station, or 'grid' to draw a gridded mean.
 
     Returns:
-        None
+        dict mapping region -> render time in seconds.
     """
-    for region in LONG_LAT_DICT.keys():
-        logging.info("Generating plot from data for %s...", region)
-        plot_region(region, input_path, output_path)
+    regions = regions or list(LONG_LAT_DICT.keys())
+    base_map_path = base_map_path or output_path / ".base_map"
+    max_workers = max_workers or min(len(regions), os.cpu_count() or 1)
+    output_path.mkdir(parents=True, exist_ok=True)
+    stations = load_stations(input_path)
+
+    t0 = time.perf_counter()
+    timings = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_renderer, initargs=(stations,)
+    ) as executor:
+        futures = [
+            executor.submit(_render_in_worker, region, output_path, base_map_path, features, mode)
+            for region in regions
+        ]
+        for future in as_completed(futures):
+            region, seconds = future.result()
+            timings[region] = seconds
+            logging.info("Rendered %s in %.2fs.", region, seconds)
 
-    logging.info("Plot generation complete.")
+    logging.info(
+        "Plot generation complete: %d regions in %.2fs.", len(regions), time.perf_counter() - t0
+    )
+    return timings
 
 
-def plot_region(region: str, input_path: Path, output_path: Path):
+def plot_region(
+    region: str, input_path: Path, output_path: Path, base_map_path: Path | None = None
+):
     """
     Plot pressure variation data for a specific world region.
 
@@ -48,76 +143,242 @@ def plot_region(region: str, input_path: Path, output_path: Path):
         region: Region name. Must be one of the keys in LONG_LAT_DICT.
         input_path: Location of the processed station data file.
         output_path: Directory to save the resulting figure.
+        base_map_path: Optional directory of cached base map rasters.
 
     Returns:
         None
     """
+    render_region(region, StationIndex(load_stations(input_path)), output_path, base_map_path)
+
+
+def render_region(
+    region: str,
+    index: StationIndex,
+    output_path: Path,
+    base_map_path: Path | None = None,
+    features: list[tuple[cfeature.Feature, dict]] = BASE_FEATURES,
+    mode: str = "scatter",
+) -> float:
+    """
+    Render the map of a region to FIG_SAVE_PATH and free the figure.
+
+    Args:
+        region: Region name. Must be one of the keys in LONG_LAT_DICT.
+        index: Spatial index over the station table with columns: longitude, latitude,
+            frac_var. Only stations within the region are projected and drawn.
+        output_path: Directory to save the resulting figure.
+        base_map_path: Directory of cached base map rasters. If None, the base map features
+            are drawn as vectors.
+        features: Base map features and their drawing options.
+        mode: 'scatter' to draw each station, or 'grid' to draw the mean frac_var of the
+            stations in each cell of a grid scaled to the region, as one image.
+
+    Returns:
+        Render time in seconds.
+    """
     if region not in LONG_LAT_DICT.keys():
         logging.error("Region not found in region list.")
+    if mode not in MAP_MODES:
+        raise ValueError(f"Unknown map mode {mode!r}, expected one of {MAP_MODES}.")
 
-    # Get latitude and longitude for the given region
-    longitude_range: list = LONG_LAT_DICT[region]["long"]
-    latitude_range: list = LONG_LAT_DICT[region]["lat"]
-    cent_lon = (longitude_range[0] + longitude_range[1]) / 2.0
+    t0 = time.perf_counter()
+    extent = _region_extent(region)
+    projection = _region_projection(region)
 
     # create world map of all data
-    fig = plt.figure(figsize=(12, 8))
-    ax: GeoAxes = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree(central_longitude=cent_lon))  # type: ignore
-    im = plot_world(ax, input_path)
-
-    if region != "World":
-        im.set_sizes([5])
-    else:
-        im.set_sizes([1])
-
-    # restrict plot bounds for region of interest
-    ax.set_extent(
-        [longitude_range[0], longitude_range[1], latitude_range[0], latitude_range[1]],
-        crs=ccrs.PlateCarree(),
+    fig = plt.figure(figsize=FIG_SIZE)
+    try:
+        ax: GeoAxes = fig.add_subplot(1, 1, 1, projection=projection)  # type: ignore
+        ax.set_extent(extent, crs=ccrs.PlateCarree())
+        if base_map_path is None:
+            for feature, kwargs in features:
+                ax.add_feature(feature, **kwargs)
+        else:
+            draw_base_map(ax, region, base_map_path, features)
+
+        stations = index.query(*extent)
+        if mode == "grid":
+            im = plot_grid(ax, stations, region)
+        else:
+            im = plot_world(ax, stations)
+            im.set_sizes([1] if region == "World" else [5])
+
+        # restrict plot bounds for region of interest
+        ax.set_extent(extent, crs=ccrs.PlateCarree())
+
+        cbar = fig.colorbar(im, orientation="vertical", extend="max")
+        cbar.set_label("Fraction of days with high pressure variation", rotation=270, labelpad=12)
+
+        fig.savefig(
+            FIG_SAVE_PATH.format(output_path=output_path, region=region), bbox_inches="tight"
+        )
+    finally:
+        plt.close(fig)
+    return time.perf_counter() - t0
+
+
+def draw_base_map(
+    ax: GeoAxes,
+    region: str,
+    base_map_path: Path,
+    features: list[tuple[cfeature.Feature, dict]] = BASE_FEATURES,
+):
+    """
+    Draw the base map layers of a region as one cached raster image.
+
+    The raster is rendered once per projection and extent and saved in base_map_path, so
+    later renders skip reading and projecting the feature geometries.
+
+    Args:
+        ax: Cartopy GeoAxes with the region's projection and extent already set.
+        region: Region name. Must be one of the keys in LONG_LAT_DICT.
+        base_map_path: Directory of cached base map rasters.
+        features: Base map features and their drawing options.
+
+    Returns:
+        None
+    """
+    key = repr(
+        (
+            _region_extent(region),
+            _region_projection(region).proj4_init,
+            FIG_SIZE,
+            BASE_MAP_DPI,
+            [(_feature_name(feature), kwargs) for feature, kwargs in features],
+            cartopy.__version__,
+            matplotlib.__version__,
+        )
     )
+    raster_path = base_map_path / f"{hashlib.sha256(key.encode()).hexdigest()[:16]}.png"
+    if not raster_path.exists():
+        _rasterise_base_map(region, raster_path, features)
+
+    xlim, ylim = ax.get_xlim(), ax.get_ylim()
+    ax.imshow(
+        plt.imread(raster_path),
+        extent=(*xlim, *ylim),
+        transform=ax.projection,
+        origin="upper",
+        interpolation="antialiased",
+        zorder=0,
+    )
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+
+
+def _rasterise_base_map(
+    region: str, raster_path: Path, features: list[tuple[cfeature.Feature, dict]]
+):
+    fig = plt.figure(figsize=FIG_SIZE, dpi=BASE_MAP_DPI)
+    try:
+        ax: GeoAxes = fig.add_axes((0, 0, 1, 1), projection=_region_projection(region))  # type: ignore
+        ax.set_extent(_region_extent(region), crs=ccrs.PlateCarree())
+        for feature, kwargs in features:
+            ax.add_feature(feature, **kwargs)
+        ax.set_axis_off()
+        fig.canvas.draw()
 
-    cbar = fig.colorbar(im, orientation="vertical", extend="max")
-    cbar.set_label("Fraction of days with high pressure variation", rotation=270, labelpad=12)
+        # Crop to the axes, whose aspect ratio is fixed by the projection
+        bbox = ax.get_window_extent().transformed(fig.dpi_scale_trans.inverted())
+        raster_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = raster_path.with_suffix(".tmp.png")
+        fig.savefig(tmp_path, dpi=BASE_MAP_DPI, bbox_inches=bbox, pad_inches=0)
+        os.replace(tmp_path, raster_path)
+    finally:
+        plt.close(fig)
 
-    plt.savefig(FIG_SAVE_PATH.format(output_path, region), bbox_inches="tight")
 
+def _feature_name(feature: cfeature.Feature) -> str:
+    return getattr(feature, "name", None) or type(feature).__name__
 
-def plot_world(ax: GeoAxes, input_path: Path) -> matplotlib.collections.PathCollection:
+
+def _region_extent(region: str) -> list[float]:
+    longitude_range: list = LONG_LAT_DICT[region]["long"]
+    latitude_range: list = LONG_LAT_DICT[region]["lat"]
+    return [longitude_range[0], longitude_range[1], latitude_range[0], latitude_range[1]]
+
+
+def _region_projection(region: str) -> ccrs.Projection:
+    longitude_range: list = LONG_LAT_DICT[region]["long"]
+    return ccrs.PlateCarree(central_longitude=(longitude_range[0] + longitude_range[1]) / 2.0)
+
+
+def plot_world(ax: GeoAxes, stations: pd.DataFrame) -> matplotlib.collections.PathCollection:
     """
-    Plot all station data onto a world map axes.
+    Plot station data onto a map axes.
 
     Args:
         ax: Cartopy GeoAxes to plot onto.
-        input_path: Location of the processed station data file.
+        stations: Station table with columns: longitude, latitude, frac_var.
 
     Returns:
         Scatter plot PathCollection for use in a colorbar.
     """
-    # add map features
-    ax.add_feature(cfeature.LAND, color="0.9")
-    ax.add_feature(cfeature.OCEAN)
-    ax.add_feature(cfeature.COASTLINE)
-    ax.add_feature(cfeature.BORDERS)
-
-    # get list of all station data available
-    # appended_stations = get_all_stations(input_path)
-    data = pd.read_csv(input_path / "all.csv")
-
     # plot all station data
-    scatter_plot = plt.scatter(
-        x=data["longitude"],
-        y=data["latitude"],
-        c=data["frac_var"],
+    scatter_plot = ax.scatter(
+        x=stations["longitude"],
+        y=stations["latitude"],
+        c=stations["frac_var"],
         s=50,
         vmin=0,
         vmax=0.3,
         transform=ccrs.PlateCarree(),
-        cmap=cm.get_cmap("YlOrRd"),
+        cmap=matplotlib.colormaps["YlOrRd"],
         zorder=10,
     )
 
+    _add_gridline_labels(ax)
+
+    return scatter_plot
+
+
+def _add_gridline_labels(ax: GeoAxes):
     gl = ax.gridlines(draw_labels=True, zorder=0, alpha=0.0)
     gl.top_labels = False
     gl.right_labels = False
 
-    return scatter_plot
+
+def plot_grid(ax: GeoAxes, stations: pd.DataFrame, region: str) -> AxesImage:
+    """
+    Plot the mean station frac_var in each cell of a grid as a single image.
+
+    The grid has GRID_COLUMNS columns across the region, with square cells, so its
+    resolution follows the region extent. Cells are laid out in the axes' own coordinates,
+    so the image is drawn without reprojection.
+
+    Args:
+        ax: Cartopy GeoAxes of the region to plot onto.
+        stations: Station table with columns: longitude, latitude, frac_var.
+        region: Region name. Must be one of the keys in LONG_LAT_DICT.
+
+    Returns:
+        AxesImage for use in a colorbar.
+    """
+    lon_min, lon_max, lat_min, lat_max = _region_extent(region)
+    cell_size = (lon_max - lon_min) / GRID_COLUMNS
+    n_rows = int(np.ceil((lat_max - lat_min) / cell_size))
+    half_width = (lon_max - lon_min) / 2
+    bounds = (-half_width, half_width, lat_min, lat_min + n_rows * cell_size)
+
+    # x in PlateCarree(central_longitude) is the longitude east of the central longitude
+    x = (stations["longitude"].to_numpy() - (lon_min + half_width) + 180) % 360 - 180
+    grid = grid_mean(
+        x,
+        stations["latitude"].to_numpy(),
+        stations["frac_var"].to_numpy(),
+        bounds,
+        (n_rows, GRID_COLUMNS),
+    )
+    _add_gridline_labels(ax)
+
+    return ax.imshow(
+        grid,
+        extent=bounds,
+        transform=ax.projection,
+        origin="lower",
+        interpolation="nearest",
+        vmin=0,
+        vmax=0.3,
+        cmap=matplotlib.colormaps["YlOrRd"],
+        zorder=10,
+    )
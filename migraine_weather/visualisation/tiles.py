@@ -0,0 +1,338 @@
+"""
+Export of station data as a zoomable XYZ tile pyramid
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import matplotlib
+import matplotlib.image
+import numpy as np
+import pandas as pd
+
+from ..utils import init_worker_logging
+
+TILE_SIZE: int = 256
+MAX_LATITUDE: float = 85.0511287798
+VMIN: float = 0.0
+VMAX: float = 0.3
+CMAP: str = "YlOrRd"
+TILES_PER_TASK: int = 64
+
+VIEWER_HTML: str = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>Fraction of days with high pressure variation</title>
+  <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+  <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+  <style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+  <div id="map"></div>
+  <script>
+    const map = L.map("map").setView([20, 0], 2);
+    L.tileLayer("https://tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png", {{
+      attribution: "&copy; OpenStreetMap contributors", maxZoom: {max_zoom}
+    }}).addTo(map);
+    L.tileLayer("{{z}}/{{x}}/{{y}}.png", {{
+      minZoom: {min_zoom}, maxNativeZoom: {max_zoom}, maxZoom: {max_zoom}, errorTileUrl: ""
+    }}).addTo(map);
+  </script>
+</body>
+</html>
+"""
+
+# Station pixel positions at zoom 0 and colours, shared once per worker by _init_tile_worker
+_points: dict[str, np.ndarray] = {}
+
+
+def marker_radius(zoom: int) -> int:
+    """
+    Radius in pixels of a station marker at a zoom level.
+
+    Args:
+        zoom: Zoom level.
+
+    Returns:
+        Marker radius in pixels.
+    """
+    return min(1 + zoom // 2, 6)
+
+
+def project(longitude: np.ndarray, latitude: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Project longitudes and latitudes to Web Mercator pixel coordinates at zoom 0.
+
+    Args:
+        longitude: Longitudes in degrees. Values above 180 wrap around.
+        latitude: Latitudes in degrees, clipped to the Web Mercator range.
+
+    Returns:
+        Tuple of (x, y) pixel coordinates, with (0, 0) at the north-west corner.
+    """
+    longitude = (np.asarray(longitude, dtype=float) + 180) % 360 - 180
+    latitude = np.radians(np.clip(np.asarray(latitude, dtype=float), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (longitude + 180) / 360 * TILE_SIZE
+    y = (1 - np.log(np.tan(latitude) + 1 / np.cos(latitude)) / np.pi) / 2 * TILE_SIZE
+    return x, y
+
+
+def tile_hashes(stations: pd.DataFrame, min_zoom: int, max_zoom: int) -> pd.Series:
+    """
+    Content hash of the stations drawn on each non-empty tile.
+
+    A station is part of every tile its marker overlaps, so a tile's hash changes exactly
+    when a station drawn on it is added, removed, moved or recoloured.
+
+    Args:
+        stations: Station table indexed by id with columns: longitude, latitude, frac_var.
+        min_zoom: Lowest zoom level.
+        max_zoom: Highest zoom level.
+
+    Returns:
+        Series of hashes indexed by (z, x, y).
+    """
+    stations = stations.dropna(subset=["frac_var"])
+    row_hashes = pd.util.hash_pandas_object(
+        stations[["longitude", "latitude", "frac_var"]].reset_index(), index=False
+    ).to_numpy()
+    x0, y0 = project(stations["longitude"], stations["latitude"])
+
+    hashes = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        n_tiles = 2**zoom
+        radius = marker_radius(zoom)
+        keys = []
+        for dx in (-radius, radius):
+            for dy in (-radius, radius):
+                tile_x = np.floor((x0 * n_tiles + dx) / TILE_SIZE).astype(np.int64) % n_tiles
+                tile_y = np.clip(
+                    np.floor((y0 * n_tiles + dy) / TILE_SIZE).astype(np.int64), 0, n_tiles - 1
+                )
+                keys.append(tile_y * n_tiles + tile_x)
+        # Count a station once per tile, even when several marker corners fall on it
+        keys = np.stack(keys, axis=1)
+        keys.sort(axis=1)
+        first = np.ones(keys.shape, dtype=bool)
+        first[:, 1:] = keys[:, 1:] != keys[:, :-1]
+        tiles, inverse = np.unique(keys[first], return_inverse=True)
+        sums = np.zeros(len(tiles), dtype=np.uint64)
+        np.add.at(sums, inverse, np.broadcast_to(row_hashes[:, None], keys.shape)[first])
+        hashes.append(
+            pd.Series(
+                sums,
+                index=pd.MultiIndex.from_arrays(
+                    [np.full(len(tiles), zoom), tiles % n_tiles, tiles // n_tiles],
+                    names=["z", "x", "y"],
+                ),
+            )
+        )
+    style = f"{TILE_SIZE}-{VMIN}-{VMAX}-{CMAP}-{[marker_radius(z) for z in range(max_zoom + 1)]}"
+    salt = int(hashlib.sha256(style.encode()).hexdigest()[:15], 16)
+    return (pd.concat(hashes) ^ np.uint64(salt)).map(lambda h: f"{h:016x}")
+
+
+def render_tile(zoom: int, tile_x: int, tile_y: int, points: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Draw the station markers falling on one tile.
+
+    Args:
+        zoom: Zoom level.
+        tile_x: Tile column.
+        tile_y: Tile row.
+        points: Arrays x and y (pixel coordinates at zoom 0) and rgba (colour of each
+            station), in drawing order.
+
+    Returns:
+        RGBA image of shape (TILE_SIZE, TILE_SIZE, 4) as uint8.
+    """
+    world_size = TILE_SIZE * 2**zoom
+    radius = marker_radius(zoom)
+
+    # Offset of each station from the tile centre, wrapped across the antimeridian
+    offset_x = points["x"] * 2**zoom - (tile_x + 0.5) * TILE_SIZE
+    offset_x = (offset_x + world_size / 2) % world_size - world_size / 2
+    centre_x = np.floor(offset_x + TILE_SIZE / 2).astype(np.int64)
+    centre_y = np.floor(points["y"] * 2**zoom - tile_y * TILE_SIZE).astype(np.int64)
+    near = (
+        (np.abs(offset_x) < TILE_SIZE / 2 + radius + 1)
+        & (centre_y >= -radius)
+        & (centre_y < TILE_SIZE + radius)
+    )
+
+    dy, dx = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    disk = dx**2 + dy**2 <= radius**2 + radius
+    pixel_x = (centre_x[near, None] + dx[disk]).ravel()
+    pixel_y = (centre_y[near, None] + dy[disk]).ravel()
+    colours = np.repeat(points["rgba"][near], disk.sum(), axis=0)
+    # Marker pixels past the antimeridian reappear on the other side of the world
+    pixel_x = (pixel_x + tile_x * TILE_SIZE) % world_size - tile_x * TILE_SIZE
+    inside = (pixel_x >= 0) & (pixel_x < TILE_SIZE) & (pixel_y >= 0) & (pixel_y < TILE_SIZE)
+
+    # Later stations are drawn on top: with repeated indices the last assignment wins
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    image[pixel_y[inside], pixel_x[inside]] = colours[inside]
+    return image
+
+
+def _tile_path(output_path: Path, zoom: int, tile_x: int, tile_y: int) -> Path:
+    return output_path / str(zoom) / str(tile_x) / f"{tile_y}.png"
+
+
+def _init_tile_worker(points: dict[str, np.ndarray]):
+    init_worker_logging()
+    _points.update(points)
+
+
+def _render_tiles(output_path: Path, tiles: list[tuple[int, int, int]]) -> int:
+    for zoom, tile_x, tile_y in tiles:
+        path = _tile_path(output_path, zoom, tile_x, tile_y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.png")
+        matplotlib.image.imsave(tmp_path, render_tile(zoom, tile_x, tile_y, _points))
+        os.replace(tmp_path, path)
+    return len(tiles)
+
+
+class TileManifest:
+    """
+    SQLite record of the content hash of every tile written.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tiles (
+                    z INTEGER NOT NULL,
+                    x INTEGER NOT NULL,
+                    y INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (z, x, y)
+                )
+                """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path / "tiles.sqlite", timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def read(self) -> pd.Series:
+        """
+        Return the hash of every tile in the manifest.
+
+        Returns:
+            Series of hashes indexed by (z, x, y).
+        """
+        with self._connect() as conn:
+            tiles = pd.read_sql_query("SELECT z, x, y, hash FROM tiles", conn)
+        return tiles.set_index(["z", "x", "y"])["hash"]
+
+    def update(self, hashes: pd.Series):
+        """
+        Record the hashes of tiles that have been written.
+
+        Args:
+            hashes: Series of hashes indexed by (z, x, y).
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                [(int(z), int(x), int(y), h) for (z, x, y), h in hashes.items()],
+            )
+
+    def remove(self, tiles: pd.Index):
+        """
+        Remove tiles from the manifest.
+
+        Args:
+            tiles: Index of (z, x, y).
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM tiles WHERE z = ? AND x = ? AND y = ?",
+                [(int(z), int(x), int(y)) for z, x, y in tiles],
+            )
+
+
+def export_tiles(
+    stations: pd.DataFrame,
+    output_path: Path,
+    min_zoom: int = 0,
+    max_zoom: int = 6,
+    max_workers: int | None = None,
+) -> dict[str, int]:
+    """
+    Write the station frac_var layer as XYZ PNG tiles, rendering only tiles that changed.
+
+    Tiles are written to <output_path>/<z>/<x>/<y>.png, each one as soon as it is rendered,
+    and recorded in a manifest in batches, so an interrupted export resumes where it stopped.
+    Tiles without stations are not written, and removed if they were before. An index.html
+    viewer is written next to the tiles.
+
+    Args:
+        stations: Station table indexed by id with columns: longitude, latitude, frac_var.
+        output_path: Directory of the tile pyramid.
+        min_zoom: Lowest zoom level.
+        max_zoom: Highest zoom level.
+        max_workers: Number of rendering processes.
+
+    Returns:
+        dict with the number of tiles rendered, removed and unchanged.
+    """
+    output_path = Path(output_path)
+    manifest = TileManifest(output_path)
+    hashes = tile_hashes(stations, min_zoom, max_zoom)
+    previous = manifest.read()
+
+    changed = hashes[hashes.ne(previous.reindex(hashes.index))]
+    removed = previous.index.difference(hashes.index)
+    for zoom, tile_x, tile_y in removed:
+        _tile_path(output_path, zoom, tile_x, tile_y).unlink(missing_ok=True)
+    manifest.remove(removed)
+
+    stations = (
+        stations.dropna(subset=["frac_var"]).sort_index().sort_values("frac_var", kind="stable")
+    )
+    x, y = project(stations["longitude"], stations["latitude"])
+    colour = matplotlib.colormaps[CMAP]((stations["frac_var"] - VMIN) / (VMAX - VMIN), bytes=True)
+    points = {"x": x, "y": y, "rgba": colour}
+
+    tiles = list(changed.index)
+    tasks = [tiles[i : i + TILES_PER_TASK] for i in range(0, len(tiles), TILES_PER_TASK)]
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_tile_worker, initargs=(points,)
+    ) as executor:
+        for task, _ in zip(tasks, executor.map(_render_tiles, [output_path] * len(tasks), tasks)):
+            manifest.update(changed.loc[task])
+
+    (output_path / "index.html").write_text(
+        VIEWER_HTML.format(min_zoom=min_zoom, max_zoom=max_zoom)
+    )
+    counts = {
+        "rendered": len(changed),
+        "removed": len(removed),
+        "unchanged": len(hashes) - len(changed),
+    }
+    logging.info(
+        "Tiles: %d rendered, %d removed, %d unchanged.",
+        counts["rendered"],
+        counts["removed"],
+        counts["unchanged"],
+    )
+    return counts
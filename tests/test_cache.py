@@ -0,0 +1,160 @@
+"""
+Tests for cache.py
+"""
+
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from migraine_weather.cache import HourlyCache
+
+HOURLY = pd.DataFrame(
+    {"pres": np.linspace(1000.0, 1020.0, 24 * 365 * 3)},
+    index=pd.date_range("2018-01-01", periods=24 * 365 * 3, freq="h", name="time"),
+)
+
+
+class FakeSource:
+    """
+    Stand-in for meteostat that records the ranges requested.
+    """
+
+    def __init__(self):
+        self.calls: list[tuple[str, datetime, datetime]] = []
+
+    def __call__(self, station_id: str, start: datetime, end: datetime) -> pd.DataFrame:
+        self.calls.append((station_id, start, end))
+        return HOURLY[(HOURLY.index >= start) & (HOURLY.index <= end)]
+
+
+def test_fetch_matches_source_and_hits_cache():
+    """
+    Test that a cached fetch returns the same data as the source and is not refetched.
+    """
+    start, end = datetime(2018, 3, 1), datetime(2019, 6, 30, 23)
+    with TemporaryDirectory() as tmpdir:
+        source = FakeSource()
+        cache = HourlyCache(Path(tmpdir))
+
+        first = cache.fetch("ST001", start, end, source)
+        calls = len(source.calls)
+        second = HourlyCache(Path(tmpdir)).fetch("ST001", start, end, source)
+
+    expected = source(*("ST001", start, end))
+    pd.testing.assert_frame_equal(first, expected, check_freq=False)
+    pd.testing.assert_frame_equal(second, expected, check_freq=False)
+    assert calls == 1  # both years in one coalesced range
+    assert len(source.calls) == calls + 1  # only the direct call above
+
+
+def test_fetch_only_missing_years():
+    """
+    Test that extending a cached range only fetches the uncached years, in one range.
+    """
+    with TemporaryDirectory() as tmpdir:
+        source = FakeSource()
+        cache = HourlyCache(Path(tmpdir))
+
+        cache.fetch("ST001", datetime(2018, 1, 1), datetime(2018, 12, 31, 23), source)
+        source.calls.clear()
+        result = cache.fetch("ST001", datetime(2018, 1, 1), datetime(2020, 12, 31, 23), source)
+
+    assert source.calls == [("ST001", datetime(2019, 1, 1), datetime(2020, 12, 31, 23))]
+    assert len(result) == len(HOURLY)
+
+
+def test_eviction_respects_byte_budget():
+    """
+    Test that the least recently used chunks are evicted once the byte budget is exceeded.
+    """
+    with TemporaryDirectory() as tmpdir:
+        source = FakeSource()
+        cache = HourlyCache(Path(tmpdir))
+        cache.fetch("ST001", datetime(2018, 1, 1), datetime(2018, 12, 31, 23), source)
+        chunk_bytes = cache.size()
+
+        cache = HourlyCache(Path(tmpdir), max_bytes=int(chunk_bytes * 1.5))
+        cache.fetch("ST002", datetime(2018, 1, 1), datetime(2018, 12, 31, 23), source)
+
+        assert cache.size() <= chunk_bytes * 1.5
+        assert not (Path(tmpdir) / "ST001" / "2018.parquet").exists()
+        assert (Path(tmpdir) / "ST002" / "2018.parquet").exists()
+
+
+def test_fetch_many_groups_stations_missing_the_same_range():
+    """
+    Test that stations missing the same days are fetched in one request, and rows already
+    cached are not duplicated when a request starts earlier than a station's cached data.
+    """
+    requests = []
+
+    def source_many(
+        station_ids: list[str], start: datetime, end: datetime
+    ) -> dict[str, pd.DataFrame]:
+        requests.append((list(station_ids), start, end))
+        return {station_id: HOURLY.loc[start:end] for station_id in station_ids}
+
+    end = datetime(2019, 6, 30, 23)
+    with TemporaryDirectory() as tmpdir:
+        cache = HourlyCache(Path(tmpdir))
+        cache.fetch("ST001", datetime(2019, 1, 1), datetime(2019, 3, 1, 12), FakeSource())
+        cache.fetch("ST002", datetime(2019, 1, 1), datetime(2019, 3, 1, 18), FakeSource())
+        result = cache.fetch_many(
+            ["ST001", "ST002", "ST003"], datetime(2019, 1, 1), end, source_many
+        )
+
+    assert requests == [
+        (["ST001", "ST002"], datetime(2019, 3, 1), end),
+        (["ST003"], datetime(2019, 1, 1), end),
+    ]
+    for hourly in result.values():
+        pd.testing.assert_frame_equal(hourly, HOURLY.loc["2019-01-01":end], check_freq=False)
+
+
+def test_missing_chunk_is_refetched():
+    """
+    Test that an indexed chunk whose file was deleted, e.g. evicted by another process, is
+    fetched again instead of dropping out of the result.
+    """
+    start, end = datetime(2018, 1, 1), datetime(2019, 12, 31, 23)
+    with TemporaryDirectory() as tmpdir:
+        source = FakeSource()
+        cache = HourlyCache(Path(tmpdir))
+        cache.fetch("ST001", start, end, source)
+        (Path(tmpdir) / "ST001" / "2018.parquet").unlink()
+        source.calls.clear()
+
+        result = cache.fetch("ST001", start, end, source)
+
+    assert source.calls == [("ST001", datetime(2018, 1, 1), datetime(2018, 12, 31, 23))]
+    pd.testing.assert_frame_equal(result, HOURLY.loc[start:end], check_freq=False)
+
+
+def test_eviction_skips_stations_being_fetched():
+    """
+    Test that eviction running during a fetch leaves the chunks of the fetched stations alone.
+    """
+    start, end = datetime(2018, 1, 1), datetime(2019, 6, 30, 23)
+    with TemporaryDirectory() as tmpdir:
+        chunk_path = Path(tmpdir) / "ST001" / "2018.parquet"
+        cache = HourlyCache(Path(tmpdir))
+        cache.fetch("ST001", start, datetime(2018, 12, 31, 23), FakeSource())
+        cache.max_bytes = 0
+        kept = []
+
+        def evicting_source(
+            station_ids: list[str], range_start: datetime, range_end: datetime
+        ) -> dict[str, pd.DataFrame]:
+            cache._evict()
+            kept.append(chunk_path.exists())
+            return {station_id: HOURLY.loc[range_start:range_end] for station_id in station_ids}
+
+        result = cache.fetch_many(["ST001", "ST002"], start, end, evicting_source)
+        evicted = not chunk_path.exists()
+
+    assert kept == [True, True]
+    assert evicted  # once the fetch finished
+    pd.testing.assert_frame_equal(result["ST001"], HOURLY.loc[start:end], check_freq=False)
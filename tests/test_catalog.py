@@ -0,0 +1,103 @@
+"""
+Tests for catalog.py
+"""
+
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import meteostat
+import pandas as pd
+
+from migraine_weather import data_acquisition
+from migraine_weather.catalog import StationCatalog
+
+STATIONS = [
+    ("ST001", "AU", "ACT", -35.3, 149.2, 580.0, "Australia/Sydney"),
+    ("ST002", "AU", "NT", -12.4, 130.9, 30.0, "Australia/Darwin"),
+    ("ST003", "FR", "IDF", 48.9, 2.3, 35.0, "Europe/Paris"),
+    ("ST004", "FR", "IDF", 48.7, 2.4, 89.0, "Europe/Paris"),
+]
+INVENTORY = [
+    ("ST001", "hourly", "pres", "2000-01-01", "2025-06-30", 0.9),
+    ("ST002", "hourly", "pres", "2000-01-01", "2005-12-31", 0.8),
+    ("ST002", "synop", "pres", "2015-01-01", "2025-06-30", 0.7),
+    ("ST003", "hourly", "temp", "2000-01-01", "2025-06-30", 1.0),
+    ("ST003", "synop", "pres", "2014-06-01", "2016-01-01", None),
+    ("ST004", "hourly", "pres", "2012-03-01", "2012-03-31", 0.5),
+]
+
+
+def _write_db(path: Path, inventory: list[tuple]):
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE stations (id TEXT, country TEXT, region TEXT, latitude REAL, "
+            "longitude REAL, elevation REAL, timezone TEXT)"
+        )
+        conn.execute("CREATE TABLE names (station TEXT, language TEXT, name TEXT)")
+        conn.execute(
+            "CREATE TABLE inventory (station TEXT, provider TEXT, parameter TEXT, start TEXT, "
+            "end TEXT, completeness REAL)"
+        )
+        conn.executemany("INSERT INTO stations VALUES (?, ?, ?, ?, ?, ?, ?)", STATIONS)
+        conn.executemany(
+            "INSERT INTO names VALUES (?, 'en', ?)", [(s[0], f"Name {s[0]}") for s in STATIONS]
+        )
+        conn.executemany("INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?)", inventory)
+
+
+def test_eligible_stations_match_query():
+    """
+    Test that the snapshot gives the same eligible stations as the database query.
+    """
+    windows = [
+        (datetime(2010, 1, 1), datetime(2020, 1, 1)),
+        (datetime(2006, 1, 1), datetime(2014, 12, 31, 23)),
+        (datetime(2012, 3, 31), datetime(2030, 1, 1)),
+    ]
+    with TemporaryDirectory() as tmpdir:
+        db_file = Path(tmpdir) / "stations.db"
+        _write_db(db_file, INVENTORY)
+        with patch.object(meteostat.config, "stations_db_file", str(db_file)):
+            catalog = StationCatalog(Path(tmpdir) / "catalog")
+            for start, end in windows:
+                expected = data_acquisition.get_eligible_stations(start, end)
+                result = data_acquisition.get_eligible_stations(start, end, catalog)
+
+                expected = expected.assign(
+                    inventory_start=pd.to_datetime(expected["inventory_start"]),
+                    inventory_end=pd.to_datetime(expected["inventory_end"]),
+                )
+                pd.testing.assert_frame_equal(
+                    result.sort_index(), expected.sort_index(), check_dtype=False
+                )
+
+
+def test_refresh_only_when_upstream_changes():
+    """
+    Test that the snapshot is rebuilt only when the stations database content changes.
+    """
+    with TemporaryDirectory() as tmpdir:
+        db_file = Path(tmpdir) / "stations.db"
+        _write_db(db_file, INVENTORY)
+        with patch.object(meteostat.config, "stations_db_file", str(db_file)):
+            catalog = StationCatalog(Path(tmpdir) / "catalog")
+
+            assert catalog.refresh()
+            first_version = catalog.version()
+            assert not catalog.refresh()
+
+            db_file.touch()  # same content, new mtime
+            assert not catalog.refresh()
+
+            with closing(sqlite3.connect(db_file)) as conn, conn:
+                conn.execute("UPDATE inventory SET end = '2011-01-01' WHERE station = 'ST001'")
+            assert catalog.refresh()
+            eligible = catalog.eligible_stations(datetime(2015, 1, 1), datetime(2020, 1, 1))
+
+            assert catalog.version() != first_version
+            assert not (Path(tmpdir) / "catalog" / first_version).exists()
+            assert list(eligible.index) == ["ST002", "ST003"]
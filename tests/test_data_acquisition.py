@@ -2,8 +2,7 @@
 Tests for data_acquisition.py
 """
 
-from unittest.mock import Mock, patch
-from datetime import datetime
+import numpy as np
 import pandas as pd
 
 from migraine_weather import processing, data_acquisition
@@ -34,30 +33,22 @@ def test_get_variation_frac(test_data):
     assert isinstance(frac_var_test, float)
 
 
-def test_process_station_low_completeness():
+def test_process_hourly_low_completeness():
     """
-    Test that _process_station returns None for stations with <50% completeness.
+    Test that process_hourly returns None for stations with <50% completeness.
     """
     dates = pd.date_range("2020-01-01", periods=100, freq="h")
     pressures = [1013.0] * 40 + [None] * 60
     mock_df = pd.DataFrame({"pres": pressures}, index=dates)
 
-    start = datetime(2020, 1, 1)
-    end = datetime(2020, 1, 5)
-
-    with patch("migraine_weather.data_acquisition.meteostat.hourly") as mock_hourly_fn:
-        mock_ts = Mock()
-        mock_ts.fetch.return_value = mock_df
-        mock_hourly_fn.return_value = mock_ts
-
-        result = data_acquisition._process_station(("TEST01", Mock()), "TS", start, end)
+    result = data_acquisition.process_hourly("TEST01", mock_df, "TS")
 
     assert result is None
 
 
-def test_process_station_underreported_days():
+def test_process_hourly_underreported_days():
     """
-    Test that _process_station returns None for stations with >50% underreported days.
+    Test that process_hourly returns None for stations with >50% underreported days.
     """
     dates = []
     pressures = []
@@ -74,74 +65,27 @@ def test_process_station_underreported_days():
 
     mock_df = pd.DataFrame({"pres": pressures}, index=dates)
 
-    start = datetime(2020, 1, 1)
-    end = datetime(2020, 1, 10)
-
-    with patch("migraine_weather.data_acquisition.meteostat.hourly") as mock_hourly_fn:
-        mock_ts = Mock()
-        mock_ts.fetch.return_value = mock_df
-        mock_hourly_fn.return_value = mock_ts
-
-        result = data_acquisition._process_station(("TEST02", Mock()), "TS", start, end)
+    result = data_acquisition.process_hourly("TEST02", mock_df, "TS")
 
     assert result is None
 
 
-def test_make_dataset_filters_invalid_stations():
+def test_process_batch_matches_process_hourly():
     """
-    Test that make_dataset excludes stations where _process_station returns None.
+    Test that process_batch keeps the same stations and daily ranges as process_hourly.
     """
-    station_data = pd.DataFrame(
-        {"name": ["Station1", "Station2"], "latitude": [0.0, 1.0], "longitude": [0.0, 1.0]},
-        index=["ST001", "ST002"],
+    dates = pd.date_range("2020-01-01", periods=24 * 60, freq="h", name="time")
+    hourly = pd.DataFrame({"pres": 1013.0 + np.sin(np.arange(len(dates)) / 10)}, index=dates)
+    sparse = hourly.iloc[::6]
+    items = [("GOOD", hourly), ("SPARSE", sparse), ("MISSING", None)]
+
+    result = dict(data_acquisition.process_batch(items))
+
+    assert set(result) == {"GOOD"}
+    assert data_acquisition.process_hourly("SPARSE", sparse, "TS") is None
+    pd.testing.assert_frame_equal(
+        result["GOOD"],
+        data_acquisition.process_hourly("GOOD", hourly, "TS"),
+        check_dtype=False,
+        check_freq=False,
     )
-
-    daily_df = pd.DataFrame(
-        {
-            "date": pd.date_range("2020-01-01", periods=5),
-            "pres_min": [1010.0] * 5,
-            "pres_max": [1015.0] * 5,
-        }
-    )
-
-    def mock_process(args, country_code, start, end):
-        station_id, _ = args
-        return ("ST001", daily_df) if station_id == "ST001" else None
-
-    with patch("migraine_weather.data_acquisition._process_station", side_effect=mock_process):
-        result = data_acquisition.make_dataset(
-            "TS", station_data, datetime(2020, 1, 1), datetime(2020, 1, 5)
-        )
-
-    assert "ST002" not in result
-    assert "ST001" in result
-
-
-def test_make_dataset_success():
-    """
-    Test that make_dataset returns a dict of station_id -> daily DataFrame.
-    """
-    station_data = pd.DataFrame(
-        {"name": ["Station1"], "latitude": [0.0], "longitude": [0.0]}, index=["ST001"]
-    )
-
-    daily_df = pd.DataFrame(
-        {
-            "date": pd.date_range("2020-01-01", periods=365),
-            "pres_min": [1010.0] * 365,
-            "pres_max": [1015.0] * 365,
-        }
-    )
-
-    with patch(
-        "migraine_weather.data_acquisition._process_station", return_value=("ST001", daily_df)
-    ):
-        result = data_acquisition.make_dataset(
-            "TS", station_data, datetime(2020, 1, 1), datetime(2020, 12, 31)
-        )
-
-    assert "ST001" in result
-    assert isinstance(result["ST001"], pd.DataFrame)
-    assert "pres_min" in result["ST001"].columns
-    assert "pres_max" in result["ST001"].columns
-    assert "date" in result["ST001"].columns
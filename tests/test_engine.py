@@ -0,0 +1,386 @@
+"""
+Tests for engine.py
+"""
+
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from migraine_weather import engine, processing
+from migraine_weather.cache import HourlyCache
+from migraine_weather.metrics import METRICS
+from migraine_weather.storage import DailyStore, read_daily
+
+
+class LocalSource:
+    """
+    Local stand-in for meteostat serving synthetic hourly data and tracking concurrency.
+    """
+
+    def __init__(self, station_ids: list[str]):
+        rng = np.random.default_rng(0)
+        times = pd.date_range("2020-01-01", "2020-03-31 23:00", freq="h", name="time")
+        self.data = {
+            station_id: pd.DataFrame(
+                {"pres": np.round(1013 + np.cumsum(rng.normal(0, 0.8, len(times))), 1)},
+                index=times,
+            )
+            for station_id in station_ids
+        }
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, station_id: str, start: datetime, end: datetime) -> pd.DataFrame | None:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        hourly = self.data.get(station_id)
+        if hourly is None:
+            return None
+        return hourly[(hourly.index >= start) & (hourly.index <= end)]
+
+
+def test_run_batches_against_local_source():
+    """
+    Test that the engine stores each station's daily data and respects the concurrency limit.
+    """
+    station_ids = [f"ST{i:03d}" for i in range(20)]
+    stations = pd.DataFrame({"country": "TS"}, index=[*station_ids, "EMPTY"])
+    source = LocalSource(station_ids)
+    start, end = datetime(2020, 1, 1), datetime(2020, 3, 31, 23)
+
+    METRICS.reset()
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        jobs = engine.plan_jobs(stations, store, start, end)
+        batches = engine.balance_batches(jobs, target_rows=24 * 90 * 3)
+        written = engine.run_batches(batches, source, store, concurrency=3, cpu_workers=2)
+
+        assert written == 20
+        assert source.max_in_flight <= 3
+        assert METRICS.counters[("rows_fetched", ())] == 20 * len(source.data["ST000"])
+        assert METRICS.counters[("stations_rejected", (("reason", "no data"),))] == 1
+        # Timers recorded in the processing workers are merged into the main registry
+        assert METRICS.timers[("stage_seconds", (("stage", "daily_reduction"),))][0] > 0
+        assert METRICS.gauges[("fetches_in_flight", ())][1] <= 3
+        for station_id in station_ids:
+            expected = processing.get_daily_pressure_range(source.data[station_id])
+            pd.testing.assert_frame_equal(store.read(station_id), expected, check_freq=False)
+
+
+def test_plan_jobs_incremental():
+    """
+    Test that stored stations continue from their state's last day, stations stored without
+    a state are fetched in full, and up-to-date stations are skipped.
+    """
+    stations = pd.DataFrame({"country": "TS"}, index=["NEW", "OLD", "DONE", "KEPT"])
+    start, end = datetime(2020, 1, 1), datetime(2020, 3, 1)
+    daily = pd.DataFrame({"date": [pd.Timestamp("2020-02-01")], "pres_min": 1.0, "pres_max": 2.0})
+    hourly = LocalSource(["KEPT"]).data["KEPT"].loc[:"2020-02-10 13:00"]
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("OLD", daily)
+        store.append("DONE", daily.assign(date=pd.Timestamp("2020-03-01")))
+        stats, state = processing.advance_station_state(hourly)
+        store.update("KEPT", processing.daily_from_day_stats(stats, state.bounds), stats, state)
+
+        jobs = {job.station_id: job for job in engine.plan_jobs(stations, store, start, end)}
+
+    assert set(jobs) == {"NEW", "OLD", "KEPT"}
+    assert jobs["NEW"].start == start
+    assert jobs["OLD"].start == start
+    assert jobs["KEPT"].start == datetime(2020, 2, 10)
+    assert jobs["KEPT"].state.bounds == state.bounds
+
+
+def test_incremental_runs_match_full_rebuild():
+    """
+    Test that runs continuing from a partial last day store the same rows as a single run,
+    including earlier days whose outlier status changes as the bounds widen.
+    """
+    station_ids = [f"ST{i:03d}" for i in range(6)]
+    stations = pd.DataFrame({"country": "TS"}, index=station_ids)
+    source = LocalSource(station_ids)
+    rng = np.random.default_rng(1)
+    for hourly in source.data.values():
+        # Calm first month with moderate spikes, then a volatile period that widens the bounds
+        changes = rng.normal(0, 0.3, len(hourly))
+        changes[24 * 31 :] *= 4
+        pres = np.round(1013 + np.cumsum(changes), 1)
+        spikes = rng.integers(0, 24 * 31, size=8)
+        pres[spikes] += 3.0
+        pres[rng.random(len(pres)) < 0.03] = np.nan
+        hourly["pres"] = pd.array(pres, dtype="Float64")
+    start = datetime(2020, 1, 1)
+    ends = [datetime(2020, 1, 20, 13), datetime(2020, 2, 10, 7), datetime(2020, 3, 31, 23)]
+
+    with TemporaryDirectory() as tmpdir:
+        incremental = DailyStore(Path(tmpdir) / "incremental")
+        for end in ends:
+            jobs = engine.plan_jobs(stations, incremental, start, end)
+            engine.run_batches([jobs], source, incremental)
+            if end == ends[0]:
+                first_removed = {
+                    station_id: incremental.read(station_id)["pres_min"].isna().sum()
+                    for station_id in station_ids
+                }
+        full = DailyStore(Path(tmpdir) / "full")
+        engine.run_batches([engine.plan_jobs(stations, full, start, ends[-1])], source, full)
+
+        for station_id in station_ids:
+            pd.testing.assert_frame_equal(incremental.read(station_id), full.read(station_id))
+            dtypes = full.read(station_id).dtypes
+            for part in incremental._parts(station_id):
+                pd.testing.assert_series_equal(read_daily(part).dtypes, dtypes)
+        pd.testing.assert_frame_equal(incremental.summary(), full.summary())
+        removed = {
+            station_id: full.read(station_id)["pres_min"].isna().sum()
+            for station_id in station_ids
+        }
+    assert all(first_removed[station_id] > removed[station_id] for station_id in station_ids)
+
+
+def test_plan_jobs_skips_fetched_stations():
+    """
+    Test that a repeated run plans no jobs until the window or the inventory moves past the
+    end of the last fetch.
+    """
+    stations = pd.DataFrame(
+        {"country": "TS", "inventory_start": "2020-01-01", "inventory_end": "2020-03-31"},
+        index=["ST000", "ST001"],
+    )
+    source = LocalSource(list(stations.index))
+    start, end = datetime(2020, 1, 1), datetime(2020, 3, 15, 23)
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        engine.run_batches([engine.plan_jobs(stations, store, start, end)], source, store)
+
+        repeated = engine.plan_jobs(stations, store, start, end)
+        later = engine.plan_jobs(stations, store, start, datetime(2020, 3, 20))
+        ended = engine.plan_jobs(
+            stations.assign(inventory_end="2020-03-10"), store, start, datetime(2020, 3, 20)
+        )
+
+    assert repeated == []
+    assert {job.station_id for job in later} == {"ST000", "ST001"}
+    assert ended == []
+
+
+def test_plan_jobs_expected_rows_from_inventory():
+    """
+    Test that expected rows only count hours covered by the station's inventory.
+    """
+    stations = pd.DataFrame(
+        {
+            "country": ["TS", "TS"],
+            "inventory_start": ["2019-01-01", "2020-02-01"],
+            "inventory_end": ["2025-01-01", "2020-02-10"],
+        },
+        index=["FULL", "PART"],
+    )
+    with TemporaryDirectory() as tmpdir:
+        jobs = engine.plan_jobs(
+            stations, DailyStore(Path(tmpdir)), datetime(2020, 1, 1), datetime(2020, 3, 1)
+        )
+
+    rows = {job.station_id: job.expected_rows for job in jobs}
+    assert rows == {"FULL": 60 * 24, "PART": 10 * 24}
+
+
+def test_balance_batches():
+    """
+    Test that large jobs run alone, small jobs are packed, and batches come largest first.
+    """
+    start, end = datetime(2020, 1, 1), datetime(2020, 2, 1)
+    rows = [1000, 50, 400, 300, 20, 10, 250]
+    jobs = [engine.StationJob(f"ST{i}", "TS", start, end, n) for i, n in enumerate(rows)]
+
+    batches = engine.balance_batches(jobs, target_rows=500)
+
+    costs = [sum(job.expected_rows for job in batch) for batch in batches]
+    assert [job.station_id for job in batches[0]] == ["ST0"]
+    assert all(cost <= 500 for cost in costs[1:])
+    assert sorted(job.station_id for batch in batches for job in batch) == sorted(
+        job.station_id for job in jobs
+    )
+    assert costs[0] == max(costs)
+
+
+def test_prescreen():
+    """
+    Test that new stations are skipped by the ledger or low inventory completeness.
+    """
+    stations = pd.DataFrame(
+        {
+            "country": "TS",
+            "inventory_end": pd.to_datetime(["2025-06-30"] * 4 + ["2027-01-01"]),
+            "inventory_completeness": [0.9, 0.05, 0.05, 0.9, 0.9],
+        },
+        index=["GOOD", "SPARSE", "STORED", "LEDGER", "GROWN"],
+    )
+    daily = pd.DataFrame({"date": [pd.Timestamp("2020-02-01")], "pres_min": 1.0, "pres_max": 2.0})
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("STORED", daily)
+        store.reject("LEDGER", "quality", datetime(2025, 6, 30))
+        store.reject("GROWN", "quality", datetime(2025, 6, 30))
+
+        kept = engine.prescreen(stations, store)
+        rejections = store.rejections()
+
+    assert list(kept.index) == ["GOOD", "STORED", "GROWN"]
+    assert rejections.loc["SPARSE", "reason"] == "inventory"
+
+
+def test_run_batches_records_rejections():
+    """
+    Test that new stations failing quality checks are added to the rejection ledger.
+    """
+    stations = pd.DataFrame({"country": "TS"}, index=["ST000", "SPARSE", "EMPTY"])
+    source = LocalSource(["ST000", "SPARSE"])
+    source.data["SPARSE"] = source.data["SPARSE"].iloc[::8]
+    start, end = datetime(2020, 1, 1), datetime(2020, 3, 31, 23)
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        jobs = engine.plan_jobs(stations, store, start, end)
+        engine.run_batches([jobs], source, store, concurrency=2)
+        rejections = store.rejections()
+
+    assert rejections["reason"].to_dict() == {"SPARSE": "quality", "EMPTY": "no data"}
+
+
+def test_resume_skips_journaled_stations():
+    """
+    Test that a resumed run only fetches the stations the interrupted run did not finish.
+    """
+    station_ids = [f"ST{i:03d}" for i in range(6)]
+    stations = pd.DataFrame({"country": "TS"}, index=[*station_ids, "EMPTY"])
+    source = LocalSource(station_ids)
+    start, end = datetime(2020, 1, 1), datetime(2020, 3, 31, 23)
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        run_id = store.start_run(start, end)
+        jobs = engine.plan_jobs(stations, store, start, end)
+        engine.run_batches([jobs[:3], jobs[-1:]], source, store, run_id=run_id)  # interrupted
+
+        assert store.interrupted_run() == (run_id, start, end)
+        remaining = engine.skip_finished(engine.prescreen(stations, store), store, run_id)
+        engine.run_batches([engine.plan_jobs(remaining, store, start, end)], source, store)
+
+        assert list(remaining.index) == station_ids[3:]
+        assert sorted(store.station_ids()) == station_ids
+
+
+class BatchedSource(LocalSource):
+    """
+    Local source that also fetches several stations in one call, recording each request.
+    """
+
+    def __init__(self, station_ids: list[str]):
+        super().__init__(station_ids)
+        self.requests: list[tuple[list[str], datetime]] = []
+
+    def fetch_many(
+        self, station_ids: list[str], start: datetime, end: datetime
+    ) -> dict[str, pd.DataFrame | None]:
+        self.requests.append((station_ids, start))
+        return {station_id: self.fetch(station_id, start, end) for station_id in station_ids}
+
+
+def test_group_fetches():
+    """
+    Test that jobs starting on the same day share requests, split over the fetch slots.
+    """
+    end = datetime(2020, 3, 1)
+    jobs = [
+        engine.StationJob(f"ST{i:03d}", "TS", datetime(2020, 2, 10, i % 3), end) for i in range(7)
+    ]
+    jobs.append(engine.StationJob("NEW", "TS", datetime(2020, 1, 1), end))
+
+    requests = engine.group_fetches(jobs, concurrency=3)
+
+    assert [len(request.jobs) for request in requests] == [3, 3, 1, 1]
+    assert [request.start for request in requests] == [datetime(2020, 2, 10)] * 3 + [
+        datetime(2020, 1, 1)
+    ]
+    assert sorted(job.station_id for r in requests for job in r.jobs) == sorted(
+        job.station_id for job in jobs
+    )
+
+
+def test_incremental_run_with_batched_fetches():
+    """
+    Test that stations continuing from the same day are fetched in shared requests and stored
+    as with one fetch per station.
+    """
+    station_ids = [f"ST{i:03d}" for i in range(12)]
+    stations = pd.DataFrame({"country": "TS"}, index=station_ids)
+    source = BatchedSource(station_ids)
+    start = datetime(2020, 1, 1)
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        for end in (datetime(2020, 2, 10, 13), datetime(2020, 3, 31, 23)):
+            source.requests.clear()
+            jobs = engine.plan_jobs(stations, store, start, end)
+            engine.run_batches([jobs], source, store, concurrency=2)
+
+        assert [request[1] for request in source.requests] == [datetime(2020, 2, 10)] * 2
+        for station_id in station_ids:
+            expected = processing.get_daily_pressure_range(source.data[station_id])
+            pd.testing.assert_frame_equal(store.read(station_id), expected, check_freq=False)
+
+
+def test_grouped_fetches_share_a_cache_at_capacity():
+    """
+    Test that concurrent requests for the same range through a full hourly cache, which
+    evicts after every fetch, still store every station as with one fetch per station. The
+    request with the first station is slower, so the other evicts while it is in flight.
+    """
+    station_ids = [f"ST{i:03d}" for i in range(8)]
+    stations = pd.DataFrame({"country": "TS"}, index=station_ids)
+    source = BatchedSource(station_ids)
+    start = datetime(2020, 1, 1)
+
+    with TemporaryDirectory() as tmpdir:
+        cache = HourlyCache(Path(tmpdir) / "cache")
+
+        def slow_first(
+            station_ids: list[str], start: datetime, end: datetime
+        ) -> dict[str, pd.DataFrame | None]:
+            if station_ids[0] == "ST000":
+                time.sleep(0.2)
+            return source.fetch_many(station_ids, start, end)
+
+        class CachedSource:
+            def fetch_many(
+                self, station_ids: list[str], start: datetime, end: datetime
+            ) -> dict[str, pd.DataFrame | None]:
+                return cache.fetch_many(station_ids, start, end, slow_first)
+
+        store = DailyStore(Path(tmpdir) / "daily")
+        for end in (datetime(2020, 2, 10, 13), datetime(2020, 3, 31, 23)):
+            source.requests.clear()
+            jobs = engine.plan_jobs(stations, store, start, end)
+            engine.run_batches([jobs], CachedSource(), store, concurrency=2)
+            cache.max_bytes = 1
+
+        assert [request[1] for request in source.requests] == [datetime(2020, 2, 10)] * 2
+        assert cache.size() == 0
+        for station_id in station_ids:
+            expected = processing.get_daily_pressure_range(source.data[station_id])
+            pd.testing.assert_frame_equal(store.read(station_id), expected, check_freq=False)
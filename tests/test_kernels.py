@@ -0,0 +1,66 @@
+"""
+Tests for kernels.py
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from migraine_weather import kernels, processing
+
+
+def _hourly(seed: int, dtype: str) -> pd.DataFrame:
+    """
+    Build an hourly series with gaps, missing values and outlier spikes, including spikes on
+    the first and last days.
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2019-12-30 05:00", periods=int(rng.integers(24, 3000)), freq="h")
+    times = times[rng.random(len(times)) > 0.2]
+    pres = np.round(1013 + np.cumsum(rng.normal(0, 0.8, len(times))), 1)
+    spikes = rng.integers(0, len(times), size=int(rng.integers(0, 30)))
+    pres[spikes] += rng.choice([-40.0, 40.0], size=len(spikes))
+    pres[[1, 3, -2]] += 40.0
+    pres[rng.random(len(times)) < 0.05] = np.nan
+    return pd.DataFrame(
+        {"pres": pd.array(pres, dtype=dtype)}, index=pd.DatetimeIndex(times, name="time")
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64"])
+@pytest.mark.parametrize("day_min_max", [kernels._day_min_max_numpy, kernels._day_min_max_loops])
+def test_kernel_matches_pandas(dtype: str, day_min_max):
+    """
+    Test that both kernel backends give the same daily ranges as the pandas implementation.
+    """
+    with patch.object(kernels, "_day_min_max", day_min_max):
+        for seed in range(40):
+            hourly = _hourly(seed, dtype)
+            expected = processing.get_daily_pressure_range(hourly, use_kernel=False)
+
+            result = kernels.daily_pressure_range(hourly)
+
+            if expected.empty:
+                assert result is None
+            else:
+                pd.testing.assert_frame_equal(result, expected)
+
+
+def test_unsupported_frames_fall_back_to_pandas():
+    """
+    Test that frames the kernel does not support are reduced by the pandas implementation.
+    """
+    hourly = _hourly(0, "float64")
+    shuffled = hourly.sample(frac=1, random_state=0)
+    assert not kernels.supports(shuffled)
+    assert not kernels.supports(hourly.tz_localize("UTC"))
+
+    with patch.object(kernels, "daily_pressure_range") as kernel:
+        result = processing.get_daily_pressure_range(shuffled)
+
+    kernel.assert_not_called()
+    pd.testing.assert_frame_equal(
+        result, processing.get_daily_pressure_range(shuffled, use_kernel=False)
+    )
@@ -0,0 +1,88 @@
+"""
+Tests for visualisation/make_maps.py
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import shapely.geometry as sgeom
+
+from migraine_weather.spatial import StationIndex
+from migraine_weather.visualisation import make_maps
+
+# Local stand-in for the Natural Earth features, which are downloaded on first use
+FEATURES = [
+    (
+        cfeature.ShapelyFeature([sgeom.box(-100, -50, 100, 50)], ccrs.PlateCarree()),
+        {"color": "0.9"},
+    )
+]
+
+
+def _stations(n: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "longitude": rng.uniform(-180, 180, n),
+            "latitude": rng.uniform(-60, 80, n),
+            "frac_var": rng.uniform(0, 0.4, n),
+        },
+        index=pd.Index([f"ST{i:03d}" for i in range(n)], name="id"),
+    )
+
+
+def test_render_region_caches_base_map():
+    """
+    Test that a region is rendered, its base map raster is reused and the figure is freed.
+    """
+    with TemporaryDirectory() as tmpdir:
+        output_path = Path(tmpdir)
+        base_map_path = output_path / ".base_map"
+        index = StationIndex(_stations())
+
+        make_maps.render_region("Europe", index, output_path, base_map_path, FEATURES)
+        raster = next(base_map_path.glob("*.png"))
+        mtime = raster.stat().st_mtime_ns
+        make_maps.render_region("Europe", index, output_path, base_map_path, FEATURES)
+
+        assert (output_path / "Europe.png").exists()
+        assert list(base_map_path.glob("*.png")) == [raster]
+        assert raster.stat().st_mtime_ns == mtime
+        assert not plt.get_fignums()
+
+
+def test_plots_reports_timings():
+    """
+    Test that all requested regions are rendered by the worker pool with their timings.
+    """
+    with TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir)
+        _stations().to_csv(input_path / "all.csv")
+        output_path = input_path / "figures"
+
+        timings = make_maps.plots(
+            input_path, output_path, max_workers=2, regions=["World", "Oceania"], features=FEATURES
+        )
+
+        assert set(timings) == {"World", "Oceania"}
+        assert all(seconds > 0 for seconds in timings.values())
+        assert (output_path / "World.png").exists()
+        assert (output_path / "Oceania.png").exists()
+
+
+def test_render_region_grid_mode():
+    """
+    Test that the gridded mode renders a region across the dateline as one image layer.
+    """
+    with TemporaryDirectory() as tmpdir:
+        seconds = make_maps.render_region(
+            "Oceania", StationIndex(_stations()), Path(tmpdir), features=[], mode="grid"
+        )
+
+        assert seconds > 0
+        assert (Path(tmpdir) / "Oceania.png").exists()
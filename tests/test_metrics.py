@@ -0,0 +1,79 @@
+"""
+Tests for metrics.py
+"""
+
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from migraine_weather.metrics import Metrics, Progress
+
+
+def test_merge_worker_snapshots():
+    """
+    Test that snapshots from worker registries add up in the main registry.
+    """
+    main, worker = Metrics(), Metrics()
+    main.count("rows_fetched", 10)
+    main.observe("stage_seconds", 2.0, stage="fetch")
+    worker.count("rows_fetched", 5)
+    worker.count("stations_rejected", reason="quality")
+    worker.observe("stage_seconds", 1.0, stage="fetch")
+    worker.observe("stage_seconds", 3.0, stage="fetch")
+    worker.gauge("batch_queue_depth", 4)
+    worker.gauge("batch_queue_depth", 1)
+
+    main.merge(worker.snapshot())
+    report = main.to_dict()
+
+    assert {"name": "rows_fetched", "labels": {}, "value": 15} in report["counters"]
+    assert {
+        "name": "stations_rejected",
+        "labels": {"reason": "quality"},
+        "value": 1,
+    } in report["counters"]
+    assert report["timers"] == [
+        {
+            "name": "stage_seconds",
+            "labels": {"stage": "fetch"},
+            "count": 3,
+            "total_seconds": 6.0,
+            "max_seconds": 3.0,
+        }
+    ]
+    assert report["gauges"] == [{"name": "batch_queue_depth", "labels": {}, "value": 1, "max": 4}]
+
+
+def test_prometheus_text_and_write():
+    """
+    Test the Prometheus text format and the files written for a report.
+    """
+    metrics = Metrics()
+    metrics.count("stations_rejected", 2, reason="no data")
+    with metrics.timer("stage_seconds", stage="store"):
+        pass
+
+    text = metrics.to_prometheus()
+
+    assert "# TYPE migraine_weather_stations_rejected_total counter" in text
+    assert 'migraine_weather_stations_rejected_total{reason="no data"} 2' in text
+    assert "# TYPE migraine_weather_stage_seconds summary" in text
+    assert 'migraine_weather_stage_seconds_count{stage="store"} 1' in text
+    with TemporaryDirectory() as tmpdir:
+        metrics.write(Path(tmpdir))
+        report = json.loads((Path(tmpdir) / "metrics.json").read_text())
+        assert (Path(tmpdir) / "metrics.prom").read_text() == text
+    assert report["counters"][0]["value"] == 2
+
+
+def test_progress_line():
+    """
+    Test the rate and estimated time remaining in the progress line.
+    """
+    progress = Progress(100)
+    assert progress.line().endswith("(0.0 stations/s, ETA unknown).")
+
+    progress.done = 25
+    progress.start -= 50
+
+    assert progress.line() == "Processed 25/100 stations (0.5 stations/s, ETA 0:02:30)."
@@ -2,7 +2,11 @@
 Tests for processing.py
 """
 
+from unittest.mock import patch
+
+import numpy as np
 import pandas as pd
+import pytest
 
 from migraine_weather import processing
 
@@ -91,3 +95,156 @@ def test_compute_frac_var_calculation():
 
     # Expected: (10/365 + 20/365) / 2 ≈ 0.041
     assert 0.035 < frac_var < 0.045
+
+
+def _synthetic_stations(n_stations: int, dtype: str) -> dict[str, pd.DataFrame]:
+    """
+    Build hourly pressure series with gaps, missing values and outlier spikes.
+    """
+    rng = np.random.default_rng(42)
+    stations = {}
+    for i in range(n_stations):
+        times = pd.date_range("2019-12-30", periods=int(rng.integers(48, 1500)), freq="h")
+        times = times[rng.random(len(times)) > 0.2]
+        pres = np.round(1013 + np.cumsum(rng.normal(0, 0.8, len(times))), 1)
+        spikes = rng.integers(0, len(times), size=int(rng.integers(0, 20)))
+        pres[spikes] += rng.choice([-40.0, 40.0], size=len(spikes))
+        pres[rng.random(len(times)) < 0.05] = np.nan
+        stations[f"ST{i:03d}"] = pd.DataFrame(
+            {"pres": pd.array(pres, dtype=dtype)}, index=pd.DatetimeIndex(times, name="time")
+        )
+    return stations
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64"])
+def test_get_daily_pressure_range_batch_matches_per_station(dtype: str):
+    """
+    Test that the batch daily range is identical to running each station separately.
+    """
+    stations = _synthetic_stations(25, dtype)
+
+    batch = processing.get_daily_pressure_range_batch(processing.stack_stations(stations))
+    result = processing.split_stations(batch)
+
+    for station_id, hourly in stations.items():
+        expected = processing.get_daily_pressure_range(hourly)
+        if expected.empty:
+            assert station_id not in result
+            continue
+        pd.testing.assert_frame_equal(result[station_id], expected)
+
+
+def test_remove_outliers_batch_matches_per_station():
+    """
+    Test that the batch outlier removal drops the same days as the per-station function.
+    """
+    stations = _synthetic_stations(25, "float64")
+
+    result = processing.remove_outliers_batch(processing.stack_stations(stations))
+
+    expected = processing.stack_stations(
+        {station_id: processing.remove_outliers(df) for station_id, df in stations.items()}
+    )
+    pd.testing.assert_frame_equal(result, expected)
+    assert len(result) < sum(len(df) for df in stations.values())
+
+
+def test_compute_frac_var_batch_matches_per_station():
+    """
+    Test that the batch frac_var agrees with compute_frac_var for every station.
+    """
+    stations = _synthetic_stations(10, "Float64")
+    daily = processing.get_daily_pressure_range_batch(processing.stack_stations(stations))
+
+    result = processing.compute_frac_var_batch(daily, thresh=2.0)
+
+    for station_id, station_daily in processing.split_stations(daily).items():
+        expected = processing.compute_frac_var(station_daily, thresh=2.0)
+        assert np.isclose(result[station_id], expected)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64"])
+def test_compute_frac_var_sweep_matches_batch(dtype: str):
+    """
+    Test that each threshold column of the sweep equals compute_frac_var_batch at that threshold.
+    """
+    stations = _synthetic_stations(25, dtype)
+    daily = processing.get_daily_pressure_range_batch(processing.stack_stations(stations))
+    thresholds = [5.0, 0.5, 2.0, 1.0, 0.5, 0.0]
+
+    result = processing.compute_frac_var_sweep(daily, thresholds)
+
+    assert list(result.columns) == thresholds
+    for i, thresh in enumerate(thresholds):
+        expected = processing.compute_frac_var_batch(daily, thresh)
+        pd.testing.assert_series_equal(result.iloc[:, i], expected, check_names=False)
+
+
+def test_compute_frac_var_sweep_histogram_spans_observed_years():
+    """
+    Test that the sweep's histogram covers only the years in the data, and that empty data
+    gives an empty frame.
+    """
+    stations = _synthetic_stations(3, "float64")
+    daily = processing.get_daily_pressure_range_batch(processing.stack_stations(stations))
+    years = pd.DatetimeIndex(daily["date"]).year
+    thresholds = [1.0, 2.0]
+
+    with patch.object(np, "bincount", wraps=np.bincount) as bincount:
+        processing.compute_frac_var_sweep(daily, thresholds)
+    n_years = years.max() - years.min() + 1
+    assert bincount.call_args.kwargs["minlength"] == 3 * n_years * (len(thresholds) + 1)
+
+    empty = processing.compute_frac_var_sweep(daily.iloc[:0], thresholds)
+    assert empty.empty
+    assert list(empty.columns) == thresholds
+
+
+def test_streamed_outlier_bounds_match_whole_history():
+    """
+    Test that bounds streamed over yearly chunks remove the same days as the whole history.
+    """
+    hourly = _synthetic_stations(1, "Float64")["ST000"]
+    hourly = pd.concat([hourly, hourly.set_axis(hourly.index + pd.Timedelta(days=400))])
+    chunks = [rows for _, rows in hourly.groupby(pd.DatetimeIndex(hourly.index).year)]
+    expected = processing.remove_outliers(hourly)
+
+    sketch = processing.pressure_rate_sketch(iter(chunks))
+    bounds = processing.outlier_bounds(sketch)
+
+    rates = processing.pressure_rates(hourly)
+    q25, q75 = np.nanquantile(rates, [0.25, 0.75])
+    assert bounds == (q25 - 3 * (q75 - q25), q75 + 3 * (q75 - q25))
+    cleaned = [
+        processing.remove_outliers(chunk, bounds, previous)
+        for chunk, previous in zip(chunks, [None, *chunks[:-1]])
+    ]
+    pd.testing.assert_frame_equal(pd.concat(cleaned), expected)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "Float64"])
+def test_station_state_continues_history(dtype: str):
+    """
+    Test that day statistics give the daily ranges of get_daily_pressure_range, and that a
+    state continued from a partial last day equals the state of the whole history.
+    """
+    for hourly in _synthetic_stations(25, dtype).values():
+        stats, state = processing.advance_station_state(hourly)
+        expected = processing.get_daily_pressure_range(hourly)
+
+        result = processing.daily_from_day_stats(stats, state.bounds, dtype)
+
+        pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+        cut = hourly.index[len(hourly) // 2].normalize() + pd.Timedelta(hours=7)
+        _, first = processing.advance_station_state(hourly.loc[:cut])
+        rest = hourly.loc[first.until :]
+        rest_stats, continued = processing.advance_station_state(rest, first)
+
+        np.testing.assert_array_equal(continued.bounds, state.bounds)
+        assert continued.until == state.until
+        assert continued.sketch.count == state.sketch.count
+        assert processing.reading_counts(rest, first) == processing.reading_counts(hourly)
+        pd.testing.assert_frame_equal(
+            rest_stats, stats[stats["date"] >= first.until].reset_index(drop=True)
+        )
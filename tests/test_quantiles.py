@@ -0,0 +1,73 @@
+"""
+Tests for quantiles.py
+"""
+
+import numpy as np
+import pytest
+
+from migraine_weather.quantiles import QuantileSketch
+
+QUANTILES = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+
+
+def _rates(n: int, seed: int = 0) -> np.ndarray:
+    """Hourly pressure changes: 0.1 hPa steps over 1-3 hour gaps, with NaN and spikes."""
+    rng = np.random.default_rng(seed)
+    rates = np.round(rng.normal(0, 0.8, n), 1) / rng.choice([1, 1, 1, 2, 3], n)
+    rates[rng.random(n) < 0.05] = np.nan
+    rates[rng.integers(0, n, 20)] += 40
+    return rates
+
+
+def test_exact_sketch_matches_numpy():
+    """
+    Test that an exact sketch built in chunks and merged gives numpy's quantiles bit for bit.
+    """
+    rates = _rates(20000)
+    expected = np.nanquantile(rates, QUANTILES)
+
+    whole = QuantileSketch().update(rates)
+    merged = QuantileSketch()
+    for chunk in np.array_split(rates, 7):
+        merged.merge(QuantileSketch().update(chunk))
+
+    assert whole.count == np.count_nonzero(~np.isnan(rates))
+    np.testing.assert_array_equal(whole.quantile(QUANTILES), expected)
+    np.testing.assert_array_equal(merged.quantile(QUANTILES), expected)
+    assert len(whole.values) < 1000
+
+
+@pytest.mark.parametrize("resolution", [0.001, 0.01, 0.1])
+def test_approximate_sketch_within_bound(resolution: float):
+    """
+    Test that quantiles are within resolution / 2, and outlier bounds within 3.5 * resolution.
+    """
+    for seed in range(5):
+        rates = _rates(5000, seed)
+        exact = np.nanquantile(rates, QUANTILES)
+
+        sketch = QuantileSketch(resolution).update(rates)
+
+        result = sketch.quantile(QUANTILES)
+        assert np.all(np.abs(result - exact) <= resolution / 2 + 1e-9)
+        q25, q75 = sketch.quantile([0.25, 0.75])
+        e25, e75 = np.nanquantile(rates, [0.25, 0.75])
+        assert abs((q25 - 3 * (q75 - q25)) - (e25 - 3 * (e75 - e25))) <= 3.5 * resolution + 1e-9
+
+
+def test_serialise_and_merge_rules():
+    """
+    Test that sketches survive serialisation and only merge with the same resolution.
+    """
+    for resolution in [None, 0.01]:
+        sketch = QuantileSketch(resolution).update(_rates(1000))
+
+        restored = QuantileSketch.from_bytes(sketch.to_bytes())
+
+        assert restored.resolution == resolution
+        np.testing.assert_array_equal(restored.values, sketch.values)
+        np.testing.assert_array_equal(restored.counts, sketch.counts)
+
+    assert np.isnan(QuantileSketch().quantile([0.5])).all()
+    with pytest.raises(ValueError):
+        QuantileSketch().merge(QuantileSketch(0.01))
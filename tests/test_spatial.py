@@ -0,0 +1,92 @@
+"""
+Tests for spatial.py
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from migraine_weather.consts import LONG_LAT_DICT
+from migraine_weather.spatial import StationIndex, grid_mean, haversine_km
+
+
+def _stations(n: int = 5000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    stations = pd.DataFrame(
+        {
+            "latitude": np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+            "longitude": rng.uniform(-180, 180, n),
+        },
+        index=pd.Index([f"ST{i:04d}" for i in range(n)], name="id"),
+    )
+    stations.iloc[:2] = [[0.0, 180.0], [89.9, -180.0]]
+    return stations
+
+
+def test_query_matches_brute_force():
+    """
+    Test that bounding box queries match a full scan for every region, including Oceania.
+    """
+    stations = _stations()
+    index = StationIndex(stations)
+    longitude, latitude = stations["longitude"], stations["latitude"]
+
+    for bounds in LONG_LAT_DICT.values():
+        (lon_min, lon_max), (lat_min, lat_max) = bounds["long"], bounds["lat"]
+        if lon_max > 180:
+            in_lon = (longitude >= lon_min) | (longitude <= lon_max - 360)
+        else:
+            in_lon = (longitude >= lon_min) & (longitude <= lon_max)
+        expected = stations[in_lon & (latitude >= lat_min) & (latitude <= lat_max)]
+
+        pd.testing.assert_frame_equal(index.query(lon_min, lon_max, lat_min, lat_max), expected)
+
+
+def test_nearest_matches_brute_force():
+    """
+    Test that nearest station lookups match a full scan, including near the poles and dateline.
+    """
+    stations = _stations()
+    index = StationIndex(stations)
+    points = [(149.1, -35.3, 1), (179.9, 0.1, 3), (-179.9, 0.0, 2), (10.0, 89.0, 5), (0, -89, 1)]
+
+    for longitude, latitude, k in points:
+        distance = haversine_km(
+            longitude, latitude, stations["longitude"].to_numpy(), stations["latitude"].to_numpy()
+        )
+        expected = stations.index[np.argsort(distance, kind="stable")[:k]]
+
+        nearest = index.nearest(longitude, latitude, k)
+
+        assert list(nearest.index) == list(expected)
+        assert nearest["distance_km"].is_monotonic_increasing
+
+
+def test_from_csv():
+    """
+    Test that an index can be built from a stations.csv file.
+    """
+    with TemporaryDirectory() as tmpdir:
+        _stations(10).to_csv(Path(tmpdir) / "stations.csv")
+        index = StationIndex.from_csv(Path(tmpdir) / "stations.csv")
+
+    assert index.nearest(180.0, 0.0).index[0] == "ST0000"
+
+
+def test_grid_mean():
+    """
+    Test that values are averaged per grid cell, ignoring NaN values and points outside.
+    """
+    x = np.array([0.5, 0.6, 1.5, 3.5, 4.0, 9.0, 0.1])
+    y = np.array([0.5, 0.5, 0.5, 1.5, 2.0, 0.5, 0.1])
+    values = np.array([1.0, 3.0, 5.0, 7.0, 9.0, 100.0, np.nan])
+
+    grid = grid_mean(x, y, values, (0, 4, 0, 2), (2, 4))
+
+    expected = np.full((2, 4), np.nan)
+    expected[0, 0] = 2.0
+    expected[0, 1] = 5.0
+    expected[1, 3] = 8.0
+    np.testing.assert_array_equal(grid, expected)
@@ -0,0 +1,306 @@
+"""
+Tests for storage.py
+"""
+
+import dataclasses
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from migraine_weather import processing
+from migraine_weather.storage import (
+    DAILY_COLUMNS,
+    DailyStore,
+    consolidate,
+    read_consolidated,
+    read_daily,
+)
+
+
+def _daily(start: str, periods: int, pres_min: float = 1010.0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "date": pd.date_range(start, periods=periods, freq="D"),
+            "pres_min": pres_min,
+            "pres_max": 1015.0,
+        }
+    )
+
+
+def test_append_and_read():
+    """
+    Test that appended days are read back in order and recorded in the manifest.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-12-01", 40))
+        store.append("ST001", _daily("2021-01-10", 5))
+
+        result = store.read("ST001")
+
+        assert len(result) == 45
+        assert result["date"].is_monotonic_increasing
+        assert store.last_date("ST001") == pd.Timestamp("2021-01-14")
+        assert store.last_date("ST002") is None
+        assert store.station_ids() == ["ST001"]
+
+
+def test_append_only_writes_new_parts():
+    """
+    Test that an incremental append adds a part file instead of rewriting existing ones.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-01-01", 100))
+        first_part = next(Path(tmpdir).glob("ST001/2020/*.parquet"))
+        mtime = first_part.stat().st_mtime_ns
+
+        store.append("ST001", _daily("2020-04-10", 1))
+
+        assert len(list(Path(tmpdir).glob("ST001/2020/*.parquet"))) == 2
+        assert first_part.stat().st_mtime_ns == mtime
+
+
+def test_newest_rows_win_and_compact():
+    """
+    Test that overlapping rows resolve to the newest write, before and after compaction.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-01-01", 10))
+        store.append("ST001", _daily("2020-01-10", 3, pres_min=1000.0))
+
+        before = store.read("ST001")
+        store.compact(min_parts=2)
+        after = store.read("ST001")
+
+        assert len(list(Path(tmpdir).glob("ST001/2020/*.parquet"))) == 1
+        pd.testing.assert_frame_equal(before, after)
+        assert len(after) == 12
+        assert after.loc[after["date"] == "2020-01-10", "pres_min"].item() == 1000.0
+
+
+def test_compact_layout_round_trip():
+    """
+    Test that daily rows are stored as int16 tenths of a hPa and read back unchanged.
+    """
+    rng = np.random.default_rng(0)
+    pres_min = np.round(rng.normal(1005, 10, 365), 1)
+    pres_max = np.round(pres_min + rng.gamma(2.0, 3.0, 365), 1)
+    pres_min[::17] = np.nan
+    for dtype in ["float64", "Float64"]:
+        daily = pd.DataFrame(
+            {
+                "date": pd.date_range("2020-01-01", periods=365, freq="D"),
+                "pres_min": pd.array(pres_min, dtype=dtype),
+                "pres_max": pd.array(pres_max, dtype=dtype),
+            }
+        )
+        with TemporaryDirectory() as tmpdir:
+            store = DailyStore(Path(tmpdir))
+            store.append("ST001", daily)
+            part = next(Path(tmpdir).glob("ST001/2020/*.parquet"))
+
+            assert pq.read_schema(part).field("pres_min").type == pa.int16()
+            pd.testing.assert_frame_equal(store.read("ST001"), daily)
+
+
+def test_migrate_legacy():
+    """
+    Test that flat per-station Parquet files are moved into the store.
+    """
+    with TemporaryDirectory() as tmpdir:
+        _daily("2020-01-01", 10).to_parquet(Path(tmpdir) / "ST001.parquet", index=False)
+
+        store = DailyStore(Path(tmpdir))
+        store.migrate_legacy()
+
+        assert not (Path(tmpdir) / "ST001.parquet").exists()
+        assert len(store.read("ST001")) == 10
+        assert store.last_date("ST001") == pd.Timestamp("2020-01-10")
+
+
+def test_consolidate_and_read_with_pushdown():
+    """
+    Test that the consolidated dataset returns the stored rows filtered by station, bbox and date.
+    """
+    stations = pd.DataFrame(
+        {
+            "country": ["AU", "AU", "FJ", "FR"],
+            "latitude": [-35.3, -12.4, -18.1, 48.9],
+            "longitude": [149.2, 130.9, 178.4, 2.3],
+        },
+        index=["ST001", "ST002", "ST003", "ST004"],
+    )
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir) / "daily")
+        for station_id in stations.index:
+            store.append(station_id, _daily("2020-01-01", 30))
+        output_path = Path(tmpdir) / "consolidated"
+
+        consolidate(store, stations, output_path)
+        consolidate(store, stations, output_path)  # replaces the existing dataset
+
+        everything = read_consolidated(output_path)
+        by_station = read_consolidated(output_path, station_ids=["ST002"])
+        oceania = read_consolidated(output_path, bbox=(110, 240, -60, 30))
+        by_date = read_consolidated(output_path, start=datetime(2020, 1, 21))
+        row_groups = pq.ParquetFile(output_path / "country=AU" / "part-0.parquet").num_row_groups
+
+    assert len(everything) == 120
+    pd.testing.assert_frame_equal(
+        by_station[DAILY_COLUMNS], _daily("2020-01-01", 30), check_dtype=False
+    )
+    assert set(oceania["station_id"]) == {"ST001", "ST002", "ST003"}
+    assert len(by_date) == 4 * 10
+    assert row_groups == 2
+
+
+def test_read_many_and_manifest():
+    """
+    Test that several stations are read into one long frame and the manifest tracks versions.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-01-01", 10))
+        store.append("ST002", _daily("2020-01-01", 5))
+        store.append("ST002", _daily("2020-01-06", 5))
+
+        daily = store.read_many(["ST001", "ST002", "ST003"])
+        manifest = store.manifest()
+
+    assert list(daily.columns) == ["station", *DAILY_COLUMNS]
+    assert daily.groupby("station").size().to_dict() == {"ST001": 10, "ST002": 10}
+    assert manifest.loc["ST002", "version"] == 2
+    assert manifest.loc["ST002", "n_rows"] == 10
+    assert manifest.loc["ST001", "last_date"] == pd.Timestamp("2020-01-10")
+    assert manifest["write_hash"].nunique() == 2
+    assert manifest["fetched_until"].isna().all()
+
+
+def test_manifest_tracks_writes_and_fetches():
+    """
+    Test that the write hash changes with every write and fetches are recorded per station.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-01-01", 10))
+        first = store.manifest().loc["ST001", "write_hash"]
+        store.mark_fetched({"ST001": datetime(2020, 1, 10, 23), "ST002": datetime(2020, 1, 10)})
+        store.append("ST001", _daily("2020-01-11", 1))
+        manifest = store.manifest()
+
+    assert manifest.loc["ST001", "write_hash"] != first
+    assert manifest.loc["ST001", "fetched_until"] == pd.Timestamp("2020-01-10 23:00")
+    assert list(manifest.index) == ["ST001"]
+
+
+def test_compact_only_visits_written_stations():
+    """
+    Test that stations compacted before are not looked at again until they are written.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        for day in range(1, 4):
+            store.append("ST001", _daily(f"2020-01-0{day}", 1))
+        store.compact(min_parts=2)
+        store.append("ST001", _daily("2020-01-04", 1))
+
+        with patch.object(Path, "glob", wraps=Path.glob, autospec=True) as glob:
+            store.compact(min_parts=3)
+        assert glob.called
+        with patch.object(Path, "glob", wraps=Path.glob, autospec=True) as glob:
+            store.compact(min_parts=3)
+        glob.assert_not_called()
+        assert len(store.read("ST001")) == 4
+
+
+def test_rejection_ledger():
+    """
+    Test that rejections are recorded and cleared once the station is stored.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.reject("ST001", "quality", datetime(2025, 6, 30))
+        store.reject("ST002", "inventory")
+
+        before = store.rejections()
+        store.append("ST001", _daily("2020-01-01", 10))
+        after = store.rejections()
+
+    assert before.loc["ST001", "reason"] == "quality"
+    assert before.loc["ST001", "inventory_end"] == pd.Timestamp("2025-06-30")
+    assert pd.isna(before.loc["ST002", "inventory_end"])
+    assert list(after.index) == ["ST002"]
+
+
+def test_recover_removes_unrecorded_writes():
+    """
+    Test that parts and temporary files of an interrupted write are removed on recovery.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.append("ST001", _daily("2020-01-01", 10))
+        expected = store.read("ST001")
+
+        # Parts written before the manifest update, as when a run is killed between the two
+        store._write_parts("ST001", _daily("2020-01-05", 20, pres_min=1000.0))
+        store._write_parts("ST002", _daily("2020-01-01", 10))
+        (Path(tmpdir) / "ST001" / "2020" / "1-1.tmp").write_bytes(b"truncated")
+        store.recover()
+
+        pd.testing.assert_frame_equal(store.read("ST001"), expected)
+        assert store.read("ST002") is None
+        assert not list(Path(tmpdir).glob("*/*/*.tmp"))
+
+
+def test_run_journal():
+    """
+    Test that unfinished runs and the stations they finished are recorded.
+    """
+    start, end = datetime(2020, 1, 1), datetime(2020, 12, 31)
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        first = store.start_run(start, end)
+        store.journal(first, {"ST001": "written", "ST002": "rejected"})
+
+        assert store.interrupted_run() == (first, start, end)
+        assert store.finished_stations(first) == {"ST001", "ST002"}
+
+        second = store.start_run(start, datetime(2021, 6, 30))
+        assert store.interrupted_run() == (second, start, datetime(2021, 6, 30))
+        assert store.finished_stations(second) == set()
+
+        store.finish_run(second)
+        assert store.interrupted_run() is None
+
+
+def test_update_without_new_rows_keeps_stored_dtypes():
+    """
+    Test that earlier days rewritten by an update without new rows keep the dtypes of the
+    stored rows.
+    """
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2020-01-01", periods=24 * 20, freq="h", name="time")
+    hourly = pd.DataFrame(
+        {"pres": np.round(1013 + np.cumsum(rng.normal(0, 0.5, len(times))), 1)}, index=times
+    )
+    stats, state = processing.advance_station_state(hourly)
+    daily = processing.daily_from_day_stats(stats, state.bounds, "float64")
+
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        store.update("ST001", daily, stats, state)
+        moved = dataclasses.replace(state, lower=-0.3, upper=0.3)
+        store.update("ST001", daily.iloc[:0], stats.iloc[:0], moved)
+
+        parts = store._parts("ST001")
+        assert len(parts) == 2
+        for part in parts:
+            pd.testing.assert_series_equal(read_daily(part).dtypes, daily.dtypes)
@@ -0,0 +1,89 @@
+"""
+Tests for summary.py
+"""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+
+from migraine_weather import processing, summary
+from migraine_weather.storage import DailyStore
+
+
+def _daily(n_stations: int = 5, years: int = 3) -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(1)
+    dates = pd.date_range("2018-01-01", periods=365 * years, freq="D")
+    stations = {}
+    for i in range(n_stations):
+        pres_min = np.round(rng.normal(1005, 5, len(dates)), 1)
+        pres_max = np.round(pres_min + rng.gamma(2.0, 3.0, len(dates)), 1)
+        missing = rng.random(len(dates)) < 0.05
+        stations[f"ST{i:03d}"] = pd.DataFrame(
+            {
+                "date": dates,
+                "pres_min": pd.array(np.where(missing, np.nan, pres_min), dtype="Float64"),
+                "pres_max": pd.array(np.where(missing, np.nan, pres_max), dtype="Float64"),
+            }
+        )
+    return stations
+
+
+def test_frac_var_from_summary_matches_daily():
+    """
+    Test that frac_var from the summary index equals frac_var from the daily rows, for the
+    whole record and a year window, after overlapping incremental appends.
+    """
+    thresholds = [4.95, 10.05, 15.05]
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        for station_id, daily in _daily().items():
+            store.append(station_id, daily.iloc[:500])
+            store.append(station_id, daily.iloc[400:])
+
+        daily = store.read_many(store.station_ids())
+        for start_year, end_year in [(None, None), (2019, 2020)]:
+            years = pd.DatetimeIndex(daily["date"]).year
+            in_window = (years >= (start_year or 0)) & (years <= (end_year or 9999))
+            expected = processing.compute_frac_var_sweep(daily[in_window], thresholds)
+
+            result = summary.frac_var(store.summary(None, start_year, end_year), thresholds)
+
+            pd.testing.assert_frame_equal(result, expected)
+
+
+def test_range_stats():
+    """
+    Test the daily range statistics derived from the summary sums.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        for station_id, daily in _daily(2).items():
+            store.append(station_id, daily)
+
+        result = summary.range_stats(store.summary(["ST001"]))
+
+        pres_range = (store.read("ST001")["pres_max"] - store.read("ST001")["pres_min"]).dropna()
+        assert list(result.index) == ["ST001"]
+        assert result.at["ST001", "n_years"] == 3
+        assert result.at["ST001", "n_days"] == len(pres_range)
+        assert np.isclose(result.at["ST001", "range_mean"], pres_range.mean())
+        assert np.isclose(result.at["ST001", "range_std"], pres_range.std(ddof=0))
+
+
+def test_summary_backfills_existing_stations():
+    """
+    Test that stations written before the summary existed are summarised on first use.
+    """
+    with TemporaryDirectory() as tmpdir:
+        store = DailyStore(Path(tmpdir))
+        for station_id, daily in _daily(2).items():
+            store.append(station_id, daily)
+        expected = store.summary()
+        with closing(sqlite3.connect(Path(tmpdir) / "manifest.sqlite")) as conn, conn:
+            conn.execute("DELETE FROM summary")
+
+        pd.testing.assert_frame_equal(store.summary(), expected)
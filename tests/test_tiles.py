@@ -0,0 +1,80 @@
+"""
+Tests for visualisation/tiles.py
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import matplotlib
+import matplotlib.image
+import numpy as np
+import pandas as pd
+
+from migraine_weather.visualisation import tiles
+
+
+def _stations(n: int = 100) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "longitude": rng.uniform(-180, 180, n),
+            "latitude": rng.uniform(-60, 80, n),
+            "frac_var": rng.uniform(0, 0.4, n),
+        },
+        index=pd.Index([f"ST{i:03d}" for i in range(n)], name="id"),
+    )
+
+
+def _tile_files(path: Path) -> dict[Path, float]:
+    return {tile: tile.stat().st_mtime_ns for tile in path.glob("*/*/*.png")}
+
+
+def test_export_is_incremental():
+    """
+    Test that only tiles showing a changed station are re-rendered, and empty tiles removed.
+    """
+    stations = _stations()
+    with TemporaryDirectory() as tmpdir:
+        output_path = Path(tmpdir)
+        first = tiles.export_tiles(stations, output_path, max_zoom=4, max_workers=1)
+        written = _tile_files(output_path)
+        assert first["rendered"] == len(written) > 0
+        assert (output_path / "index.html").exists()
+
+        again = tiles.export_tiles(stations, output_path, max_zoom=4, max_workers=1)
+        assert again == {"rendered": 0, "removed": 0, "unchanged": first["rendered"]}
+        assert _tile_files(output_path) == written
+
+        # One station recoloured: one tile per zoom level, unless its marker straddles tiles
+        stations.loc["ST000", "frac_var"] += 0.1
+        changed = tiles.export_tiles(stations, output_path, max_zoom=4, max_workers=1)
+        assert 5 <= changed["rendered"] <= 5 * 4
+        assert changed["removed"] == 0
+
+        # One isolated station removed: the tiles only it was drawn on go
+        stations.loc["ST001", ["longitude", "latitude"]] = [-170.0, 79.0]
+        tiles.export_tiles(stations, output_path, max_zoom=4, max_workers=1)
+        removed = tiles.export_tiles(stations.drop("ST001"), output_path, max_zoom=4)
+        assert removed["removed"] > 0
+        assert len(_tile_files(output_path)) == removed["rendered"] + removed["unchanged"]
+
+
+def test_tile_pixels():
+    """
+    Test that a station is drawn at its projected position in its frac_var colour.
+    """
+    stations = pd.DataFrame(
+        {"longitude": [0.0, 179.9], "latitude": [0.0, 0.0], "frac_var": [0.15, 0.3]},
+        index=pd.Index(["ST001", "ST002"], name="id"),
+    )
+    with TemporaryDirectory() as tmpdir:
+        tiles.export_tiles(stations, Path(tmpdir), max_zoom=1, max_workers=1)
+        image = matplotlib.image.imread(Path(tmpdir) / "0" / "0" / "0.png")
+        expected = matplotlib.colormaps[tiles.CMAP](0.5)
+        np.testing.assert_allclose(image[128, 128], expected, atol=1 / 255)
+        assert image[0, 0, 3] == 0
+
+        # Markers at the antimeridian wrap onto the western edge of the map
+        assert image[128, 0, 3] == 1
+        assert (Path(tmpdir) / "1" / "0" / "0.png").exists()
+        assert (Path(tmpdir) / "1" / "1" / "1.png").exists()
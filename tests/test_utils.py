@@ -6,6 +6,7 @@ from pathlib import Path
 from tempfile import TemporaryDirectory
 import pandas as pd
 
+from migraine_weather.storage import DailyStore
 from migraine_weather.utils import get_country_codes, save_station_metadata
 
 
@@ -24,12 +25,11 @@ def test_get_country_codes():
 
 def test_save_station_metadata():
     """
-    Test that save_station_metadata only saves stations with processed Parquet files.
+    Test that save_station_metadata only saves stations with processed daily data.
     """
     with TemporaryDirectory() as tmpdir:
         daily_path = Path(tmpdir) / "daily"
         output_path = Path(tmpdir) / "processed"
-        daily_path.mkdir()
         output_path.mkdir()
 
         stations = pd.DataFrame(
@@ -44,8 +44,16 @@ def test_save_station_metadata():
         stations.index.name = "id"
 
         # Only ST001 and ST002 have been processed
-        (daily_path / "ST001.parquet").touch()
-        (daily_path / "ST002.parquet").touch()
+        daily = pd.DataFrame(
+            {
+                "date": pd.date_range("2020-01-01", periods=3),
+                "pres_min": 1010.0,
+                "pres_max": 1015.0,
+            }
+        )
+        store = DailyStore(daily_path)
+        store.append("ST001", daily)
+        store.append("ST002", daily)
 
         save_station_metadata(stations, daily_path, output_path)
 